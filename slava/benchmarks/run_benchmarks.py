@@ -0,0 +1,287 @@
+"""Micro-benchmarks of the data and metric hot paths.
+
+Run ``python -m slava.benchmarks.run_benchmarks --sizes 1000 100000`` to compare against the saved baseline,
+add ``--save-baseline`` to record a new one. The exit code is 1 if any benchmark regressed
+or if a module imports a package it must not, e.g. a provider SDK on the metrics-only path.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable
+
+import pandas as pd
+
+from slava.benchmarks.synthetic_data import generate_questions, generate_results
+from slava.config import (
+    BENCHMARK_BASELINE_FILEPATH,
+    BENCHMARK_IMPORTS,
+    BENCHMARK_MEMORY_TOLERANCE,
+    BENCHMARK_REPEAT,
+    BENCHMARK_SIZES,
+    BENCHMARK_TIME_TOLERANCE,
+    NOT_OPEN_QUESTION_TYPE_NAME,
+    NOT_OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES,
+    OPEN_QUESTION_TYPE_NAME,
+    OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES,
+)
+from slava.modules.data_converter import DataConverter
+from slava.modules.data_loader import DataLoader
+from slava.modules.metrics import MetricsCalculator
+from slava.modules.model_eval import ModelEval
+from slava.modules.utils.metrics_helpers import (
+    exact_match,
+    f1_score,
+    get_aggregates,
+    is_substring,
+    levenshtein_ratio,
+    partially_match,
+)
+from slava.modules.utils.metrics_utils import preprocess_answers
+
+
+def get_fixtures(size: int, folder_path: str) -> dict:
+    questions = generate_questions(size)
+    dataset_path = os.path.join(folder_path, "dataset.jsonl")
+    DataConverter(questions).save_json_objects_to_jsonl(dataset_path)
+    dataset = DataLoader().load_data(dataset_path)
+
+    results = generate_results(questions)
+    open_questions, not_open_questions = preprocess_answers(results.copy())
+    metrics_calculator = MetricsCalculator(results.copy())
+
+    return {
+        "folder_path": folder_path,
+        "questions": questions,
+        "dataset_path": dataset_path,
+        "dataset": dataset,
+        "rows": [row for _, row in dataset.iterrows()],
+        "open_questions": open_questions,
+        "not_open_questions": not_open_questions,
+        "metrics_calculator": metrics_calculator,
+    }
+
+
+# Every benchmark gets the fixtures and returns the function to measure, so the setup is not timed
+BENCHMARKS: dict[str, Callable[[dict], Callable[[], object]]] = {
+    "DataLoader.load_data": lambda f: lambda: DataLoader().load_data(f["dataset_path"]),
+    "DataConverter.save_json_objects_to_jsonl": lambda f: lambda: DataConverter(
+        f["questions"]
+    ).save_json_objects_to_jsonl(os.path.join(f["folder_path"], "converted.jsonl")),
+    "ModelEval.fill_instruction": lambda f: lambda: [ModelEval().fill_instruction(row) for row in f["rows"]],
+    "ModelEval.render_prompts": lambda f: lambda: ModelEval().render_prompts(f["dataset"]),
+    "metrics_helpers.exact_match": lambda f: lambda: exact_match(f["open_questions"]),
+    "metrics_helpers.levenshtein_ratio": lambda f: lambda: levenshtein_ratio(f["open_questions"]),
+    "metrics_helpers.f1_score": lambda f: lambda: f1_score(f["open_questions"]),
+    "metrics_helpers.is_substring": lambda f: lambda: is_substring(f["not_open_questions"]),
+    "metrics_helpers.partially_match": lambda f: lambda: partially_match(f["not_open_questions"]),
+    "metrics_helpers.get_aggregates": lambda f: lambda: get_aggregates(
+        OPEN_QUESTION_TYPE_NAME, f["metrics_calculator"].open_questions, OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES
+    ),
+    "metrics_helpers.get_aggregates[not_open]": lambda f: lambda: get_aggregates(
+        NOT_OPEN_QUESTION_TYPE_NAME,
+        f["metrics_calculator"].not_open_questions,
+        NOT_OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES,
+    ),
+    "MetricsCalculator.save_metrics_table_of_custom_dataset_to_excel": lambda f: lambda: f[
+        "metrics_calculator"
+    ].save_metrics_table_of_custom_dataset_to_excel(os.path.join(f["folder_path"], "custom.xlsx")),
+    "MetricsCalculator.save_metrics_table_to_excel": lambda f: lambda: f[
+        "metrics_calculator"
+    ].save_metrics_table_to_excel(os.path.join(f["folder_path"], "metrics.xlsx")),
+    "MetricsCalculator.save_metrics_table_to_excel_dynamic": lambda f: lambda: f[
+        "metrics_calculator"
+    ].save_metrics_table_to_excel_dynamic(os.path.join(f["folder_path"], "dynamic.xlsx")),
+}
+
+
+# Imports are measured in a fresh interpreter, since the modules of the current one are already loaded.
+# The peak memory is VmHWM of Linux, because ru_maxrss keeps the peak of the parent process across exec.
+IMPORT_BENCHMARK_SCRIPT = """
+import importlib, json, resource, sys, time
+started_at = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - started_at
+try:
+    with open("/proc/self/status") as file:
+        peak_memory = next(int(line.split()[1]) * 1024 for line in file if line.startswith("VmHWM"))
+except OSError:
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "time": elapsed,
+    "peak_memory": peak_memory,
+    "modules": sorted({name.split(".")[0] for name in sys.modules}),
+}))
+"""
+
+
+@contextmanager
+def _quiet():
+    # The Excel writers print a message on every call
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def measure(function: Callable[[], object], repeat: int = BENCHMARK_REPEAT) -> dict:
+    with _quiet():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+
+        # Peak memory is measured in a separate run, since tracing slows the function down
+        tracemalloc.start()
+        try:
+            function()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {"time": min(timings), "peak_memory": peak_memory}
+
+
+def measure_import(module: str, repeat: int = BENCHMARK_REPEAT) -> dict:
+    runs = [
+        json.loads(
+            subprocess.run(
+                [sys.executable, "-c", IMPORT_BENCHMARK_SCRIPT, module], capture_output=True, text=True, check=True
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+    return {
+        "time": min(run["time"] for run in runs),
+        "peak_memory": min(run["peak_memory"] for run in runs),
+        "modules": runs[0]["modules"],
+    }
+
+
+def run_import_benchmarks(names: list[str] = None, repeat: int = BENCHMARK_REPEAT) -> tuple[dict, dict]:
+    results, violations = {}, {}
+    for module, forbidden_packages in BENCHMARK_IMPORTS.items():
+        key = f"import {module}"
+        if names and not any(pattern in key for pattern in names):
+            continue
+
+        result = measure_import(module, repeat)
+        results[key] = {"time": result["time"], "peak_memory": result["peak_memory"]}
+        print(f"{key}: {result['time']:.4f} s, {result['peak_memory'] / 1024**2:.1f} MiB")
+
+        imported = sorted(set(result["modules"]) & set(forbidden_packages))
+        if imported:
+            violations[key] = imported
+    return results, violations
+
+
+def run_benchmarks(sizes: list[int], names: list[str] = None, repeat: int = BENCHMARK_REPEAT) -> dict:
+    results = {}
+    if names and not any(pattern in name for name in BENCHMARKS for pattern in names):
+        return results
+
+    for size in sizes:
+        # Some writers use the working directory, so everything runs inside a temporary folder
+        with tempfile.TemporaryDirectory() as folder_path:
+            cwd = os.getcwd()
+            os.chdir(folder_path)
+            try:
+                fixtures = get_fixtures(size, folder_path)
+                for name, benchmark in BENCHMARKS.items():
+                    if names and not any(pattern in name for pattern in names):
+                        continue
+
+                    key = f"{name}[{size}]"
+                    results[key] = measure(benchmark(fixtures), repeat)
+                    print(f"{key}: {results[key]['time']:.4f} s, {results[key]['peak_memory'] / 1024**2:.1f} MiB")
+            finally:
+                os.chdir(cwd)
+    return results
+
+
+def compare(
+    results: dict,
+    baseline: dict,
+    time_tolerance: float = BENCHMARK_TIME_TOLERANCE,
+    memory_tolerance: float = BENCHMARK_MEMORY_TOLERANCE,
+) -> pd.DataFrame:
+    comparison = pd.DataFrame(
+        [
+            {
+                "benchmark": key,
+                "time": result["time"],
+                "baseline_time": baseline[key]["time"],
+                "peak_memory": result["peak_memory"],
+                "baseline_peak_memory": baseline[key]["peak_memory"],
+            }
+            for key, result in results.items()
+            if key in baseline
+        ],
+        columns=["benchmark", "time", "baseline_time", "peak_memory", "baseline_peak_memory"],
+    )
+    comparison["time_ratio"] = comparison["time"] / comparison["baseline_time"]
+    comparison["memory_ratio"] = comparison["peak_memory"] / comparison["baseline_peak_memory"].clip(lower=1)
+    comparison["regression"] = (comparison["time_ratio"] > 1 + time_tolerance) | (
+        comparison["memory_ratio"] > 1 + memory_tolerance
+    )
+    return comparison
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the SLAVA data and metric hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_SIZES[:1], help="Numbers of rows")
+    parser.add_argument("--benchmarks", nargs="+", help="Run only the benchmarks whose names contain these strings")
+    parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT)
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE_FILEPATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=BENCHMARK_TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=BENCHMARK_MEMORY_TOLERANCE)
+    args = parser.parse_args(args)
+
+    results = run_benchmarks(args.sizes, args.benchmarks, args.repeat)
+    import_results, violations = run_import_benchmarks(args.benchmarks, args.repeat)
+    results.update(import_results)
+    for key, packages in violations.items():
+        print(f"FORBIDDEN IMPORTS in {key}: {', '.join(packages)}")
+    status = 1 if violations else 0
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as file:
+                baseline = json.load(file)
+        baseline.update(results)
+
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return status
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return status
+
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        comparison = compare(results, json.load(file), args.time_tolerance, args.memory_tolerance)
+    print(comparison.to_string(index=False))
+
+    regressions = comparison.loc[comparison["regression"], "benchmark"].tolist()
+    if regressions:
+        print(f"REGRESSION in {len(regressions)} benchmarks: {', '.join(regressions)}")
+        return 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from slava.config import (
+    BENCHMARK_N_MODELS,
+    BENCHMARK_SEED,
+    COMMENT_COLUMN,
+    ID_COLUMN,
+    INPUTS_COLUMN,
+    INSTRUCTION_COLUMN,
+    MATCHING,
+    MODEL_ANSWER_COLUMN,
+    MODEL_COLUMN,
+    MULTI_CHOICE,
+    OPEN_QUESTION_VALUE,
+    OPTION_SUBCOLUMN_TEMPLATE,
+    PROVOC_SCORE_COLUMN,
+    PROVOCATIVENESS_NAMING,
+    QUESTIONS_DATASET_COLUMNS,
+    REAL_ANSWER_COLUMN,
+    RESULTS_COLUMNS,
+    SEQUENCE,
+    SINGLE_CHOICE,
+    SOURCE_COLUMN,
+    SUBJECT_COLUMN,
+    SUBJECTS_NAMING,
+    TASK_COLUMN,
+    TEXT_COLUMN,
+    TYPE_COLUMN,
+)
+
+QUESTION_TYPES = [OPEN_QUESTION_VALUE, SINGLE_CHOICE, MULTI_CHOICE, MATCHING, SEQUENCE]
+N_OPTIONS = {OPEN_QUESTION_VALUE: 0, SINGLE_CHOICE: 4, MULTI_CHOICE: 6, MATCHING: 8, SEQUENCE: 5}
+INSTRUCTION_TEMPLATES = {
+    question_type: "Прочитайте задачу и выполните задание.\n Задача: {task}\n Текст: {text}"
+    + "".join(f"\n Вариант ответа {i}: {{Option_{i}}}" for i in range(1, n_options + 1))
+    for question_type, n_options in N_OPTIONS.items()
+}
+WORDS = ["россия", "москва", "конституция", "федерация", "реформа", "государство", "парламент", "история", "1991"]
+
+
+def _get_answer(rng: np.random.Generator, question_type: str) -> str:
+    if question_type == OPEN_QUESTION_VALUE:
+        return " ".join(rng.choice(WORDS, size=rng.integers(1, 4)))
+    elif question_type == SINGLE_CHOICE:
+        return str(rng.integers(1, N_OPTIONS[SINGLE_CHOICE] + 1))
+    elif question_type == MULTI_CHOICE:
+        return "".join(sorted(map(str, rng.choice(range(1, 7), size=rng.integers(2, 4), replace=False))))
+    else:
+        return "".join(map(str, rng.permutation(range(1, N_OPTIONS[question_type] + 1))))
+
+
+def generate_questions(n_rows: int, seed: int = BENCHMARK_SEED) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    question_types = rng.choice(QUESTION_TYPES, size=n_rows)
+
+    questions = {
+        ID_COLUMN: np.arange(n_rows),
+        SUBJECT_COLUMN: rng.choice(list(SUBJECTS_NAMING), size=n_rows),
+        TYPE_COLUMN: question_types,
+        INSTRUCTION_COLUMN: [INSTRUCTION_TEMPLATES[question_type] for question_type in question_types],
+        TASK_COLUMN: [f"Задача номер {i} о политическом устройстве страны" for i in range(n_rows)],
+        TEXT_COLUMN: [f"Текст вопроса {i}: " + " ".join(WORDS) for i in range(n_rows)],
+    }
+    for i in range(1, 10):
+        questions[OPTION_SUBCOLUMN_TEMPLATE.format(i)] = [
+            f"вариант {i} {WORDS[i % len(WORDS)]}" if i <= N_OPTIONS[question_type] else None
+            for question_type in question_types
+        ]
+    questions[REAL_ANSWER_COLUMN] = [_get_answer(rng, question_type) for question_type in question_types]
+    questions[SOURCE_COLUMN] = "synthetic"
+    questions[COMMENT_COLUMN] = None
+    questions[PROVOC_SCORE_COLUMN] = rng.choice([int(score) for score in PROVOCATIVENESS_NAMING], size=n_rows)
+
+    return pd.DataFrame(questions, columns=QUESTIONS_DATASET_COLUMNS)
+
+
+def generate_results(
+    questions: pd.DataFrame, n_models: int = BENCHMARK_N_MODELS, seed: int = BENCHMARK_SEED
+) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    # The questions are split between the models, so the results have as many rows as the questions
+    models = np.array([f"model-{i}" for i in range(n_models)])[np.arange(len(questions)) % n_models]
+
+    real_answers = questions[REAL_ANSWER_COLUMN].tolist()
+    answer_kinds = rng.choice(["exact", "verbose", "wrong"], size=len(questions), p=[0.4, 0.3, 0.3])
+    responses = [
+        real_answer if kind == "exact" else f"Ответ: {real_answer}\nПояснение" if kind == "verbose" else WORDS[i % 9]
+        for i, (real_answer, kind) in enumerate(zip(real_answers, answer_kinds))
+    ]
+
+    results = questions.assign(
+        **{MODEL_COLUMN: models, MODEL_ANSWER_COLUMN: responses, INPUTS_COLUMN: questions[TASK_COLUMN]}
+    )
+    return results[RESULTS_COLUMNS]
@@ -0,0 +1,113 @@
+"""End-to-end throughput simulation of ModelEval against fake providers.
+
+Run ``python -m slava.benchmarks.throughput_simulator --max-concurrency 4 8 16 --rate-limit-error-rate 0.05``
+to compare evaluation settings on the real dataset without calling any API.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from slava.config import (
+    FAKE_MODEL_DEFAULT_ANSWER,
+    FAKE_MODEL_MAX_CONCURRENCY,
+    FAKE_MODEL_P50_LATENCY,
+    FAKE_MODEL_P99_LATENCY,
+    FAKE_MODEL_RATE_LIMIT_ERROR_RATE,
+    FAKE_MODEL_REQUESTS_PER_SECOND,
+    FAKE_MODEL_RETRY_AFTER,
+    FAKE_MODEL_SERVER_ERROR_RATE,
+    PROMPT_COLUMN,
+    RATE_CONTROLLER_MAX_RETRIES,
+    REAL_ANSWER_COLUMN,
+    SIMULATOR_ACCURACY,
+    SIMULATOR_SEED,
+)
+from slava.models.fake import FakeModel
+from slava.modules.data_loader import DataLoader
+from slava.modules.model_eval import ModelEval
+from slava.modules.model_handler import ModelHandler
+
+
+def get_canned_answers(dataset: pd.DataFrame, accuracy: float = SIMULATOR_ACCURACY, seed: int = SIMULATOR_SEED):
+    # The share of correct answers is fixed, so the simulated results also give realistic metrics
+    rng = random.Random(seed)
+    return {
+        prompt: str(answer) if rng.random() < accuracy else FAKE_MODEL_DEFAULT_ANSWER
+        for prompt, answer in zip(dataset[PROMPT_COLUMN], dataset[REAL_ANSWER_COLUMN])
+    }
+
+
+def simulate(dataset: pd.DataFrame, model: FakeModel, asynchronous: bool = True, max_concurrency: int = None) -> dict:
+    with tempfile.TemporaryDirectory() as folder_path:
+        started_at = time.monotonic()
+        ModelEval().run_evaluation(
+            model.model_name,
+            dataset,
+            ModelHandler(model),
+            folder_path,
+            asynchronous=asynchronous,
+            max_concurrency=max_concurrency,
+            resume=False,
+        )
+        elapsed = time.monotonic() - started_at
+
+    return {
+        "questions": len(dataset),
+        "elapsed": elapsed,
+        "questions_per_second": len(dataset) / elapsed,
+        **model.stats.summary(),
+        "final_concurrency_limit": model.rate_controller.concurrency_limit,
+    }
+
+
+def main(args: list[str] = None) -> pd.DataFrame:
+    parser = argparse.ArgumentParser(description="Throughput simulation of ModelEval against fake providers")
+    parser.add_argument("--dataset-path", help="Local JSONL dataset, the SLAVA dataset from HuggingFace by default")
+    parser.add_argument("--limit", type=int, help="Use only the first questions of the dataset")
+    parser.add_argument("--max-concurrency", type=int, nargs="+", default=[FAKE_MODEL_MAX_CONCURRENCY])
+    parser.add_argument("--sync", action="store_true", help="Run the synchronous evaluation loop")
+    parser.add_argument("--p50-latency", type=float, default=FAKE_MODEL_P50_LATENCY)
+    parser.add_argument("--p99-latency", type=float, default=FAKE_MODEL_P99_LATENCY)
+    parser.add_argument("--rate-limit-error-rate", type=float, default=FAKE_MODEL_RATE_LIMIT_ERROR_RATE)
+    parser.add_argument("--server-error-rate", type=float, default=FAKE_MODEL_SERVER_ERROR_RATE)
+    parser.add_argument("--retry-after", type=float, default=FAKE_MODEL_RETRY_AFTER)
+    parser.add_argument("--requests-per-second", type=float, default=FAKE_MODEL_REQUESTS_PER_SECOND)
+    parser.add_argument("--max-retries", type=int, default=RATE_CONTROLLER_MAX_RETRIES)
+    parser.add_argument("--accuracy", type=float, default=SIMULATOR_ACCURACY)
+    parser.add_argument("--seed", type=int, default=SIMULATOR_SEED)
+    args = parser.parse_args(args)
+
+    dataset = DataLoader().load_data(args.dataset_path)
+    if args.limit:
+        dataset = dataset.head(args.limit)
+    dataset = ModelEval().compile_prompts(dataset)
+    answers = get_canned_answers(dataset, args.accuracy, args.seed)
+
+    reports = []
+    for max_concurrency in args.max_concurrency:
+        model = FakeModel(
+            p50_latency=args.p50_latency,
+            p99_latency=args.p99_latency,
+            rate_limit_error_rate=args.rate_limit_error_rate,
+            server_error_rate=args.server_error_rate,
+            retry_after=args.retry_after,
+            answers=answers,
+            max_concurrency=max_concurrency,
+            requests_per_second=args.requests_per_second,
+            max_retries=args.max_retries,
+            seed=args.seed,
+        )
+        report = simulate(dataset, model, asynchronous=not args.sync, max_concurrency=max_concurrency)
+        reports.append({"max_concurrency": max_concurrency, **report})
+
+    reports = pd.DataFrame(reports)
+    print(reports.drop(columns="injected_errors").to_string(index=False))
+    return reports
+
+
+if __name__ == "__main__":
+    main()
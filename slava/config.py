@@ -102,12 +102,67 @@ METRICS_NAMING = {
 }
 
 AGGFUNC: Final[str] = "mean"
+METRICS_N_JOBS: Final[int] = 1
+
+# MetricsStore
+METRICS_STORE_FILEPATH: Final[str] = "cache/metrics.sqlite"
+RESPONSE_HASH_COLUMN: Final[str] = "response_hash"
+SCORED_FILES_ATTR: Final[str] = "scored_files"
+AGGREGATE_QUESTIONS_TYPE_COLUMN: Final[str] = "questions_type"
+AGGREGATE_CATEGORY_COLUMN: Final[str] = "category"
+AGGREGATE_LEVEL_COLUMN: Final[str] = "level"
+AGGREGATE_METRIC_COLUMN: Final[str] = "metric"
+AGGREGATE_VALUE_COLUMN: Final[str] = "value"
 
 # DataLoader
 REPO_ID: Final[str] = "RANEPA-ai/SLAVA-OpenData-2800-v1"
 REPO_TYPE: Final[str] = "dataset"
 OPEN_DATASET_FILENAME: Final[str] = "open_questions_dataset.jsonl"
 REQUIRED_COLUMNS: Final[list[str]] = [INSTRUCTION_COLUMN, INPUTS_COLUMN, REAL_ANSWER_COLUMN, META_COLUMN]
+DATASET_CHUNK_SIZE: Final[int] = 10000
+DATASET_CACHE_FOLDER: Final[str] = "cache/datasets"
+DATASET_CACHE_FILE_EXTENSION: Final[str] = ".parquet"
+DATASET_HASH_BLOCK_SIZE: Final[int] = 1024**2  # bytes
+
+# DataConverter
+COMPRESSION_EXTENSIONS: Final[dict[str, str]] = {".gz": "gzip", ".zst": "zstd"}
+
+# Benchmarks
+BENCHMARK_SIZES: Final[list[int]] = [1_000, 100_000, 1_000_000]
+BENCHMARK_N_MODELS: Final[int] = 5
+BENCHMARK_SEED: Final[int] = 42
+BENCHMARK_REPEAT: Final[int] = 5
+BENCHMARK_BASELINE_FILEPATH: Final[str] = "benchmarks/baseline.json"
+BENCHMARK_TIME_TOLERANCE: Final[float] = 0.25  # allowed relative slowdown
+BENCHMARK_MEMORY_TOLERANCE: Final[float] = 0.25  # allowed relative growth of peak memory
+# Module -> top-level packages it must not import, checked by the import-time benchmarks
+BENCHMARK_IMPORTS: Final[dict[str, list[str]]] = {
+    "slava.modules.metrics": [
+        "anthropic",
+        "gigachat",
+        "google",
+        "httpx",
+        "langchain",
+        "langchain_core",
+        "langchain_huggingface",
+        "langchain_ollama",
+        "openai",
+        "torch",
+        "tqdm",
+        "transformers",
+    ],
+    "slava.models.registry": [
+        "anthropic",
+        "gigachat",
+        "google",
+        "langchain",
+        "langchain_huggingface",
+        "langchain_ollama",
+        "openai",
+        "torch",
+        "transformers",
+    ],
+}
 
 # Pivot tables
 OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES: Final[list[str]] = [
@@ -121,39 +176,92 @@ NOT_OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES: Final[list[str]] = [
     PARTIALLY_MATCH_COLUMN,
 ]
 
+# Optional dependencies
+# Package -> extra of pyproject.toml that installs it
+OPTIONAL_DEPENDENCY_EXTRAS: Final[dict[str, str]] = {
+    "orjson": "fast-json",
+    "pyarrow": "parquet",
+    "zstandard": "zstd",
+}
+
 # Models
-MODELS_TYPES: Final[tuple[str]] = ["gigachat", "huggingface", "ollama", "openai", "yandexgpt"]
+# Provider name -> "module:class", the module and its SDK are imported when the provider is first used
+MODEL_CLASSES: Final[dict[str, str]] = {
+    "claude": "slava.models.claude:ClaudeModel",
+    "fake": "slava.models.fake:FakeModel",
+    "gemini": "slava.models.gemini:GeminiModel",
+    "gigachat": "slava.models.gigachat:GigaChatModel",
+    "huggingface": "slava.models.huggingface:HuggingFaceModel",
+    "ollama": "slava.models.ollama:OllamaModel",
+    "openai": "slava.models.openai:OpenAIModel",
+    "yandexgpt": "slava.models.yandexgpt:YandexGPTModel",
+}
+MODELS_TYPES: Final[tuple[str]] = list(MODEL_CLASSES)
 DEVICE: Final[int] = 0
+DEFAULT_MAX_CONCURRENCY: Final[int] = 1
+MODEL_ERROR_PREFIXES: Final[tuple[str, ...]] = ("Error", "The model returned an unexpected response format.")
+
+# Rate control
+RATE_LIMIT_STATUS_CODE: Final[int] = 429
+RATE_CONTROLLER_MAX_RETRIES: Final[int] = 5
+RATE_CONTROLLER_BACKOFF: Final[float] = 1.0  # seconds
+RATE_CONTROLLER_MAX_BACKOFF: Final[float] = 60.0  # seconds
+RATE_CONTROLLER_LATENCY_TARGET: Final[float] = 30.0  # seconds
+RATE_CONTROLLER_ADDITIVE_INCREASE: Final[float] = 1.0
+RATE_CONTROLLER_MULTIPLICATIVE_DECREASE: Final[float] = 0.5
+RATE_CONTROLLER_POLL_INTERVAL: Final[float] = 0.01  # seconds
+
+# HTTP transport
+HTTP_POOL_SIZE: Final[int] = 32
+HTTP_TIMEOUT: Final[float] = 60.0  # seconds
+HTTP_CONNECT_TIMEOUT: Final[float] = 10.0  # seconds
 
 # ClaudeModel
 CLAUDE_MODEL_NAME: Final[str] = "claude-3-5-sonnet-20240620"
 CLAUDE_MODEL_TEMPERATURE: Final[float] = 0.0
 CLAUDE_MODEL_TOP_K: Final[int] = 1
 CLAUDE_MODEL_MAX_TOKENS: Final[int] = 25
+CLAUDE_MODEL_MAX_CONCURRENCY: Final[int] = 8
+CLAUDE_MODEL_REQUESTS_PER_SECOND: Final[float] = 4.0
 
 # GeminiModel
 GEMINI_MODEL_NAME: Final[str] = "gemini-1.5-flash"
+GEMINI_MODEL_MAX_CONCURRENCY: Final[int] = 8
+GEMINI_MODEL_REQUESTS_PER_SECOND: Final[float] = 2.0
 
 # GigaChatModel
 GIGACHAT_MODEL_SCOPE: Final[str] = "GIGACHAT_API_PERS"
 GIGACHAT_MODEL_TEMPERATURE: Final[float] = 0.0
 GIGACHAT_MODEL_TOP_K: Final[int] = 1
 GIGACHAT_MODEL_MAX_TOKENS: Final[int] = 25
+GIGACHAT_MODEL_MAX_CONCURRENCY: Final[int] = 4
+GIGACHAT_MODEL_REQUESTS_PER_SECOND: Final[float] = 2.0
 
 # HuggingFaceModel
 HUGGINGFACE_MODEL_TEMPERATURE: Final[float] = 0.0
 HUGGINGFACE_MODEL_TOP_K: Final[int] = 1
 HUGGINGFACE_MODEL_MAX_TOKENS: Final[int] = 25
+HUGGINGFACE_MODEL_MAX_CONCURRENCY: Final[int] = 1
+HUGGINGFACE_MODEL_BATCH_SIZE: Final[int] = 8
+HUGGINGFACE_PREFIX_CACHE_MAX_BYTES: Final[int] = 1024**3
+HUGGINGFACE_PREFIX_MIN_TOKENS: Final[int] = 16
 
 # OllamaModel
 OLLAMA_MODEL_TEMPERATURE: Final[float] = 0.0
 OLLAMA_MODEL_TOP_K: Final[int] = 1
 OLLAMA_MODEL_MAX_TOKENS: Final[int] = 25
+OLLAMA_MODEL_MAX_CONCURRENCY: Final[int] = 1
+OLLAMA_MODEL_REQUESTS_PER_SECOND: Final[float] = 100.0
+OLLAMA_BASE_URL: Final[str] = "http://localhost:11434"
+OLLAMA_GENERATE_URL: Final[str] = "/api/generate"
+OLLAMA_KEEP_ALIVE: Final[str] = "30m"
 
 # OpenAIModel
 OPENAI_MODEL_NAME: Final[str] = "gpt-4o"
 OPENAI_MODEL_TEMPERATURE: Final[float] = 0.0
 OPENAI_MODEL_MAX_TOKENS: Final[int] = 25
+OPENAI_MODEL_MAX_CONCURRENCY: Final[int] = 16
+OPENAI_MODEL_REQUESTS_PER_SECOND: Final[float] = 10.0
 
 
 # YandexGPTModel
@@ -162,12 +270,112 @@ YANDEXGPT_MODEL_URI: Final[str] = "gpt://{}/yandexgpt"
 YANDEXGPT_STREAM: Final[bool] = False
 YANDEXGPT_TEMPERATURE: Final[float] = 0.0
 YANDEXGPT_MAXTOKENS: Final[str] = "25"
+YANDEXGPT_MAX_CONCURRENCY: Final[int] = 4
+YANDEXGPT_REQUESTS_PER_SECOND: Final[float] = 1.0
+
+# FakeModel
+FAKE_MODEL_NAME: Final[str] = "fake-model"
+FAKE_MODEL_P50_LATENCY: Final[float] = 0.5  # seconds
+FAKE_MODEL_P99_LATENCY: Final[float] = 3.0  # seconds
+FAKE_MODEL_RATE_LIMIT_ERROR_RATE: Final[float] = 0.0
+FAKE_MODEL_SERVER_ERROR_RATE: Final[float] = 0.0
+FAKE_MODEL_SERVER_ERROR_STATUS_CODE: Final[int] = 503
+FAKE_MODEL_RETRY_AFTER: Final[float | None] = None  # seconds, sent with the injected 429 errors
+FAKE_MODEL_DEFAULT_ANSWER: Final[str] = "1"
+FAKE_MODEL_MAX_CONCURRENCY: Final[int] = 16
+FAKE_MODEL_REQUESTS_PER_SECOND: Final[float] = 100.0
+
+# Throughput simulator
+SIMULATOR_ACCURACY: Final[float] = 0.5
+SIMULATOR_SEED: Final[int] = 42
 
 # ModelEval
 PROMPT_INSTRUCTION: Final[str] = (
     "\nСАМОЕ ВАЖНОЕ: Отвечай максимально кратко используя только цифры если они даны или слова в задачах с открытым ответом.\nОтвет: "
 )
+PROMPT_SUBSTITUTION_ERROR: Final[str] = "Ошибка: отсутствует необходимая информация для формирования запроса."
+PROMPT_COLUMN: Final[str] = "prompt"
 RESULTS_FILEPATH: Final[str] = "results"
+RESULTS_COLUMNS: Final[list[str]] = [
+    ID_COLUMN,
+    MODEL_COLUMN,
+    SUBJECT_COLUMN,
+    TYPE_COLUMN,
+    PROVOC_SCORE_COLUMN,
+    INPUTS_COLUMN,
+    MODEL_ANSWER_COLUMN,
+    REAL_ANSWER_COLUMN,
+]
+EVALUATION_WINDOW_FACTOR: Final[int] = 2
+EVALUATION_BATCH_QUEUE_FACTOR: Final[int] = 16
+# Chunks a model of run_evaluation_many may read ahead of the slowest one
+EVALUATION_MANY_QUEUE_SIZE: Final[int] = 2
+RESULTS_FLUSH_SIZE: Final[int] = 10
+RESULTS_EXPORT_CHUNK_SIZE: Final[int] = 10000
+DEDUPLICATION_SUMMARY_EXTENSION: Final[str] = "dedup.json"
+
+# Telemetry
+TELEMETRY_LATENCY_BUCKETS: Final[tuple[float, ...]] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # seconds
+TELEMETRY_TOKEN_BUCKETS: Final[tuple[float, ...]] = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+TELEMETRY_METRIC_PREFIX: Final[str] = "slava_provider"
+TELEMETRY_PROMETHEUS_EXTENSION: Final[str] = "prom"
+TELEMETRY_SUMMARY_EXTENSION: Final[str] = "telemetry.json"
+TELEMETRY_ERROR_RESPONSE_CLASS: Final[str] = "ErrorResponse"
+
+# Screening
+SCREENING_STRATA_COLUMNS: Final[list[str]] = [SUBJECT_COLUMN, TYPE_COLUMN, PROVOC_SCORE_COLUMN]
+SCREENING_CI_WIDTH: Final[float] = 0.05  # full width of the score interval, scores are in [0, 1]
+SCREENING_CONFIDENCE: Final[float] = 0.95
+SCREENING_BATCH_SIZE: Final[int] = 50
+SCREENING_MIN_STRATUM_SIZE: Final[int] = 2
+SCREENING_PRIOR_MEAN: Final[float] = 0.5
+SCREENING_PRIOR_VARIANCE: Final[float] = 0.25  # the largest variance of a score in [0, 1]
+SCREENING_SEED: Final[int] = 42
+SCREENING_ALL_STRATA: Final[str] = "ALL"
+# Screening files get their own names, so get_results never reads a sample as a full evaluation
+SCREENING_JOURNAL_EXTENSION: Final[str] = "screening.jsonl"
+SCREENING_EXTENSION: Final[str] = "screening.json"
+SCREENING_ESTIMATES_ATTR: Final[str] = "screening_estimates"
+SCREENING_POPULATION_COLUMN: Final[str] = "population"
+SCREENING_SAMPLED_COLUMN: Final[str] = "sampled"
+SCREENING_SCORE_COLUMN: Final[str] = "score"
+SCREENING_CI_LOW_COLUMN: Final[str] = "ci_low"
+SCREENING_CI_HIGH_COLUMN: Final[str] = "ci_high"
+SCREENING_CI_WIDTH_COLUMN: Final[str] = "ci_width"
+
+# ResultsStore
+RESULTS_STORE_PATH: Final[str] = "results_store"
+RESULTS_STORE_FILE_EXTENSION: Final[str] = ".parquet"
+RUN_COLUMN: Final[str] = "run"
+# Arrow types of the stored columns, so filters compare ids and scores as numbers
+RESULTS_STORE_COLUMN_TYPES: Final[dict[str, str]] = {
+    # Ids are kept as strings, since datasets use both numeric and string ids such as "q5082"
+    ID_COLUMN: "string",
+    MODEL_COLUMN: "string",
+    SUBJECT_COLUMN: "string",
+    TYPE_COLUMN: "string",
+    PROVOC_SCORE_COLUMN: "int64",
+    INPUTS_COLUMN: "string",
+    MODEL_ANSWER_COLUMN: "string",
+    REAL_ANSWER_COLUMN: "string",
+    RUN_COLUMN: "string",
+}
+# Everything the metrics need, i.e. all result columns except the long prompts
+METRICS_RESULTS_COLUMNS: Final[list[str]] = [
+    ID_COLUMN,
+    MODEL_COLUMN,
+    SUBJECT_COLUMN,
+    TYPE_COLUMN,
+    PROVOC_SCORE_COLUMN,
+    MODEL_ANSWER_COLUMN,
+    REAL_ANSWER_COLUMN,
+]
+
+# ResponseCache
+RESPONSE_CACHE_FILEPATH: Final[str] = "cache/responses.sqlite"
+RESPONSE_CACHE_MAX_SIZE: Final[int] = 1024**3  # bytes
+RESPONSE_CACHE_MAX_AGE: Final[int] = 30 * 24 * 60 * 60  # seconds
+RESPONSE_CACHE_EVICTION_INTERVAL: Final[int] = 1000
 
 # Metrics Table
 
@@ -0,0 +1,58 @@
+from contextvars import ContextVar
+from typing import AsyncIterable, Callable, Iterable
+
+from langchain_core.messages import BaseMessage
+from langchain_core.prompt_values import PromptValue
+
+
+def get_prompt_text(input) -> str:
+    if isinstance(input, PromptValue):
+        return input.to_string()
+    if isinstance(input, list):
+        return input[0].content if input and isinstance(input[0], BaseMessage) else ""
+    if isinstance(input, dict):
+        return str(input.get("prompt", ""))
+    return str(input)
+
+
+# Details of the current provider call (queue time, attempts, token usage, error class), collected
+# for the telemetry. The value is a dict shared by the whole call, so nested code can fill it in.
+call_telemetry: ContextVar[dict | None] = ContextVar("call_telemetry", default=None)
+
+
+def record_call_telemetry(**values) -> None:
+    telemetry = call_telemetry.get()
+    if telemetry is not None:
+        telemetry.update({key: value for key, value in values.items() if value is not None})
+
+
+def get_chunk_text(chunk) -> str:
+    # LLMs stream strings and chat models stream message chunks
+    return chunk if isinstance(chunk, str) else str(getattr(chunk, "content", "") or "")
+
+
+def collect_stream(chunks: Iterable, is_complete: Callable[[str], bool]) -> str:
+    """Joins the streamed chunks until the response is complete, then closes the stream."""
+    response = ""
+    try:
+        for chunk in chunks:
+            response += get_chunk_text(chunk)
+            if is_complete(response):
+                break
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return response
+
+
+async def acollect_stream(chunks: AsyncIterable, is_complete: Callable[[str], bool]) -> str:
+    response = ""
+    try:
+        async for chunk in chunks:
+            response += get_chunk_text(chunk)
+            if is_complete(response):
+                break
+    finally:
+        if hasattr(chunks, "aclose"):
+            await chunks.aclose()
+    return response
@@ -1,42 +1,104 @@
+from typing import Callable
+
 import anthropic
-from langchain_core.messages import HumanMessage
+from langchain_core.runnables import Runnable
 
 from slava.config import (
+    CLAUDE_MODEL_MAX_CONCURRENCY,
     CLAUDE_MODEL_MAX_TOKENS,
     CLAUDE_MODEL_NAME,
+    CLAUDE_MODEL_REQUESTS_PER_SECOND,
     CLAUDE_MODEL_TEMPERATURE,
     CLAUDE_MODEL_TOP_K,
     TEXT_COLUMN,
 )
+from slava.models.base import acollect_stream, collect_stream, get_prompt_text, record_call_telemetry
+from slava.models.rate_controller import AdaptiveRateController, get_rate_controller
 
 
 class ClaudeModel:
-    def __init__(self, api_key: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        max_concurrency: int = CLAUDE_MODEL_MAX_CONCURRENCY,
+        requests_per_second: float = CLAUDE_MODEL_REQUESTS_PER_SECOND,
+    ):
+        # Retries are handled by the rate controller
+        self.client = anthropic.Anthropic(api_key=api_key, max_retries=0)
+        self.async_client = anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
+        self.max_concurrency = max_concurrency
+        self.model_name = CLAUDE_MODEL_NAME
+        self.generation_params = {
+            "temperature": CLAUDE_MODEL_TEMPERATURE,
+            "top_k": CLAUDE_MODEL_TOP_K,
+            "max_tokens": CLAUDE_MODEL_MAX_TOKENS,
+        }
 
-        self.model = self.Model(self.client)
+        self.rate_controller = get_rate_controller("claude", requests_per_second, max_concurrency, credential=api_key)
+        self.model = self.Model(self.client, self.async_client, self.rate_controller)
 
-    class Model:
-        def __init__(self, client):
+    class Model(Runnable):
+        def __init__(self, client, async_client, rate_controller: AdaptiveRateController):
             self.client = client
+            self.async_client = async_client
+            self.rate_controller = rate_controller
+
+        @staticmethod
+        def _get_request(input) -> dict:
+            return {
+                "model": CLAUDE_MODEL_NAME,
+                "temperature": CLAUDE_MODEL_TEMPERATURE,
+                "top_k": CLAUDE_MODEL_TOP_K,
+                "max_tokens": CLAUDE_MODEL_MAX_TOKENS,
+                "messages": [{"role": "user", "content": get_prompt_text(input)}],
+            }
 
-        def invoke(self, messages: list[HumanMessage]) -> str:
+        @staticmethod
+        def _get_response_text(message) -> str:
+            usage = getattr(message, "usage", None)
+            record_call_telemetry(
+                prompt_tokens=getattr(usage, "input_tokens", None),
+                response_tokens=getattr(usage, "output_tokens", None),
+            )
+            if isinstance(message.content, list):
+                response_text = "".join(block.text for block in message.content if hasattr(block, TEXT_COLUMN))
+                return response_text.strip()
+            else:
+                return message.content.strip()
+
+        def invoke(self, input, config=None, **kwargs) -> str:
+            try:
+                message = self.rate_controller.call(self.client.messages.create, **self._get_request(input))
+                return self._get_response_text(message)
+            except Exception:
+                return "Error when generating the response by the model."
 
+        async def ainvoke(self, input, config=None, **kwargs) -> str:
             try:
-                prompt = messages[0].content if messages else ""
-
-                message = self.client.messages.create(
-                    model=CLAUDE_MODEL_NAME,
-                    temperature=CLAUDE_MODEL_TEMPERATURE,
-                    top_k=CLAUDE_MODEL_TOP_K,
-                    max_tokens=CLAUDE_MODEL_MAX_TOKENS,
-                    messages=[{"role": "user", "content": prompt}],
+                message = await self.rate_controller.acall(
+                    self.async_client.messages.create, **self._get_request(input)
                 )
+                return self._get_response_text(message)
+            except Exception:
+                return "Error when generating the response by the model."
 
-                if isinstance(message.content, list):
-                    response_text = "".join(block.text for block in message.content if hasattr(block, TEXT_COLUMN))
-                    return response_text.strip()
-                else:
-                    return message.content.strip()
+        def _stream(self, input, is_complete: Callable[[str], bool]) -> str:
+            # Leaving the stream closes the connection, so the rest of the message is not generated
+            with self.client.messages.stream(**self._get_request(input)) as stream:
+                return collect_stream(stream.text_stream, is_complete)
+
+        async def _astream(self, input, is_complete: Callable[[str], bool]) -> str:
+            async with self.async_client.messages.stream(**self._get_request(input)) as stream:
+                return await acollect_stream(stream.text_stream, is_complete)
+
+        def stream_until(self, input, is_complete: Callable[[str], bool], config=None) -> str:
+            try:
+                return self.rate_controller.call(self._stream, input, is_complete).strip()
+            except Exception:
+                return "Error when generating the response by the model."
+
+        async def astream_until(self, input, is_complete: Callable[[str], bool], config=None) -> str:
+            try:
+                return (await self.rate_controller.acall(self._astream, input, is_complete)).strip()
             except Exception:
                 return "Error when generating the response by the model."
@@ -0,0 +1,271 @@
+import asyncio
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from statistics import NormalDist
+from typing import Callable, Union
+
+import numpy as np
+from langchain_core.runnables import Runnable
+
+from slava.config import (
+    FAKE_MODEL_DEFAULT_ANSWER,
+    FAKE_MODEL_MAX_CONCURRENCY,
+    FAKE_MODEL_NAME,
+    FAKE_MODEL_P50_LATENCY,
+    FAKE_MODEL_P99_LATENCY,
+    FAKE_MODEL_RATE_LIMIT_ERROR_RATE,
+    FAKE_MODEL_REQUESTS_PER_SECOND,
+    FAKE_MODEL_RETRY_AFTER,
+    FAKE_MODEL_SERVER_ERROR_RATE,
+    FAKE_MODEL_SERVER_ERROR_STATUS_CODE,
+    RATE_CONTROLLER_LATENCY_TARGET,
+    RATE_CONTROLLER_MAX_RETRIES,
+    RATE_LIMIT_STATUS_CODE,
+)
+from slava.models.base import acollect_stream, collect_stream, get_prompt_text
+from slava.models.rate_controller import AdaptiveRateController
+
+
+class FakeProviderError(Exception):
+    """Injected provider error, shaped like the SDK errors the rate controller retries."""
+
+    def __init__(self, status_code: int, retry_after: float = None):
+        super().__init__(f"Fake provider error {status_code}")
+        self.status_code = status_code
+        self.headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+
+
+class LatencyDistribution:
+    """Log-normal latency with the given median and 99th percentile."""
+
+    def __init__(self, p50: float, p99: float):
+        if p50 <= 0 or p99 < p50:
+            raise ValueError("The latency percentiles must satisfy 0 < p50 <= p99")
+        self.mu = math.log(p50)
+        self.sigma = (math.log(p99) - self.mu) / NormalDist().inv_cdf(0.99)
+
+    def sample(self, rng: random.Random) -> float:
+        return rng.lognormvariate(self.mu, self.sigma)
+
+
+class FakeModelStats:
+    def __init__(self):
+        self.attempt_latencies: list[float] = []
+        self.request_latencies: list[float] = []
+        self.injected_errors = Counter()
+        self.failed_requests = 0
+        self._lock = threading.Lock()
+
+    def record_attempt(self, latency: float, status_code: int = None) -> None:
+        with self._lock:
+            self.attempt_latencies.append(latency)
+            if status_code is not None:
+                self.injected_errors[status_code] += 1
+
+    def record_request(self, latency: float, failed: bool) -> None:
+        with self._lock:
+            self.request_latencies.append(latency)
+            self.failed_requests += failed
+
+    def summary(self) -> dict:
+        latencies = np.array(self.request_latencies) if self.request_latencies else np.zeros(1)
+        attempts = max(1, len(self.attempt_latencies))
+        return {
+            "requests": len(self.request_latencies),
+            "attempts": len(self.attempt_latencies),
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p95": float(np.percentile(latencies, 95)),
+            "latency_p99": float(np.percentile(latencies, 99)),
+            "latency_max": float(latencies.max()),
+            "injected_error_rate": sum(self.injected_errors.values()) / attempts,
+            "injected_errors": dict(self.injected_errors),
+            "failed_request_rate": self.failed_requests / max(1, len(self.request_latencies)),
+        }
+
+
+class FakeModel:
+    """Offline provider with injected latency and errors for tuning concurrency and retries.
+
+    Answers are looked up in ``answers`` (prompt -> answer) or produced by ``answers`` if it is
+    a function, otherwise ``default_answer`` is returned. Calls go through the same rate controller
+    as the real providers, so retries and the adaptive concurrency limit behave as they would.
+    """
+
+    def __init__(
+        self,
+        model_name: str = FAKE_MODEL_NAME,
+        p50_latency: float = FAKE_MODEL_P50_LATENCY,
+        p99_latency: float = FAKE_MODEL_P99_LATENCY,
+        rate_limit_error_rate: float = FAKE_MODEL_RATE_LIMIT_ERROR_RATE,
+        server_error_rate: float = FAKE_MODEL_SERVER_ERROR_RATE,
+        retry_after: float = FAKE_MODEL_RETRY_AFTER,
+        answers: Union[dict[str, str], Callable[[str], str]] = None,
+        default_answer: str = FAKE_MODEL_DEFAULT_ANSWER,
+        max_concurrency: int = FAKE_MODEL_MAX_CONCURRENCY,
+        requests_per_second: float = FAKE_MODEL_REQUESTS_PER_SECOND,
+        max_retries: int = RATE_CONTROLLER_MAX_RETRIES,
+        latency_target: float = RATE_CONTROLLER_LATENCY_TARGET,
+        seed: int = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.model_name = model_name
+        self.generation_params = {
+            "p50_latency": p50_latency,
+            "p99_latency": p99_latency,
+            "rate_limit_error_rate": rate_limit_error_rate,
+            "server_error_rate": server_error_rate,
+        }
+        self.stats = FakeModelStats()
+
+        # Every fake gets its own controller, so simulated runs do not share the adaptive state
+        self.rate_controller = AdaptiveRateController(requests_per_second, max_concurrency, max_retries, latency_target)
+        self.model = self.Model(
+            LatencyDistribution(p50_latency, p99_latency),
+            rate_limit_error_rate,
+            server_error_rate,
+            retry_after,
+            answers,
+            default_answer,
+            self.stats,
+            self.rate_controller,
+            random.Random(seed),
+        )
+
+    class Model(Runnable):
+        def __init__(
+            self,
+            latency: LatencyDistribution,
+            rate_limit_error_rate: float,
+            server_error_rate: float,
+            retry_after: float,
+            answers: Union[dict[str, str], Callable[[str], str]],
+            default_answer: str,
+            stats: FakeModelStats,
+            rate_controller: AdaptiveRateController,
+            rng: random.Random,
+        ):
+            self.latency = latency
+            self.rate_limit_error_rate = rate_limit_error_rate
+            self.server_error_rate = server_error_rate
+            self.retry_after = retry_after
+            self.answers = answers
+            self.default_answer = default_answer
+            self.stats = stats
+            self.rate_controller = rate_controller
+            self.rng = rng
+            self._rng_lock = threading.Lock()
+
+        def _sample(self) -> tuple[float, int | None]:
+            with self._rng_lock:
+                latency = self.latency.sample(self.rng)
+                draw = self.rng.random()
+
+            if draw < self.rate_limit_error_rate:
+                return latency, RATE_LIMIT_STATUS_CODE
+            elif draw < self.rate_limit_error_rate + self.server_error_rate:
+                return latency, FAKE_MODEL_SERVER_ERROR_STATUS_CODE
+            return latency, None
+
+        def _get_answer(self, prompt: str) -> str:
+            if callable(self.answers):
+                return self.answers(prompt)
+            elif self.answers is not None:
+                return self.answers.get(prompt, self.default_answer)
+            return self.default_answer
+
+        def _complete(self, latency: float, status_code: int | None, prompt: str) -> str:
+            self.stats.record_attempt(latency, status_code)
+            if status_code is not None:
+                raise FakeProviderError(status_code, self.retry_after)
+            return self._get_answer(prompt)
+
+        def _generate(self, prompt: str) -> str:
+            latency, status_code = self._sample()
+            time.sleep(latency)
+            return self._complete(latency, status_code, prompt)
+
+        async def _agenerate(self, prompt: str) -> str:
+            latency, status_code = self._sample()
+            await asyncio.sleep(latency)
+            return self._complete(latency, status_code, prompt)
+
+        def invoke(self, input, config=None, **kwargs) -> str:
+            started_at = time.monotonic()
+            try:
+                response = self.rate_controller.call(self._generate, get_prompt_text(input))
+                self.stats.record_request(time.monotonic() - started_at, failed=False)
+                return response
+            except FakeProviderError as e:
+                self.stats.record_request(time.monotonic() - started_at, failed=True)
+                return f"Error: {e}"
+
+        async def ainvoke(self, input, config=None, **kwargs) -> str:
+            started_at = time.monotonic()
+            try:
+                response = await self.rate_controller.acall(self._agenerate, get_prompt_text(input))
+                self.stats.record_request(time.monotonic() - started_at, failed=False)
+                return response
+            except FakeProviderError as e:
+                self.stats.record_request(time.monotonic() - started_at, failed=True)
+                return f"Error: {e}"
+
+        @staticmethod
+        def _iter_tokens(latency: float, answer: str):
+            # The latency is spread over the words, so a stream that is stopped early takes less time
+            tokens = re.findall(r"\s*\S+", answer) or [answer]
+            for token in tokens:
+                time.sleep(latency / len(tokens))
+                yield token
+
+        @staticmethod
+        async def _aiter_tokens(latency: float, answer: str):
+            tokens = re.findall(r"\s*\S+", answer) or [answer]
+            for token in tokens:
+                await asyncio.sleep(latency / len(tokens))
+                yield token
+
+        def _stream(self, prompt: str, is_complete: Callable[[str], bool]) -> str:
+            latency, status_code = self._sample()
+            if status_code is not None:
+                time.sleep(latency)
+                return self._complete(latency, status_code, prompt)
+
+            started_at = time.monotonic()
+            response = collect_stream(self._iter_tokens(latency, self._get_answer(prompt)), is_complete)
+            self.stats.record_attempt(time.monotonic() - started_at)
+            return response
+
+        async def _astream(self, prompt: str, is_complete: Callable[[str], bool]) -> str:
+            latency, status_code = self._sample()
+            if status_code is not None:
+                await asyncio.sleep(latency)
+                return self._complete(latency, status_code, prompt)
+
+            started_at = time.monotonic()
+            response = await acollect_stream(self._aiter_tokens(latency, self._get_answer(prompt)), is_complete)
+            self.stats.record_attempt(time.monotonic() - started_at)
+            return response
+
+        def stream_until(self, input, is_complete: Callable[[str], bool], config=None) -> str:
+            started_at = time.monotonic()
+            try:
+                response = self.rate_controller.call(self._stream, get_prompt_text(input), is_complete)
+                self.stats.record_request(time.monotonic() - started_at, failed=False)
+                return response
+            except FakeProviderError as e:
+                self.stats.record_request(time.monotonic() - started_at, failed=True)
+                return f"Error: {e}"
+
+        async def astream_until(self, input, is_complete: Callable[[str], bool], config=None) -> str:
+            started_at = time.monotonic()
+            try:
+                response = await self.rate_controller.acall(self._astream, get_prompt_text(input), is_complete)
+                self.stats.record_request(time.monotonic() - started_at, failed=False)
+                return response
+            except FakeProviderError as e:
+                self.stats.record_request(time.monotonic() - started_at, failed=True)
+                return f"Error: {e}"
@@ -1,32 +1,62 @@
 import google.generativeai as genai
-from langchain_core.messages import HumanMessage
+from langchain_core.runnables import Runnable
 
-from slava.config import GEMINI_MODEL_NAME, TEXT_COLUMN
+from slava.config import (
+    GEMINI_MODEL_MAX_CONCURRENCY,
+    GEMINI_MODEL_NAME,
+    GEMINI_MODEL_REQUESTS_PER_SECOND,
+    TEXT_COLUMN,
+)
+from slava.models.base import get_prompt_text, record_call_telemetry
+from slava.models.rate_controller import AdaptiveRateController, get_rate_controller
 
 
 class GeminiModel:
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        max_concurrency: int = GEMINI_MODEL_MAX_CONCURRENCY,
+        requests_per_second: float = GEMINI_MODEL_REQUESTS_PER_SECOND,
+    ):
         genai.configure(api_key=api_key)
+        self.max_concurrency = max_concurrency
+        self.model_name = GEMINI_MODEL_NAME
+        self.generation_params = {}
+        self.rate_controller = get_rate_controller("gemini", requests_per_second, max_concurrency, credential=api_key)
         self.model = self.Model(
             genai.GenerativeModel(
                 GEMINI_MODEL_NAME,
-            )
+            ),
+            self.rate_controller,
         )
 
-    class Model:
-        def __init__(self, model):
+    class Model(Runnable):
+        def __init__(self, model, rate_controller: AdaptiveRateController):
             self.model = model
+            self.rate_controller = rate_controller
+
+        @staticmethod
+        def _get_response_text(response) -> str:
+            usage = getattr(response, "usage_metadata", None)
+            record_call_telemetry(
+                prompt_tokens=getattr(usage, "prompt_token_count", None),
+                response_tokens=getattr(usage, "candidates_token_count", None),
+            )
+            if hasattr(response, TEXT_COLUMN):
+                return response.text.strip()
+            else:
+                return "The model returned an unexpected response format."
 
-        def invoke(self, messages: list[HumanMessage]) -> str:
+        def invoke(self, input, config=None, **kwargs) -> str:
             try:
-                prompt = messages[0].content if messages else ""
-
-                response = self.model.generate_content(prompt)
-
-                if hasattr(response, TEXT_COLUMN):
-                    return response.text.strip()
-                else:
-                    return "The model returned an unexpected response format."
+                response = self.rate_controller.call(self.model.generate_content, get_prompt_text(input))
+                return self._get_response_text(response)
+            except Exception:
+                return "Error when generating the response by the model."
 
+        async def ainvoke(self, input, config=None, **kwargs) -> str:
+            try:
+                response = await self.rate_controller.acall(self.model.generate_content_async, get_prompt_text(input))
+                return self._get_response_text(response)
             except Exception:
                 return "Error when generating the response by the model."
@@ -1,11 +1,14 @@
 from langchain.chat_models import GigaChat
 
 from slava.config import (
+    GIGACHAT_MODEL_MAX_CONCURRENCY,
     GIGACHAT_MODEL_MAX_TOKENS,
+    GIGACHAT_MODEL_REQUESTS_PER_SECOND,
     GIGACHAT_MODEL_SCOPE,
     GIGACHAT_MODEL_TEMPERATURE,
     GIGACHAT_MODEL_TOP_K,
 )
+from slava.models.rate_controller import RateControlledRunnable, get_rate_controller
 
 
 class GigaChatModel:
@@ -17,12 +20,21 @@ class GigaChatModel:
         temperature: float = GIGACHAT_MODEL_TEMPERATURE,
         max_tokens: int = GIGACHAT_MODEL_MAX_TOKENS,
         top_k: int = GIGACHAT_MODEL_TOP_K,
+        max_concurrency: int = GIGACHAT_MODEL_MAX_CONCURRENCY,
+        requests_per_second: float = GIGACHAT_MODEL_REQUESTS_PER_SECOND,
     ):
-        self.model = GigaChat(
-            credentials=api_key,
-            scope=scope,
-            model=model_name,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            top_k=top_k,
+        self.max_concurrency = max_concurrency
+        self.model_name = model_name
+        self.generation_params = {"temperature": temperature, "max_tokens": max_tokens, "top_k": top_k}
+        self.rate_controller = get_rate_controller("gigachat", requests_per_second, max_concurrency, credential=api_key)
+        self.model = RateControlledRunnable(
+            GigaChat(
+                credentials=api_key,
+                scope=scope,
+                model=model_name,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                top_k=top_k,
+            ),
+            self.rate_controller,
         )
@@ -1,6 +1,14 @@
-from langchain_huggingface import HuggingFacePipeline
-
-from slava.config import DEVICE, HUGGINGFACE_MODEL_MAX_TOKENS, HUGGINGFACE_MODEL_TEMPERATURE, HUGGINGFACE_MODEL_TOP_K
+from slava.config import (
+    DEVICE,
+    HUGGINGFACE_MODEL_BATCH_SIZE,
+    HUGGINGFACE_MODEL_MAX_CONCURRENCY,
+    HUGGINGFACE_MODEL_MAX_TOKENS,
+    HUGGINGFACE_MODEL_TEMPERATURE,
+    HUGGINGFACE_MODEL_TOP_K,
+    HUGGINGFACE_PREFIX_CACHE_MAX_BYTES,
+    HUGGINGFACE_PREFIX_MIN_TOKENS,
+)
+from slava.models.prefix_cache import PrefixCache, get_common_prefix_length
 
 
 class HuggingFaceModel:
@@ -11,10 +19,157 @@ class HuggingFaceModel:
         top_k: int = HUGGINGFACE_MODEL_TOP_K,
         temperature: float = HUGGINGFACE_MODEL_TEMPERATURE,
         device: int = DEVICE,
+        max_concurrency: int = HUGGINGFACE_MODEL_MAX_CONCURRENCY,
+        batch_size: int = HUGGINGFACE_MODEL_BATCH_SIZE,
+        prefix_caching: bool = False,
+        prefix_cache_max_bytes: int = HUGGINGFACE_PREFIX_CACHE_MAX_BYTES,
     ):
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.model_name = model_name
+        self.generation_params = {"max_new_tokens": max_tokens, "top_k": top_k, "temperature": temperature}
+
+        # langchain-huggingface imports transformers and torch, so it is only imported when a model is loaded
+        from langchain_huggingface import HuggingFacePipeline
+
         self.model = HuggingFacePipeline.from_model_id(
             model_id=model_name,
             device=device,
             task="text-generation",
-            pipeline_kwargs={"max_new_tokens": max_tokens, "top_k": top_k, "temperature": temperature},
+            batch_size=batch_size,
+            pipeline_kwargs=self.generation_params,
+        )
+        self.prefix_cache = PrefixCache(prefix_cache_max_bytes) if prefix_caching else None
+
+        # Decoder-only models have to be padded on the left for batched generation
+        tokenizer = self.model.pipeline.tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"
+
+    def _get_length_buckets(self, prompts: list[str]) -> list[list[int]]:
+        lengths = [len(input_ids) for input_ids in self.model.pipeline.tokenizer(prompts)["input_ids"]]
+        order = sorted(range(len(prompts)), key=lengths.__getitem__)
+        return [order[i : i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+    def _generate_buckets(self, prompts: list[str]) -> list[str]:
+        responses = [""] * len(prompts)
+        for bucket in self._get_length_buckets(prompts):
+            outputs = self.model.pipeline(
+                [prompts[i] for i in bucket],
+                batch_size=len(bucket),
+                return_full_text=False,
+            )
+            for i, output in zip(bucket, outputs):
+                responses[i] = output[0]["generated_text"]
+        return responses
+
+    def _get_prefixes(self, input_ids: list[list[int]]) -> list[tuple[int, ...] | None]:
+        # Sorted token ids put the prompts of one instruction template next to each other,
+        # and a run of them shares the template text up to its first field
+        order = sorted(range(len(input_ids)), key=input_ids.__getitem__)
+        runs, run = [], order[:1]
+        for previous, i in zip(order, order[1:]):
+            if get_common_prefix_length(input_ids[previous], input_ids[i]) >= HUGGINGFACE_PREFIX_MIN_TOKENS:
+                run.append(i)
+            else:
+                runs.append(run)
+                run = [i]
+        runs.append(run)
+
+        prefixes = [None] * len(input_ids)
+        for run in filter(None, runs):
+            # The last prompt token is never cached, since generation needs at least one input token
+            max_length = min(len(input_ids[i]) for i in run) - 1
+            length = min(get_common_prefix_length(input_ids[run[0]], input_ids[run[-1]]), max_length)
+            for i in run:
+                # A cached prefix of an earlier batch is reused even for a prompt without a run
+                prefixes[i] = self.prefix_cache.find(input_ids[i], len(input_ids[i]) - 1)
+                if prefixes[i] is None and len(run) > 1 and length >= HUGGINGFACE_PREFIX_MIN_TOKENS:
+                    prefixes[i] = tuple(input_ids[i][:length])
+        return prefixes
+
+    def _compute_prefix_cache(self, prefix: tuple[int, ...]):
+        import torch
+        from transformers import DynamicCache
+
+        model = self.model.pipeline.model
+        inputs = torch.tensor([prefix], device=model.device)
+        with torch.no_grad():
+            past_key_values = model(input_ids=inputs, past_key_values=DynamicCache(), use_cache=True).past_key_values
+        # The legacy format, a tuple of key/value tensors per layer, is repeated for the prompts of a batch
+        return past_key_values.to_legacy_cache()
+
+    @staticmethod
+    def _expand_prefix_cache(past_key_values, batch_size: int):
+        from transformers import DynamicCache
+
+        # Generation extends the cache in place, so every batch gets its own copy of the cached prefix
+        return DynamicCache.from_legacy_cache(
+            tuple(
+                (key.repeat(batch_size, 1, 1, 1), value.repeat(batch_size, 1, 1, 1)) for key, value in past_key_values
+            )
+        )
+
+    def _generate_with_prefix(self, input_ids: list[list[int]], prefix: tuple[int, ...]) -> list[str]:
+        import torch
+
+        model, tokenizer = self.model.pipeline.model, self.model.pipeline.tokenizer
+        past_key_values = self._expand_prefix_cache(
+            self.prefix_cache.get_or_compute(prefix, self._compute_prefix_cache), len(input_ids)
         )
+
+        # The suffixes are padded on the left, between the cached prefix and themselves,
+        # and the attention mask hides the padding, so position ids stay those of the unpadded prompts
+        suffix_length = max(len(ids) for ids in input_ids) - len(prefix)
+        rows, attention_mask = [], []
+        for ids in input_ids:
+            padding = suffix_length - len(ids) + len(prefix)
+            rows.append(ids[: len(prefix)] + [tokenizer.pad_token_id] * padding + ids[len(prefix) :])
+            attention_mask.append([1] * len(prefix) + [0] * padding + [1] * (len(ids) - len(prefix)))
+
+        inputs = torch.tensor(rows, device=model.device)
+        with torch.no_grad():
+            outputs = model.generate(
+                input_ids=inputs,
+                attention_mask=torch.tensor(attention_mask, device=model.device),
+                past_key_values=past_key_values,
+                pad_token_id=tokenizer.pad_token_id,
+                **self.generation_params,
+            )
+        return tokenizer.batch_decode(outputs[:, inputs.shape[1] :], skip_special_tokens=True)
+
+    def _generate_with_prefixes(self, prompts: list[str]) -> list[str]:
+        input_ids = self.model.pipeline.tokenizer(prompts)["input_ids"]
+        prefixes = self._get_prefixes(input_ids)
+
+        groups = {}
+        for i, prefix in enumerate(prefixes):
+            if prefix is not None:
+                groups.setdefault(prefix, []).append(i)
+
+        responses = [""] * len(prompts)
+        # Prompts of one prefix are generated in batches of a similar length, so its cache is computed once
+        for prefix, group in groups.items():
+            group.sort(key=lambda i: len(input_ids[i]))
+            for start in range(0, len(group), self.batch_size):
+                bucket = group[start : start + self.batch_size]
+                for i, response in zip(bucket, self._generate_with_prefix([input_ids[i] for i in bucket], prefix)):
+                    responses[i] = response
+
+        uncached = [i for i, prefix in enumerate(prefixes) if prefix is None]
+        for i, response in zip(uncached, self._generate_buckets([prompts[i] for i in uncached])):
+            responses[i] = response
+        return responses
+
+    def generate_batch(self, prompts: list[str]) -> list[str]:
+        """Generates responses for the prompts in batches of prompts with a similar tokenized length.
+
+        Similar lengths keep the padding low, and the responses are returned in the order of the prompts.
+        With prefix caching, prompts that share an instruction template are batched together, and the
+        key/value cache of the shared prefix is computed once and repeated for every prompt of a batch.
+        Only the suffixes are prefilled, at the cost of a copy of the prefix cache per prompt of a batch.
+        """
+        if self.prefix_cache is not None:
+            return self._generate_with_prefixes(prompts)
+        return self._generate_buckets(prompts)
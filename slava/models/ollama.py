@@ -1,19 +1,131 @@
-from langchain_ollama.llms import OllamaLLM
+import logging
 
-from slava.config import OLLAMA_MODEL_MAX_TOKENS, OLLAMA_MODEL_TEMPERATURE, OLLAMA_MODEL_TOP_K
+from langchain_core.runnables import Runnable
+
+from slava.config import (
+    HTTP_TIMEOUT,
+    OLLAMA_BASE_URL,
+    OLLAMA_GENERATE_URL,
+    OLLAMA_KEEP_ALIVE,
+    OLLAMA_MODEL_MAX_CONCURRENCY,
+    OLLAMA_MODEL_MAX_TOKENS,
+    OLLAMA_MODEL_REQUESTS_PER_SECOND,
+    OLLAMA_MODEL_TEMPERATURE,
+    OLLAMA_MODEL_TOP_K,
+)
+from slava.models.base import get_prompt_text, record_call_telemetry
+from slava.models.rate_controller import RateControlledRunnable, get_rate_controller
+from slava.models.transport import HTTPTransport
 
 
 class OllamaModel:
+    """Ollama model through OllamaLLM or, with ``http_client=True``, through the pooled HTTP transport.
+
+    The HTTP client sends up to ``max_concurrency`` requests at once, which should match the server's
+    OLLAMA_NUM_PARALLEL slots. ``keep_alive`` keeps the model loaded for the whole run, and ``warmup``
+    loads it before the first prompt, so the loading time is not counted as the latency of a request.
+    """
+
     def __init__(
         self,
         model_name,
         temperature: float = OLLAMA_MODEL_TEMPERATURE,
         top_k: int = OLLAMA_MODEL_TOP_K,
         max_tokens: int = OLLAMA_MODEL_MAX_TOKENS,
+        max_concurrency: int = OLLAMA_MODEL_MAX_CONCURRENCY,
+        requests_per_second: float = OLLAMA_MODEL_REQUESTS_PER_SECOND,
+        base_url: str = OLLAMA_BASE_URL,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        http_client: bool = False,
+        warmup: bool = False,
+        timeout: float = HTTP_TIMEOUT,
     ):
-        self.model = OllamaLLM(
-            model=model_name,
-            temperature=temperature,
-            top_k=top_k,
-            max_tokens=max_tokens,
+        self.max_concurrency = max_concurrency
+        self.model_name = model_name
+        self.keep_alive = keep_alive
+        self.generation_params = {"temperature": temperature, "top_k": top_k, "max_tokens": max_tokens}
+        # Every server has its own slots, so it gets its own rate controller
+        self.rate_controller = get_rate_controller(f"ollama:{base_url}", requests_per_second, max_concurrency)
+        self.base_url = base_url
+        self.timeout = timeout
+        self._transport: HTTPTransport = None
+
+        if http_client:
+            self.model = self.Model(self)
+        else:
+            # langchain-ollama is only needed without the HTTP client
+            from langchain_ollama.llms import OllamaLLM
+
+            self.model = RateControlledRunnable(
+                OllamaLLM(
+                    model=model_name,
+                    temperature=temperature,
+                    top_k=top_k,
+                    max_tokens=max_tokens,
+                    base_url=base_url,
+                    keep_alive=keep_alive,
+                ),
+                self.rate_controller,
+            )
+
+        if warmup:
+            self.warmup()
+
+    @property
+    def transport(self) -> HTTPTransport:
+        # Only the HTTP client and the warmup send requests through the transport, so it is created on first use
+        if self._transport is None:
+            self._transport = HTTPTransport(
+                base_url=self.base_url, pool_size=self.max_concurrency, timeout=self.timeout
+            )
+        return self._transport
+
+    class Model(Runnable):
+        def __init__(self, client):
+            self.client = client
+
+        def invoke(self, input, config=None, **kwargs) -> str:
+            try:
+                return self.client.rate_controller.call(self.client.get_response, get_prompt_text(input))
+            except Exception as e:
+                return f"Error: {e}"
+
+        async def ainvoke(self, input, config=None, **kwargs) -> str:
+            try:
+                return await self.client.rate_controller.acall(self.client.aget_response, get_prompt_text(input))
+            except Exception as e:
+                return f"Error: {e}"
+
+    def _get_request(self, prompt: str) -> dict:
+        return {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": self.generation_params["temperature"],
+                "top_k": self.generation_params["top_k"],
+                "num_predict": self.generation_params["max_tokens"],
+            },
+        }
+
+    @staticmethod
+    def _get_response_text(completion: dict) -> str:
+        record_call_telemetry(
+            prompt_tokens=completion.get("prompt_eval_count"), response_tokens=completion.get("eval_count")
         )
+        return completion["response"]
+
+    def get_response(self, prompt: str = None) -> str:
+        return self._get_response_text(self.transport.post(OLLAMA_GENERATE_URL, self._get_request(prompt)))
+
+    async def aget_response(self, prompt: str = None) -> str:
+        return self._get_response_text(await self.transport.apost(OLLAMA_GENERATE_URL, self._get_request(prompt)))
+
+    def warmup(self) -> None:
+        # A request without a prompt only loads the model and keeps it loaded for keep_alive
+        try:
+            self.transport.post(OLLAMA_GENERATE_URL, {"model": self.model_name, "keep_alive": self.keep_alive})
+            logging.info(f"Model {self.model_name} is loaded and kept alive for {self.keep_alive}")
+        except Exception as e:
+            logging.info(f"Warmup of {self.model_name} failed: {e}")
@@ -1,36 +1,150 @@
-from langchain_core.messages import HumanMessage
+from typing import Callable
+
 from langchain_core.runnables import Runnable
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
-from slava.config import OPENAI_MODEL_MAX_TOKENS, OPENAI_MODEL_NAME, OPENAI_MODEL_TEMPERATURE
+from slava.config import (
+    HTTP_POOL_SIZE,
+    HTTP_TIMEOUT,
+    OPENAI_MODEL_MAX_CONCURRENCY,
+    OPENAI_MODEL_MAX_TOKENS,
+    OPENAI_MODEL_NAME,
+    OPENAI_MODEL_REQUESTS_PER_SECOND,
+    OPENAI_MODEL_TEMPERATURE,
+)
+from slava.models.base import acollect_stream, collect_stream, get_prompt_text, record_call_telemetry
+from slava.models.rate_controller import AdaptiveRateController, get_rate_controller
+from slava.models.transport import HTTPTransport
 
 
 class OpenAIModel:
-    def __init__(self, api_key: str, base_url: str = None, model_name: str = OPENAI_MODEL_NAME):
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = None,
+        model_name: str = OPENAI_MODEL_NAME,
+        max_concurrency: int = OPENAI_MODEL_MAX_CONCURRENCY,
+        requests_per_second: float = OPENAI_MODEL_REQUESTS_PER_SECOND,
+        transport: HTTPTransport = None,
+        pool_size: int = HTTP_POOL_SIZE,
+        timeout: float = HTTP_TIMEOUT,
+    ):
+        # A transport can be shared by several models pointed at the same OpenAI-compatible base_url
+        self.transport = transport or HTTPTransport(pool_size=pool_size, timeout=timeout)
+
+        # Retries are handled by the rate controller
+        client_params = {
+            "api_key": api_key,
+            "base_url": base_url,
+            "max_retries": 0,
+            "timeout": self.transport.timeout,
+        }
+        self.client_params = client_params
+        self.client = OpenAI(**client_params, http_client=self.transport.client)
+        self._async_client: AsyncOpenAI = None
+        self._async_http_client = None
         self.model_name = model_name
-        self.model = self.Model(self.client, self.model_name)
+        self.max_concurrency = max_concurrency
+        self.generation_params = {
+            "base_url": base_url,
+            "max_tokens": OPENAI_MODEL_MAX_TOKENS,
+            "temperature": OPENAI_MODEL_TEMPERATURE,
+        }
+        self.rate_controller = get_rate_controller(
+            f"openai:{base_url}", requests_per_second, max_concurrency, credential=api_key
+        )
+        self.model = self.Model(self.client, self.model_name, self, self.rate_controller)
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        # The transport creates an async HTTP client for every event loop, and the SDK client follows it
+        http_client = self.transport.async_client
+        if self._async_client is None or self._async_http_client is not http_client:
+            self._async_client = AsyncOpenAI(**self.client_params, http_client=http_client)
+            self._async_http_client = http_client
+        return self._async_client
 
     class Model(Runnable):
-        def __init__(self, client, model_name: str = OPENAI_MODEL_NAME):
+        def __init__(
+            self, client, model_name: str, openai_model: "OpenAIModel", rate_controller: AdaptiveRateController
+        ):
             self.client = client
             self.model_name = model_name
+            self.openai_model = openai_model
+            self.rate_controller = rate_controller
+
+        @property
+        def async_client(self) -> AsyncOpenAI:
+            return self.openai_model.async_client
+
+        def _get_request(self, input) -> dict:
+            messages = [
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": get_prompt_text(input)},
+            ]
+            return {
+                "model": self.model_name,
+                "messages": messages,
+                "max_tokens": OPENAI_MODEL_MAX_TOKENS,
+                "temperature": OPENAI_MODEL_TEMPERATURE,
+            }
+
+        @staticmethod
+        def _get_response_text(completion) -> str:
+            usage = getattr(completion, "usage", None)
+            record_call_telemetry(
+                prompt_tokens=getattr(usage, "prompt_tokens", None),
+                response_tokens=getattr(usage, "completion_tokens", None),
+            )
+            return completion.choices[0].message.content.strip()
 
         def invoke(self, input: dict, config=None, **kwargs) -> str:
-            prompt = str(input)
             try:
-                messages = [
-                    {"role": "system", "content": "You are a helpful assistant."},
-                    {"role": "user", "content": prompt},
-                ]
-
-                completion = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    max_tokens=OPENAI_MODEL_MAX_TOKENS,
-                    temperature=OPENAI_MODEL_TEMPERATURE,
+                completion = self.rate_controller.call(self.client.chat.completions.create, **self._get_request(input))
+                return self._get_response_text(completion)
+            except Exception as e:
+                return f"Error: {e}"
+
+        async def ainvoke(self, input: dict, config=None, **kwargs) -> str:
+            try:
+                completion = await self.rate_controller.acall(
+                    self.async_client.chat.completions.create, **self._get_request(input)
                 )
+                return self._get_response_text(completion)
+            except Exception as e:
+                return f"Error: {e}"
+
+        @staticmethod
+        def _get_chunk_texts(stream):
+            for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+
+        @staticmethod
+        async def _aget_chunk_texts(stream):
+            async for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
+
+        def _stream(self, input, is_complete: Callable[[str], bool]) -> str:
+            # Leaving the stream closes the connection, so the rest of the completion is not generated
+            with self.client.chat.completions.create(**self._get_request(input), stream=True) as stream:
+                return collect_stream(self._get_chunk_texts(stream), is_complete)
+
+        async def _astream(self, input, is_complete: Callable[[str], bool]) -> str:
+            async with await self.async_client.chat.completions.create(
+                **self._get_request(input), stream=True
+            ) as stream:
+                return await acollect_stream(self._aget_chunk_texts(stream), is_complete)
 
-                return completion.choices[0].message.content.strip()
+        def stream_until(self, input, is_complete: Callable[[str], bool], config=None) -> str:
+            try:
+                return self.rate_controller.call(self._stream, input, is_complete).strip()
+            except Exception as e:
+                return f"Error: {e}"
+
+        async def astream_until(self, input, is_complete: Callable[[str], bool], config=None) -> str:
+            try:
+                return (await self.rate_controller.acall(self._astream, input, is_complete)).strip()
             except Exception as e:
                 return f"Error: {e}"
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from typing import Callable
+
+from slava.config import HUGGINGFACE_PREFIX_CACHE_MAX_BYTES
+
+
+def get_nbytes(value) -> int:
+    # Key/value caches are nested lists, tuples or cache objects of tensors, depending on the transformers version
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return value.element_size() * value.nelement()
+    elif isinstance(value, (list, tuple)):
+        return sum(get_nbytes(item) for item in value)
+    elif isinstance(value, dict):
+        return sum(get_nbytes(item) for item in value.values())
+    elif hasattr(value, "__dict__"):
+        return sum(get_nbytes(item) for item in vars(value).values())
+    return 0
+
+
+def get_common_prefix_length(first: list[int], second: list[int]) -> int:
+    length = 0
+    for first_id, second_id in zip(first, second):
+        if first_id != second_id:
+            break
+        length += 1
+    return length
+
+
+class PrefixCache:
+    """LRU cache of the key/value caches of shared prompt prefixes, bounded by their memory size.
+
+    The prefixes are token id tuples, and a lookup returns the longest cached prefix of the prompt.
+    The cached value itself is returned, so callers copy it before generation extends it in place.
+    """
+
+    def __init__(self, max_bytes: int = HUGGINGFACE_PREFIX_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[int, ...], tuple[object, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def find(self, input_ids: list[int], max_length: int) -> tuple[int, ...] | None:
+        # Only a few templates are cached at a time, so a linear scan is enough
+        prefixes = [
+            prefix
+            for prefix in self._entries
+            if len(prefix) <= max_length and tuple(input_ids[: len(prefix)]) == prefix
+        ]
+        return max(prefixes, key=len) if prefixes else None
+
+    def get(self, prefix: tuple[int, ...]):
+        self._entries.move_to_end(prefix)
+        self.hits += 1
+        return self._entries[prefix][0]
+
+    def get_or_compute(self, prefix: tuple[int, ...], compute: Callable[[tuple[int, ...]], object]):
+        if prefix in self._entries:
+            return self.get(prefix)
+
+        self.misses += 1
+        value = compute(prefix)
+        self.put(prefix, value)
+        return value
+
+    def put(self, prefix: tuple[int, ...], value) -> None:
+        nbytes = get_nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+
+        if prefix in self._entries:
+            self.nbytes -= self._entries.pop(prefix)[1]
+        self._entries[prefix] = (value, nbytes)
+        self.nbytes += nbytes
+
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= evicted_nbytes
@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable
+
+from langchain_core.runnables import Runnable
+
+from slava.config import (
+    RATE_CONTROLLER_ADDITIVE_INCREASE,
+    RATE_CONTROLLER_BACKOFF,
+    RATE_CONTROLLER_LATENCY_TARGET,
+    RATE_CONTROLLER_MAX_BACKOFF,
+    RATE_CONTROLLER_MAX_RETRIES,
+    RATE_CONTROLLER_MULTIPLICATIVE_DECREASE,
+    RATE_CONTROLLER_POLL_INTERVAL,
+    RATE_LIMIT_STATUS_CODE,
+)
+from slava.models.base import acollect_stream, collect_stream, record_call_telemetry
+
+
+def _is_gigachat_response_error(error: Exception) -> bool:
+    # gigachat.exceptions.ResponseError keeps (url, status_code, content, headers) in its args
+    return len(error.args) == 4 and isinstance(error.args[1], int)
+
+
+def get_status_code(error: Exception) -> int | None:
+    for source in (error, getattr(error, "response", None)):
+        for attribute in ("status_code", "code"):
+            status_code = getattr(source, attribute, None)
+            if isinstance(status_code, int):
+                return status_code
+
+    if _is_gigachat_response_error(error):
+        return error.args[1]
+    return None
+
+
+def get_retry_after(error: Exception) -> float | None:
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None)
+    if headers is None and _is_gigachat_response_error(error):
+        headers = error.args[3]
+
+    value = headers.get("retry-after") or headers.get("Retry-After") if headers else None
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    status_code = get_status_code(error)
+    return status_code is not None and (status_code == RATE_LIMIT_STATUS_CODE or status_code >= 500)
+
+
+class AdaptiveRateController:
+    """Token bucket with an AIMD concurrency limit shared by all calls to one provider.
+
+    The bucket caps the request rate. The concurrency limit grows additively after successful
+    calls and shrinks multiplicatively after 429/5xx errors or slow responses. Retry-After
+    headers pause every caller of the provider, and retryable errors are retried with backoff.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float,
+        max_concurrency: int,
+        max_retries: int = RATE_CONTROLLER_MAX_RETRIES,
+        latency_target: float = RATE_CONTROLLER_LATENCY_TARGET,
+    ):
+        self.requests_per_second = requests_per_second
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.latency_target = latency_target
+
+        self.concurrency_limit = 1.0
+        self.in_flight = 0
+
+        self._tokens = 1.0
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self._slot_released = threading.Condition(self._lock)
+
+    def set_limits(self, requests_per_second: float, max_concurrency: int) -> None:
+        with self._lock:
+            self.requests_per_second = requests_per_second
+            self.max_concurrency = max_concurrency
+            self.concurrency_limit = min(self.concurrency_limit, float(max_concurrency))
+
+    def _reserve_token(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                max(1.0, self.requests_per_second), self._tokens + (now - self._updated_at) * self.requests_per_second
+            )
+            self._updated_at = now
+            self._tokens -= 1.0
+
+            delay = -self._tokens / self.requests_per_second if self._tokens < 0 else 0.0
+            return max(delay, self._blocked_until - now)
+
+    def _try_acquire_slot(self) -> bool:
+        if self.in_flight < int(self.concurrency_limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._slot_released.notify()
+
+    def _on_success(self, latency: float) -> None:
+        with self._lock:
+            if latency > self.latency_target:
+                self.concurrency_limit = max(1.0, self.concurrency_limit * RATE_CONTROLLER_MULTIPLICATIVE_DECREASE)
+            else:
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + RATE_CONTROLLER_ADDITIVE_INCREASE / self.concurrency_limit,
+                )
+
+    def _on_failure(self, error: Exception, attempt: int) -> float:
+        retry_after = get_retry_after(error)
+        with self._lock:
+            self.concurrency_limit = max(1.0, self.concurrency_limit * RATE_CONTROLLER_MULTIPLICATIVE_DECREASE)
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                return retry_after
+
+        backoff = min(RATE_CONTROLLER_MAX_BACKOFF, RATE_CONTROLLER_BACKOFF * 2**attempt)
+        return random.uniform(0, backoff)
+
+    def call(self, function, *args, **kwargs):
+        queue_time = 0.0
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.monotonic()
+            with self._lock:
+                while not self._try_acquire_slot():
+                    self._slot_released.wait()
+
+            try:
+                time.sleep(self._reserve_token())
+                started_at = time.monotonic()
+                queue_time += started_at - queued_at
+                result = function(*args, **kwargs)
+                self._on_success(time.monotonic() - started_at)
+                record_call_telemetry(queue_time=queue_time, attempts=attempt + 1)
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    record_call_telemetry(queue_time=queue_time, attempts=attempt + 1, error_class=type(e).__name__)
+                    raise
+                delay = self._on_failure(e, attempt)
+                logging.info(f"Retryable error ({get_status_code(e)}), retrying in {delay:.1f} s")
+            finally:
+                self._release_slot()
+
+            time.sleep(delay)
+
+    async def acall(self, function, *args, **kwargs):
+        queue_time = 0.0
+        for attempt in range(self.max_retries + 1):
+            queued_at = time.monotonic()
+            while True:
+                with self._lock:
+                    if self._try_acquire_slot():
+                        break
+                await asyncio.sleep(RATE_CONTROLLER_POLL_INTERVAL)
+
+            try:
+                await asyncio.sleep(self._reserve_token())
+                started_at = time.monotonic()
+                queue_time += started_at - queued_at
+                result = await function(*args, **kwargs)
+                self._on_success(time.monotonic() - started_at)
+                record_call_telemetry(queue_time=queue_time, attempts=attempt + 1)
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    record_call_telemetry(queue_time=queue_time, attempts=attempt + 1, error_class=type(e).__name__)
+                    raise
+                delay = self._on_failure(e, attempt)
+                logging.info(f"Retryable error ({get_status_code(e)}), retrying in {delay:.1f} s")
+            finally:
+                self._release_slot()
+
+            await asyncio.sleep(delay)
+
+
+_rate_controllers: dict[str, AdaptiveRateController] = {}
+_rate_controllers_lock = threading.Lock()
+
+
+def get_rate_controller(
+    provider: str, requests_per_second: float, max_concurrency: int, credential: str = None
+) -> AdaptiveRateController:
+    """Returns the controller shared by all models of the provider, e.g. of one server or API key.
+
+    Models with different credentials get different controllers, since every account has its own limits.
+    Only a hash of the credential is kept, so it never appears in the logs.
+    The limits of the last model win, since the models share one server or account, and a change is logged.
+    """
+    if credential:
+        provider = f"{provider}:{hashlib.sha256(credential.encode('utf-8')).hexdigest()[:12]}"
+
+    with _rate_controllers_lock:
+        if provider not in _rate_controllers:
+            _rate_controllers[provider] = AdaptiveRateController(requests_per_second, max_concurrency)
+        rate_controller = _rate_controllers[provider]
+
+        limits = (rate_controller.requests_per_second, rate_controller.max_concurrency)
+        if limits != (requests_per_second, max_concurrency):
+            logging.warning(
+                f"Rate limits of {provider} changed from {limits} to {(requests_per_second, max_concurrency)} "
+                "(requests per second, max concurrency) for all of its models"
+            )
+            rate_controller.set_limits(requests_per_second, max_concurrency)
+        return rate_controller
+
+
+class RateControlledRunnable(Runnable):
+    def __init__(self, runnable: Runnable, rate_controller: AdaptiveRateController):
+        self.runnable = runnable
+        self.rate_controller = rate_controller
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.rate_controller.call(self.runnable.invoke, input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.rate_controller.acall(self.runnable.ainvoke, input, config, **kwargs)
+
+    def stream_until(self, input, is_complete: Callable[[str], bool], config=None) -> str:
+        return self.rate_controller.call(lambda: collect_stream(self.runnable.stream(input, config), is_complete))
+
+    async def astream_until(self, input, is_complete: Callable[[str], bool], config=None) -> str:
+        return await self.rate_controller.acall(
+            lambda: acollect_stream(self.runnable.astream(input, config), is_complete)
+        )
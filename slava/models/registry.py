@@ -0,0 +1,31 @@
+import importlib
+import threading
+
+from slava.config import MODEL_CLASSES
+
+_class_paths: dict[str, str] = dict(MODEL_CLASSES)
+_model_classes: dict[str, type] = {}
+_model_classes_lock = threading.Lock()
+
+
+def register_model_class(provider: str, class_path: str) -> None:
+    """Registers a provider as ``"module:class"``, which is imported when the provider is first used."""
+    with _model_classes_lock:
+        _class_paths[provider] = class_path
+        _model_classes.pop(provider, None)
+
+
+def get_model_class(provider: str) -> type:
+    with _model_classes_lock:
+        if provider not in _model_classes:
+            if provider not in _class_paths:
+                raise ValueError(f"Unknown model provider {provider!r}, expected one of {sorted(_class_paths)}")
+
+            module_name, class_name = _class_paths[provider].split(":")
+            _model_classes[provider] = getattr(importlib.import_module(module_name), class_name)
+        return _model_classes[provider]
+
+
+def create_model(provider: str, **config):
+    """Creates a model of the provider, e.g. ``create_model("ollama", model_name="llama3", http_client=True)``."""
+    return get_model_class(provider)(**config)
@@ -0,0 +1,61 @@
+import asyncio
+
+import httpx
+
+from slava.config import HTTP_CONNECT_TIMEOUT, HTTP_POOL_SIZE, HTTP_TIMEOUT
+
+
+class HTTPTransport:
+    """Pooled keep-alive HTTP transport with a sync and an async client.
+
+    The clients can be shared between models, e.g. passed as http_client to OpenAI-compatible SDKs.
+    The pooled connections of an async client belong to the event loop they were opened in, and every
+    asyncio.run starts a new loop, so the async client is created for the running loop on first use.
+    """
+
+    def __init__(
+        self,
+        base_url: str = None,
+        headers: dict = None,
+        pool_size: int = HTTP_POOL_SIZE,
+        timeout: float = HTTP_TIMEOUT,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+
+        self.client_params = {"headers": headers, "timeout": self.timeout, "limits": self.limits}
+        if base_url:
+            self.client_params["base_url"] = base_url
+
+        self.client = httpx.Client(**self.client_params)
+        self._async_client: httpx.AsyncClient = None
+        self._async_client_loop: asyncio.AbstractEventLoop = None
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            # The connections of a client from a finished loop cannot be reused or closed, so it is dropped
+            self._async_client = httpx.AsyncClient(**self.client_params)
+            self._async_client_loop = loop
+        return self._async_client
+
+    def post(self, url: str, json: dict) -> dict:
+        response = self.client.post(url, json=json)
+        response.raise_for_status()
+        return response.json()
+
+    async def apost(self, url: str, json: dict) -> dict:
+        response = await self.async_client.post(url, json=json)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self) -> None:
+        self.client.close()
+
+    async def aclose(self) -> None:
+        if self._async_client is not None and self._async_client_loop is asyncio.get_running_loop():
+            await self._async_client.aclose()
+        self._async_client = None
+        self._async_client_loop = None
@@ -1,22 +1,36 @@
-import time
-
 import pandas as pd
-import requests
+from langchain_core.runnables import Runnable
 from tqdm import tqdm
 
 from slava.config import (
+    HTTP_POOL_SIZE,
+    HTTP_TIMEOUT,
     INSTRUCTION_COLUMN,
     MODEL_ANSWER_COLUMN,
+    YANDEXGPT_MAX_CONCURRENCY,
     YANDEXGPT_MAXTOKENS,
     YANDEXGPT_MODEL_URI,
+    YANDEXGPT_REQUESTS_PER_SECOND,
     YANDEXGPT_STREAM,
     YANDEXGPT_TEMPERATURE,
     YANDEXGPT_URL,
 )
+from slava.models.base import get_prompt_text, record_call_telemetry
+from slava.models.rate_controller import get_rate_controller
+from slava.models.transport import HTTPTransport
 
 
 class YandexGPTModel:
-    def __init__(self, uri: str = None, api_key: str = None, temperature: float = YANDEXGPT_TEMPERATURE):
+    def __init__(
+        self,
+        uri: str = None,
+        api_key: str = None,
+        temperature: float = YANDEXGPT_TEMPERATURE,
+        max_concurrency: int = YANDEXGPT_MAX_CONCURRENCY,
+        requests_per_second: float = YANDEXGPT_REQUESTS_PER_SECOND,
+        pool_size: int = HTTP_POOL_SIZE,
+        timeout: float = HTTP_TIMEOUT,
+    ):
         self.uri = uri
         self.url = YANDEXGPT_URL
         self.headers = {
@@ -24,10 +38,34 @@ class YandexGPTModel:
             "Authorization": f"Api-Key {api_key}",
         }
         self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.model_name = YANDEXGPT_MODEL_URI.format(self.uri)
+        self.generation_params = {"temperature": self.temperature, "maxTokens": YANDEXGPT_MAXTOKENS}
+        self.transport = HTTPTransport(headers=self.headers, pool_size=pool_size, timeout=timeout)
+        self.rate_controller = get_rate_controller(
+            "yandexgpt", requests_per_second, max_concurrency, credential=api_key
+        )
+        self.model = self.Model(self)
+
+    class Model(Runnable):
+        def __init__(self, client):
+            self.client = client
+
+        def invoke(self, input, config=None, **kwargs) -> str:
+            try:
+                return self.client.rate_controller.call(self.client.get_response, get_prompt_text(input))
+            except Exception as e:
+                return f"Error: {e}"
+
+        async def ainvoke(self, input, config=None, **kwargs) -> str:
+            try:
+                return await self.client.rate_controller.acall(self.client.aget_response, get_prompt_text(input))
+            except Exception as e:
+                return f"Error: {e}"
 
-    def get_response(self, prompt: str = None):
-        completion_options = {
-            "modelUri": YANDEXGPT_MODEL_URI.format(self.uri),
+    def _get_request(self, prompt: str) -> dict:
+        return {
+            "modelUri": self.model_name,
             "completionOptions": {
                 "stream": YANDEXGPT_STREAM,
                 "temperature": self.temperature,
@@ -35,14 +73,26 @@ class YandexGPTModel:
             },
             "messages": [{"role": "user", "text": prompt}],
         }
-        response = requests.post(self.url, headers=self.headers, json=completion_options)
-        return response.text
+
+    @staticmethod
+    def _get_response_text(completion: dict) -> str:
+        usage = completion["result"].get("usage", {})
+        record_call_telemetry(
+            prompt_tokens=int(usage.get("inputTextTokens", 0)) or None,
+            response_tokens=int(usage.get("completionTokens", 0)) or None,
+        )
+        return completion["result"]["alternatives"][0]["message"]["text"].strip()
+
+    def get_response(self, prompt: str = None) -> str:
+        return self._get_response_text(self.transport.post(self.url, self._get_request(prompt)))
+
+    async def aget_response(self, prompt: str = None) -> str:
+        return self._get_response_text(await self.transport.apost(self.url, self._get_request(prompt)))
 
     def process_dataframe(self, dataset: pd.DataFrame):
         res_list = []
         for instruction in tqdm(dataset[INSTRUCTION_COLUMN]):
-            result = self.get_response(instruction)
+            result = self.model.invoke(instruction)
             res_list.append(result)
-            time.sleep(0.75)
         dataset[MODEL_ANSWER_COLUMN] = res_list
         return dataset
@@ -1,9 +1,16 @@
+import gzip
+import itertools
 import json
+import os
+from typing import Iterable, Iterator, Union
 
+import openpyxl
 import pandas as pd
 
 from slava.config import (
     COMMENT_COLUMN,
+    COMPRESSION_EXTENSIONS,
+    DATASET_CHUNK_SIZE,
     ID_COLUMN,
     INPUTS_COLUMN,
     INSTRUCTION_COLUMN,
@@ -11,6 +18,7 @@ from slava.config import (
     OPTION_SUBCOLUMN_TEMPLATE,
     OPTIONS_COLUMN,
     PROVOC_SCORE_COLUMN,
+    QUESTIONS_DATASET_COLUMNS,
     REAL_ANSWER_COLUMN,
     SOURCE_COLUMN,
     SUBJECT_COLUMN,
@@ -18,41 +26,112 @@ from slava.config import (
     TEXT_COLUMN,
     TYPE_COLUMN,
 )
+from slava.modules.utils.dependencies import import_optional_dependency
 
 
 class DataConverter:
 
-    def __init__(self, data: pd.DataFrame):
-        self.data: pd.DataFrame = data
+    def __init__(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]]):
+        # Either a DataFrame or an iterator of chunks, which is converted without being materialized
+        self.data: Union[pd.DataFrame, Iterable[pd.DataFrame]] = data
         self.json_objects: list = []
 
+    @staticmethod
+    def read_chunks(file_path: str, chunk_size: int = DATASET_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        if not file_path.endswith((".xlsx", ".xlsm")):
+            with pd.read_csv(file_path, chunksize=chunk_size) as reader:
+                yield from reader
+            return
+
+        # The read-only mode of openpyxl streams the sheet instead of loading it whole
+        workbook = openpyxl.load_workbook(file_path, read_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            while header is not None:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                yield pd.DataFrame(chunk, columns=header)
+        finally:
+            workbook.close()
+
+    def _iter_chunks(self) -> Iterator[pd.DataFrame]:
+        if isinstance(self.data, pd.DataFrame):
+            for start in range(0, len(self.data), DATASET_CHUNK_SIZE):
+                yield self.data.iloc[start : start + DATASET_CHUNK_SIZE]
+        else:
+            yield from self.data
+
+    def _iter_json_objects(self) -> Iterator[dict]:
+        option_keys = [OPTION_SUBCOLUMN_TEMPLATE.format(i) for i in range(1, 10)]
+
+        for chunk in self._iter_chunks():
+            # The values are taken column by column, which is much cheaper than building a Series per row
+            columns = [chunk[column].tolist() for column in QUESTIONS_DATASET_COLUMNS]
+            for values in zip(*columns):
+                row = dict(zip(QUESTIONS_DATASET_COLUMNS, values))
+                yield {
+                    ID_COLUMN: row[ID_COLUMN],
+                    INSTRUCTION_COLUMN: row[INSTRUCTION_COLUMN],
+                    INPUTS_COLUMN: {
+                        TASK_COLUMN: row[TASK_COLUMN],
+                        TEXT_COLUMN: row[TEXT_COLUMN],
+                        OPTIONS_COLUMN: {option_key: row[option_key] for option_key in option_keys},
+                    },
+                    REAL_ANSWER_COLUMN: row[REAL_ANSWER_COLUMN],
+                    META_COLUMN: {
+                        SUBJECT_COLUMN: row[SUBJECT_COLUMN],
+                        TYPE_COLUMN: row[TYPE_COLUMN],
+                        SOURCE_COLUMN: row[SOURCE_COLUMN],
+                        COMMENT_COLUMN: row[COMMENT_COLUMN],
+                        PROVOC_SCORE_COLUMN: row[PROVOC_SCORE_COLUMN],
+                    },
+                }
+
     def _create_json_objects(
         self,
     ):
+        self.json_objects = list(self._iter_json_objects())
+
+    @staticmethod
+    def _open_output(file_path: str, compression: str = "infer"):
+        if compression == "infer":
+            compression = COMPRESSION_EXTENSIONS.get(os.path.splitext(file_path)[1])
+
+        if compression is None:
+            return open(file_path, "wb")
+        elif compression == "gzip":
+            return gzip.open(file_path, "wb")
+        elif compression == "zstd":
+            zstandard = import_optional_dependency("zstandard")
+
+            return zstandard.ZstdCompressor().stream_writer(open(file_path, "wb"))
+        else:
+            raise ValueError(f"Unsupported compression: {compression}")
+
+    @staticmethod
+    def _get_json_encoder(fast_json: bool = False):
+        if not fast_json:
+            return lambda entry: (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+
+        # orjson is optional, much faster and writes compact JSON with NaN as null
+        orjson = import_optional_dependency("orjson")
+
+        options = orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY
+        return lambda entry: orjson.dumps(entry, option=options)
+
+    def save_json_objects_to_jsonl(
+        self, file_path: str = "open_questions_dataset.jsonl", compression: str = "infer", fast_json: bool = False
+    ):
+        encode = self._get_json_encoder(fast_json)
 
-        for _, row in self.data.iterrows():
-            options = {
-                OPTION_SUBCOLUMN_TEMPLATE.format(i): row[OPTION_SUBCOLUMN_TEMPLATE.format(i)] for i in range(1, 10)
-            }
-
-            json_object = {
-                ID_COLUMN: row[ID_COLUMN],
-                INSTRUCTION_COLUMN: row[INSTRUCTION_COLUMN],
-                INPUTS_COLUMN: {TASK_COLUMN: row[TASK_COLUMN], TEXT_COLUMN: row[TEXT_COLUMN], OPTIONS_COLUMN: options},
-                REAL_ANSWER_COLUMN: row[REAL_ANSWER_COLUMN],
-                META_COLUMN: {
-                    SUBJECT_COLUMN: row[SUBJECT_COLUMN],
-                    TYPE_COLUMN: row[TYPE_COLUMN],
-                    SOURCE_COLUMN: row[SOURCE_COLUMN],
-                    COMMENT_COLUMN: row[COMMENT_COLUMN],
-                    PROVOC_SCORE_COLUMN: row[PROVOC_SCORE_COLUMN],
-                },
-            }
-            self.json_objects.append(json_object)
-
-    def save_json_objects_to_jsonl(self, file_path: str = "open_questions_dataset.jsonl"):
-        self._create_json_objects()
-
-        with open(file_path, "w", encoding="utf-8") as file:
-            for entry in self.json_objects:
-                file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        # Lines are encoded and written in chunks, so memory use does not grow with the dataset
+        with self._open_output(file_path, compression) as file:
+            lines = []
+            for entry in self._iter_json_objects():
+                lines.append(encode(entry))
+                if len(lines) >= DATASET_CHUNK_SIZE:
+                    file.write(b"".join(lines))
+                    lines = []
+            file.write(b"".join(lines))
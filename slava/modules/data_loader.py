@@ -1,9 +1,38 @@
+import glob
+import hashlib
 import logging
+import os
+from typing import Iterator
 
 import pandas as pd
 from huggingface_hub import hf_hub_download
 
-from slava.config import OPEN_DATASET_FILENAME, REPO_ID, REPO_TYPE, REQUIRED_COLUMNS
+from slava.config import (
+    COMMENT_COLUMN,
+    DATASET_CACHE_FILE_EXTENSION,
+    DATASET_CACHE_FOLDER,
+    DATASET_CHUNK_SIZE,
+    DATASET_HASH_BLOCK_SIZE,
+    ID_COLUMN,
+    INPUTS_COLUMN,
+    INSTRUCTION_COLUMN,
+    META_COLUMN,
+    OPEN_DATASET_FILENAME,
+    OPTION_SUBCOLUMN_TEMPLATE,
+    OPTIONS_COLUMN,
+    PROVOC_SCORE_COLUMN,
+    QUESTIONS_DATASET_COLUMNS,
+    REAL_ANSWER_COLUMN,
+    REPO_ID,
+    REPO_TYPE,
+    REQUIRED_COLUMNS,
+    SOURCE_COLUMN,
+    SUBJECT_COLUMN,
+    TASK_COLUMN,
+    TEXT_COLUMN,
+    TYPE_COLUMN,
+)
+from slava.modules.utils.dependencies import import_optional_dependency
 
 
 class DataLoader:
@@ -12,25 +41,31 @@ class DataLoader:
         self,
         repo_id: str = REPO_ID,
         filename: str = OPEN_DATASET_FILENAME,
+        revision: str = None,
+        cache_folder: str = DATASET_CACHE_FOLDER,
     ):
         self.repo_id = repo_id
         self.filename = filename
+        self.revision = revision
+        self.cache_folder = cache_folder
 
-    def load_data(self, dataset_path: str = None) -> pd.DataFrame:
+    def _get_dataset_path(self, dataset_path: str = None) -> str:
         # Local JSONL
         if dataset_path:
             logging.info(f"Dataset loaded from local by path - {dataset_path}")
-            data = pd.read_json(dataset_path, lines=True)
+            return dataset_path
         # HuggingFace JSONL
         elif self.repo_id and self.filename:
             logging.info(f"Dataset loaded from HuggingFace by path - {self.repo_id}/{self.filename}")
-            data = pd.read_json(
-                hf_hub_download(repo_id=self.repo_id, filename=self.filename, repo_type=REPO_TYPE),
-                lines=True,
+            return hf_hub_download(
+                repo_id=self.repo_id, filename=self.filename, repo_type=REPO_TYPE, revision=self.revision
             )
         else:
             raise ValueError("The parameters for loading data are not specified")
 
+    def load_data(self, dataset_path: str = None) -> pd.DataFrame:
+        data = pd.read_json(self._get_dataset_path(dataset_path), lines=True)
+
         # Validate the dataset format
         if not self.validate_format(data):
             raise ValueError("The uploaded dataset does not match the required format")
@@ -38,5 +73,117 @@ class DataLoader:
             logging.info("The initial validation has been completed")
         return data
 
+    def iter_data(self, dataset_path: str = None, chunk_size: int = DATASET_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        # The JSONL is read lazily, so only one chunk of rows is kept in memory at a time
+        with pd.read_json(self._get_dataset_path(dataset_path), lines=True, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                if not self.validate_format(chunk):
+                    raise ValueError("The uploaded dataset does not match the required format")
+                yield chunk
+
     def validate_format(self, data: pd.DataFrame) -> bool:
         return all(column in data.columns for column in REQUIRED_COLUMNS)
+
+    @staticmethod
+    def flatten_data(data: pd.DataFrame) -> pd.DataFrame:
+        # The nested inputs and meta dicts are unpacked into the flat QUESTIONS_DATASET_COLUMNS layout
+        inputs = data[INPUTS_COLUMN].tolist()
+        options = [row_inputs.get(OPTIONS_COLUMN) or {} for row_inputs in inputs]
+        meta = data[META_COLUMN].tolist()
+
+        flat_data = {
+            ID_COLUMN: data[ID_COLUMN].tolist(),
+            SUBJECT_COLUMN: [row_meta.get(SUBJECT_COLUMN) for row_meta in meta],
+            TYPE_COLUMN: [row_meta.get(TYPE_COLUMN) for row_meta in meta],
+            INSTRUCTION_COLUMN: data[INSTRUCTION_COLUMN].tolist(),
+            TASK_COLUMN: [row_inputs.get(TASK_COLUMN) for row_inputs in inputs],
+            TEXT_COLUMN: [row_inputs.get(TEXT_COLUMN) for row_inputs in inputs],
+        }
+        for i in range(1, 10):
+            option_key = OPTION_SUBCOLUMN_TEMPLATE.format(i)
+            flat_data[option_key] = [row_options.get(option_key) for row_options in options]
+        flat_data[REAL_ANSWER_COLUMN] = data[REAL_ANSWER_COLUMN].tolist()
+        flat_data[SOURCE_COLUMN] = [row_meta.get(SOURCE_COLUMN) for row_meta in meta]
+        flat_data[COMMENT_COLUMN] = [row_meta.get(COMMENT_COLUMN) for row_meta in meta]
+        flat_data[PROVOC_SCORE_COLUMN] = [row_meta.get(PROVOC_SCORE_COLUMN) for row_meta in meta]
+
+        return pd.DataFrame(flat_data, columns=QUESTIONS_DATASET_COLUMNS)
+
+    @staticmethod
+    def _get_file_hash(path: str) -> str:
+        file_hash = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(DATASET_HASH_BLOCK_SIZE), b""):
+                file_hash.update(block)
+        return file_hash.hexdigest()
+
+    def _get_cache_prefix(self, dataset_path: str = None) -> str:
+        if dataset_path:
+            name = os.path.splitext(os.path.basename(dataset_path))[0]
+        else:
+            name = f"{self.repo_id.replace('/', '-')}-{os.path.splitext(self.filename)[0]}-{self.revision or 'main'}"
+        return os.path.join(self.cache_folder, name)
+
+    def _get_cached_dataset_path(self, dataset_path: str = None) -> str:
+        cache_prefix = self._get_cache_prefix(dataset_path)
+        try:
+            source_path = self._get_dataset_path(dataset_path)
+            file_hash = self._get_file_hash(source_path)
+        except Exception as e:
+            # Offline, the latest cached conversion of the same dataset is used instead
+            cached_paths = sorted(glob.glob(f"{cache_prefix}-*{DATASET_CACHE_FILE_EXTENSION}"), key=os.path.getmtime)
+            if not cached_paths:
+                raise
+            logging.info(f"Dataset source is unavailable ({e}), using the cached dataset {cached_paths[-1]}")
+            return cached_paths[-1]
+
+        cached_path = f"{cache_prefix}-{file_hash[:16]}{DATASET_CACHE_FILE_EXTENSION}"
+        if not os.path.exists(cached_path):
+            self._convert_dataset(source_path, cached_path)
+        return cached_path
+
+    def _convert_dataset(self, source_path: str, cached_path: str) -> None:
+        pa = import_optional_dependency("pyarrow")
+        pq = import_optional_dependency("pyarrow.parquet")
+
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        temporary_path = f"{cached_path}.tmp"
+
+        writer = None
+        try:
+            for chunk in self.iter_data(source_path):
+                flat_chunk = self.flatten_data(chunk)
+                # Everything but the id is stored as strings, so chunks with differently inferred types share a schema
+                for column in flat_chunk.columns.drop(ID_COLUMN):
+                    flat_chunk[column] = [None if pd.isna(value) else str(value) for value in flat_chunk[column]]
+
+                table = pa.Table.from_pandas(flat_chunk, preserve_index=False)
+                if writer is None:
+                    schema = pa.schema(
+                        [
+                            field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                            for field in table.schema
+                        ]
+                    )
+                    writer = pq.ParquetWriter(temporary_path, schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            raise ValueError("The uploaded dataset is empty")
+        os.replace(temporary_path, cached_path)
+        logging.info(f"Dataset converted to {cached_path}")
+
+    def load_flat_data(self, dataset_path: str = None) -> pd.DataFrame:
+        pq = import_optional_dependency("pyarrow.parquet")
+
+        return pq.read_table(self._get_cached_dataset_path(dataset_path), memory_map=True).to_pandas()
+
+    def iter_flat_data(self, dataset_path: str = None, chunk_size: int = DATASET_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        pq = import_optional_dependency("pyarrow.parquet")
+
+        parquet_file = pq.ParquetFile(self._get_cached_dataset_path(dataset_path), memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
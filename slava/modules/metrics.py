@@ -1,62 +1,205 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
 import pandas as pd
 
 from slava.config import *
+from slava.modules.metrics_store import AGGREGATE_COLUMNS, ROW_KEY_COLUMNS, MetricsStore, get_row_keys
+from slava.modules.results_store import ResultsStore
 from slava.modules.utils.metrics_helpers import (
-    create_pivot_table,
+    calculate_metrics,
     exact_match,
     f1_score,
+    get_aggregates,
+    get_metrics_column_name,
+    get_metrics_cube,
+    get_results,
     is_substring,
     levenshtein_ratio,
     partially_match,
 )
 from slava.modules.utils.metrics_utils import preprocess_answers
 
+OPEN_QUESTIONS_METRICS = (exact_match, levenshtein_ratio, f1_score)
+NOT_OPEN_QUESTIONS_METRICS = (exact_match, is_substring, partially_match)
+OPEN_QUESTIONS_METRIC_COLUMNS = [EXACT_MATCH_COLUMN, LEVENSHTEIN_RATIO_COLUMN, F1_SCORE_COLUMN]
+NOT_OPEN_QUESTIONS_METRIC_COLUMNS = [
+    EXACT_MATCH_COLUMN,
+    IS_SUBSTRING_COLUMN,
+    ONLY_NUMBERS_MODEL_ANSWER_COLUMN,
+    PARTIALLY_MATCH_COLUMN,
+]
+METRICS_DTYPES = {
+    EXACT_MATCH_COLUMN: int,
+    LEVENSHTEIN_RATIO_COLUMN: float,
+    F1_SCORE_COLUMN: float,
+    IS_SUBSTRING_COLUMN: int,
+    ONLY_NUMBERS_MODEL_ANSWER_COLUMN: object,
+    PARTIALLY_MATCH_COLUMN: float,
+}
+METRICS_INPUT_COLUMNS = [REAL_ANSWER_COLUMN, MODEL_ANSWER_COLUMN, TYPE_COLUMN]
+
 
 class MetricsCalculator:
 
-    def __init__(self, data: pd.DataFrame):
-        self.open_questions, self.not_open_questions = preprocess_answers(data)
+    def __init__(self, data: pd.DataFrame, n_jobs: int = METRICS_N_JOBS, metrics_store: MetricsStore = None):
+        self.metrics_store = metrics_store
+        self._row_metrics: list[pd.DataFrame] = []
+        self._metrics_cube: pd.Series = None
 
-        self.__calculate_metrics_for_open_questions()
-        self.__calculate_metrics_for_not_open_questions()
+        scored_files = data.attrs.get(SCORED_FILES_ATTR, [])
+        self.open_questions, self.not_open_questions = preprocess_answers(data)
 
-    def __calculate_metrics_for_open_questions(self):
-        self.open_questions = exact_match(self.open_questions)
-        self.open_questions = levenshtein_ratio(self.open_questions)
-        self.open_questions = f1_score(self.open_questions)
+        with ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else nullcontext() as executor:
+            self.open_questions = self._calculate_metrics(
+                self.open_questions, OPEN_QUESTIONS_METRICS, OPEN_QUESTIONS_METRIC_COLUMNS, executor, n_jobs
+            )
+            self.not_open_questions = self._calculate_metrics(
+                self.not_open_questions, NOT_OPEN_QUESTIONS_METRICS, NOT_OPEN_QUESTIONS_METRIC_COLUMNS, executor, n_jobs
+            )
+
+        if self.metrics_store is not None:
+            self._update_metrics_store()
+            self.metrics_store.mark_files_scored(scored_files)
+
+    @classmethod
+    def from_results_store(
+        cls,
+        results_store: ResultsStore,
+        filters: list[tuple] = None,
+        n_jobs: int = METRICS_N_JOBS,
+        metrics_store: MetricsStore = None,
+    ) -> "MetricsCalculator":
+        # The prompts are never needed for scoring, so they are not read at all
+        data = get_results(
+            metrics_store=metrics_store, results_store=results_store, columns=METRICS_RESULTS_COLUMNS, filters=filters
+        )
+        return cls(data, n_jobs=n_jobs, metrics_store=metrics_store)
 
-    def __calculate_metrics_for_not_open_questions(self):
-        self.not_open_questions = exact_match(self.not_open_questions)
-        self.not_open_questions = is_substring(self.not_open_questions)
-        self.not_open_questions = partially_match(self.not_open_questions)
+    @staticmethod
+    def _get_chunks(questions: pd.DataFrame, n_jobs: int) -> list[np.ndarray]:
+        max_chunk_size = -(-len(questions) // n_jobs)
 
-    def _create_metrics_table_for_open_questions(self):
-        return create_pivot_table(
-            questions_type=OPEN_QUESTION_TYPE_NAME,
-            data=self.open_questions,
-            value_columns=OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES,
-        )
+        chunks = []
+        for indices in questions.groupby(MODEL_COLUMN, sort=False).indices.values():
+            chunks.extend(np.array_split(indices, -(-len(indices) // max_chunk_size)))
+        return chunks
 
-    def _create_metrics_table_for_not_open_questions(self):
-        return create_pivot_table(
-            questions_type=NOT_OPEN_QUESTION_TYPE_NAME,
-            data=self.not_open_questions,
-            value_columns=NOT_OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES,
-        )
+    def _calculate_metrics_in_parallel(
+        self, questions: pd.DataFrame, metric_functions: tuple, executor: Executor, n_jobs: int
+    ) -> pd.DataFrame:
+        # Workers receive only the answer and type arrays of their chunk and return metric arrays
+        columns = {column: questions[column].to_numpy() for column in METRICS_INPUT_COLUMNS}
+        chunks = self._get_chunks(questions, n_jobs)
+        futures = [
+            executor.submit(calculate_metrics, metric_functions, {c: values[indices] for c, values in columns.items()})
+            for indices in chunks
+        ]
+        results = [future.result() for future in futures]
+
+        for column, first_values in results[0].items():
+            values = np.empty(len(questions), dtype=first_values.dtype)
+            for indices, result in zip(chunks, results):
+                values[indices] = result[column]
+            questions[column] = values
+
+        return questions
+
+    def _score(
+        self, questions: pd.DataFrame, metric_functions: tuple, executor: Executor | None, n_jobs: int
+    ) -> pd.DataFrame:
+        if executor is not None and not questions.empty:
+            return self._calculate_metrics_in_parallel(questions, metric_functions, executor, n_jobs)
 
-    def _get_metrics_table(self) -> pd.DataFrame:
-        metrics_table_for_open_questions = self._create_metrics_table_for_open_questions()
-        metrics_table_for_not_open_questions = self._create_metrics_table_for_not_open_questions()
+        for metric_function in metric_functions:
+            questions = metric_function(questions)
+        return questions
 
-        metrics_table = pd.concat([metrics_table_for_open_questions, metrics_table_for_not_open_questions], axis=1)
-        metrics_table = metrics_table.loc[:, ~metrics_table.columns.duplicated()]
+    def _calculate_metrics(
+        self,
+        questions: pd.DataFrame,
+        metric_functions: tuple,
+        metric_columns: list[str],
+        executor: Executor | None,
+        n_jobs: int,
+    ) -> pd.DataFrame:
+        if self.metrics_store is None or questions.empty:
+            return self._score(questions, metric_functions, executor, n_jobs)
+
+        # Only rows without stored metrics for the same (model, id, response hash) are scored
+        row_keys = get_row_keys(questions)
+        row_metrics = row_keys.merge(
+            self.metrics_store.load_row_metrics(row_keys[MODEL_COLUMN].unique().tolist()),
+            how="left",
+            on=ROW_KEY_COLUMNS,
+        )
+        row_metrics = row_metrics[ROW_KEY_COLUMNS + metric_columns].astype(
+            {column: object for column in metric_columns}
+        )
 
-        for col in metrics_table.columns:
-            if col != "model" and pd.api.types.is_numeric_dtype(metrics_table[col]):
-                metrics_table[col] = metrics_table[col] * 100
+        is_new = row_metrics[EXACT_MATCH_COLUMN].isna().to_numpy()
+        if is_new.any():
+            new_questions = self._score(questions[is_new].reset_index(drop=True), metric_functions, executor, n_jobs)
+            for column in metric_columns:
+                row_metrics.loc[is_new, column] = new_questions[column].to_numpy()
+
+        for column in metric_columns:
+            row_metrics[column] = row_metrics[column].astype(METRICS_DTYPES[column])
+            questions[column] = row_metrics[column].to_numpy()
+
+        self._row_metrics.append(row_metrics)
+        return questions
+
+    def _get_questions_by_type(self) -> list[tuple[str, pd.DataFrame, list[str]]]:
+        return [
+            (OPEN_QUESTION_TYPE_NAME, self.open_questions, OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES),
+            (NOT_OPEN_QUESTION_TYPE_NAME, self.not_open_questions, NOT_OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES),
+        ]
+
+    def _get_aggregates(self) -> pd.DataFrame:
+        aggregates = [
+            get_aggregates(questions_type, questions, value_columns)
+            for questions_type, questions, value_columns in self._get_questions_by_type()
+            if not questions.empty
+        ]
+        return pd.concat(aggregates, ignore_index=True) if aggregates else pd.DataFrame(columns=AGGREGATE_COLUMNS)
+
+    def _update_metrics_store(self) -> None:
+        models = pd.concat([self.open_questions[MODEL_COLUMN], self.not_open_questions[MODEL_COLUMN]])
+        models = models.astype(str).unique().tolist()
+        if not models:
+            return
+
+        self.metrics_store.save_row_metrics(models, pd.concat(self._row_metrics, ignore_index=True))
+        self.metrics_store.save_aggregates(models, self._get_aggregates())
+
+    @property
+    def metrics_cube(self) -> pd.Series:
+        """Mean metrics by model, questions type, category, level and metric, which every table is read from.
+
+        The cube is aggregated once, from the stored aggregates of all models when a metrics store is used.
+        """
+        if self._metrics_cube is None:
+            if self.metrics_store is not None:
+                aggregates = self.metrics_store.load_aggregates()
+            else:
+                aggregates = self._get_aggregates()
+            self._metrics_cube = get_metrics_cube(aggregates)
+        return self._metrics_cube
 
-        metrics_table = metrics_table.round(0)
-        return metrics_table
+    def _get_metrics_table(self) -> pd.DataFrame:
+        # A model without questions of a level gets 0 for it
+        metrics_table = self.metrics_cube.unstack(
+            [
+                AGGREGATE_QUESTIONS_TYPE_COLUMN,
+                AGGREGATE_CATEGORY_COLUMN,
+                AGGREGATE_METRIC_COLUMN,
+                AGGREGATE_LEVEL_COLUMN,
+            ],
+            fill_value=0,
+        ).sort_index(axis=1)
+        return (metrics_table * 100).round(0)
 
     def _filter_existing(self, metrics_table: pd.DataFrame, columns: list[str]) -> List[str]:
         return [column for column in columns if column in metrics_table.columns]
@@ -82,37 +225,24 @@ class MetricsCalculator:
 
         return pd.concat(parts, axis=1) if parts else pd.DataFrame()
 
-    def _get_renamed_metrics_table(
-        self,
-    ) -> pd.DataFrame:
-        renamed_columns = []
-
-        metrics_table = self._get_metrics_table()
-        for column in metrics_table.columns:
-            parts = column.split("-")
-            if len(parts) == 4:
-                questions_type_name = QUESTION_TYPES_NAMING.get(parts[0])
-                pivot_column_name = KEYS_NAMING.get(parts[1])
-                value_name = COMBINED_VALUES_NAMING.get(parts[2])
-                metric_name = METRICS_NAMING.get(parts[3])
-                renamed_name = f"{questions_type_name} {pivot_column_name} {value_name} {metric_name}".strip()
-                renamed_columns.append(renamed_name)
-            else:
-                renamed_columns.append(column)
+    def _get_renamed_metrics_table(self, metrics_table: pd.DataFrame = None) -> pd.DataFrame:
+        if metrics_table is None:
+            metrics_table = self._get_metrics_table()
 
-        metrics_table.columns = renamed_columns
-        return metrics_table
+        metrics_table = metrics_table.copy()
+        metrics_table.columns = [get_metrics_column_name(*column) for column in metrics_table.columns]
+        return metrics_table.reset_index()
 
     def save_metrics_table_of_custom_dataset_to_excel(
         self, metrics_table_filename: str = "metrics_table_of_custom_dataset.xlsx"
     ) -> None:
-        renamed_metrics_table = self._get_renamed_metrics_table()
+        metrics_table = self._get_metrics_table()
+        categories = metrics_table.columns.get_level_values(AGGREGATE_CATEGORY_COLUMN)
         leaderboard_values = []
 
         with pd.ExcelWriter(metrics_table_filename) as writer:
-            for value in KEYS_NAMING.values():
-                columns = [MODEL_COLUMN] + renamed_metrics_table.filter(like=value).columns.tolist()
-                value_sheet = renamed_metrics_table[columns].copy()
+            for category, value in KEYS_NAMING.items():
+                value_sheet = self._get_renamed_metrics_table(metrics_table.loc[:, categories == category])
 
                 value_sheet.to_excel(writer, sheet_name=value, index=False)
 
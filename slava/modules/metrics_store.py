@@ -0,0 +1,153 @@
+import hashlib
+import os
+import sqlite3
+
+import pandas as pd
+
+from slava.config import (
+    AGGREGATE_CATEGORY_COLUMN,
+    AGGREGATE_LEVEL_COLUMN,
+    AGGREGATE_METRIC_COLUMN,
+    AGGREGATE_QUESTIONS_TYPE_COLUMN,
+    AGGREGATE_VALUE_COLUMN,
+    EXACT_MATCH_COLUMN,
+    F1_SCORE_COLUMN,
+    ID_COLUMN,
+    IS_SUBSTRING_COLUMN,
+    LEVENSHTEIN_RATIO_COLUMN,
+    METRICS_STORE_FILEPATH,
+    MODEL_ANSWER_COLUMN,
+    MODEL_COLUMN,
+    ONLY_NUMBERS_MODEL_ANSWER_COLUMN,
+    PARTIALLY_MATCH_COLUMN,
+    REAL_ANSWER_COLUMN,
+    RESPONSE_HASH_COLUMN,
+)
+
+ROW_METRICS_COLUMNS = [
+    EXACT_MATCH_COLUMN,
+    LEVENSHTEIN_RATIO_COLUMN,
+    F1_SCORE_COLUMN,
+    IS_SUBSTRING_COLUMN,
+    ONLY_NUMBERS_MODEL_ANSWER_COLUMN,
+    PARTIALLY_MATCH_COLUMN,
+]
+ROW_KEY_COLUMNS = [MODEL_COLUMN, ID_COLUMN, RESPONSE_HASH_COLUMN]
+AGGREGATE_COLUMNS = [
+    MODEL_COLUMN,
+    AGGREGATE_QUESTIONS_TYPE_COLUMN,
+    AGGREGATE_CATEGORY_COLUMN,
+    AGGREGATE_LEVEL_COLUMN,
+    AGGREGATE_METRIC_COLUMN,
+    AGGREGATE_VALUE_COLUMN,
+]
+
+
+def get_row_keys(questions: pd.DataFrame) -> pd.DataFrame:
+    response_hashes = [
+        hashlib.sha1(f"{real_answer}\x00{model_answer}".encode("utf-8")).hexdigest()
+        for real_answer, model_answer in zip(questions[REAL_ANSWER_COLUMN], questions[MODEL_ANSWER_COLUMN])
+    ]
+    return pd.DataFrame(
+        {
+            MODEL_COLUMN: questions[MODEL_COLUMN].astype(str).to_numpy(),
+            ID_COLUMN: questions[ID_COLUMN].astype(str).to_numpy(),
+            RESPONSE_HASH_COLUMN: pd.Series(response_hashes, dtype=object),
+        }
+    )
+
+
+class MetricsStore:
+    """Persistent SQLite store of per-row metrics and per-model aggregates.
+
+    Rows are keyed by (model, question id, response hash), so only new or changed answers are scored,
+    and aggregates are replaced per model, so adding a run never touches the other models.
+    """
+
+    def __init__(self, store_filepath: str = METRICS_STORE_FILEPATH):
+        self.store_filepath = store_filepath
+
+        directory = os.path.dirname(store_filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(store_filepath)
+        self._connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS row_metrics (
+                {MODEL_COLUMN} TEXT NOT NULL,
+                {ID_COLUMN} TEXT NOT NULL,
+                {RESPONSE_HASH_COLUMN} TEXT NOT NULL,
+                {EXACT_MATCH_COLUMN} INTEGER,
+                {LEVENSHTEIN_RATIO_COLUMN} REAL,
+                {F1_SCORE_COLUMN} REAL,
+                {IS_SUBSTRING_COLUMN} INTEGER,
+                {ONLY_NUMBERS_MODEL_ANSWER_COLUMN} TEXT,
+                {PARTIALLY_MATCH_COLUMN} REAL,
+                PRIMARY KEY ({MODEL_COLUMN}, {ID_COLUMN}, {RESPONSE_HASH_COLUMN})
+            );
+            CREATE TABLE IF NOT EXISTS aggregates (
+                {MODEL_COLUMN} TEXT NOT NULL,
+                {AGGREGATE_QUESTIONS_TYPE_COLUMN} TEXT NOT NULL,
+                {AGGREGATE_CATEGORY_COLUMN} TEXT NOT NULL,
+                {AGGREGATE_LEVEL_COLUMN} TEXT NOT NULL,
+                {AGGREGATE_METRIC_COLUMN} TEXT NOT NULL,
+                {AGGREGATE_VALUE_COLUMN} REAL
+            );
+            CREATE INDEX IF NOT EXISTS aggregates_model ON aggregates ({MODEL_COLUMN});
+            CREATE TABLE IF NOT EXISTS scored_files (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL
+            );
+            """)
+        self._connection.commit()
+
+    @staticmethod
+    def _get_placeholders(values: list) -> str:
+        return ", ".join("?" for _ in values)
+
+    def load_row_metrics(self, models: list[str]) -> pd.DataFrame:
+        return pd.read_sql_query(
+            f"SELECT * FROM row_metrics WHERE {MODEL_COLUMN} IN ({self._get_placeholders(models)})",
+            self._connection,
+            params=list(models),
+        )
+
+    def save_row_metrics(self, models: list[str], row_metrics: pd.DataFrame) -> None:
+        self._connection.execute(
+            f"DELETE FROM row_metrics WHERE {MODEL_COLUMN} IN ({self._get_placeholders(models)})", list(models)
+        )
+        row_metrics = row_metrics.reindex(columns=ROW_KEY_COLUMNS + ROW_METRICS_COLUMNS)
+        row_metrics.drop_duplicates(ROW_KEY_COLUMNS).to_sql(
+            "row_metrics", self._connection, if_exists="append", index=False
+        )
+        self._connection.commit()
+
+    def load_aggregates(self) -> pd.DataFrame:
+        return pd.read_sql_query("SELECT * FROM aggregates", self._connection)
+
+    def save_aggregates(self, models: list[str], aggregates: pd.DataFrame) -> None:
+        self._connection.execute(
+            f"DELETE FROM aggregates WHERE {MODEL_COLUMN} IN ({self._get_placeholders(models)})", list(models)
+        )
+        aggregates[AGGREGATE_COLUMNS].to_sql("aggregates", self._connection, if_exists="append", index=False)
+        self._connection.commit()
+
+    @staticmethod
+    def get_file_signature(path: str) -> tuple[str, float, int]:
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime, stat.st_size
+
+    def is_file_scored(self, path: str) -> bool:
+        signature = self.get_file_signature(path)
+        row = self._connection.execute("SELECT mtime, size FROM scored_files WHERE path = ?", signature[:1]).fetchone()
+        return row is not None and tuple(row) == signature[1:]
+
+    def mark_files_scored(self, signatures: list[tuple[str, float, int]]) -> None:
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO scored_files (path, mtime, size) VALUES (?, ?, ?)", signatures
+        )
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
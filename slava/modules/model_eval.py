@@ -1,10 +1,21 @@
+import asyncio
+import json
 import logging
 import os
+import re
+import string
+from collections import defaultdict, deque
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Union
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
 from slava.config import (
+    DEDUPLICATION_SUMMARY_EXTENSION,
+    EVALUATION_BATCH_QUEUE_FACTOR,
+    EVALUATION_MANY_QUEUE_SIZE,
+    EVALUATION_WINDOW_FACTOR,
     ID_COLUMN,
     INPUTS_COLUMN,
     INSTRUCTION_COLUMN,
@@ -13,35 +24,67 @@ from slava.config import (
     MODEL_COLUMN,
     OPTION_SUBCOLUMN_TEMPLATE,
     OPTIONS_COLUMN,
+    PROMPT_COLUMN,
     PROMPT_INSTRUCTION,
+    PROMPT_SUBSTITUTION_ERROR,
     PROVOC_SCORE_COLUMN,
     REAL_ANSWER_COLUMN,
+    RESULTS_COLUMNS,
     RESULTS_FILEPATH,
+    SCREENING_BATCH_SIZE,
+    SCREENING_CI_WIDTH,
+    SCREENING_CI_WIDTH_COLUMN,
+    SCREENING_CONFIDENCE,
+    SCREENING_ESTIMATES_ATTR,
+    SCREENING_EXTENSION,
+    SCREENING_JOURNAL_EXTENSION,
+    SCREENING_SAMPLED_COLUMN,
+    SCREENING_SCORE_COLUMN,
+    SCREENING_SEED,
+    SCREENING_STRATA_COLUMNS,
     SUBJECT_COLUMN,
     TASK_COLUMN,
+    TELEMETRY_PROMETHEUS_EXTENSION,
+    TELEMETRY_SUMMARY_EXTENSION,
     TEXT_COLUMN,
     TYPE_COLUMN,
 )
 from slava.modules.model_handler import ModelHandler
+from slava.modules.results_store import ResultsStore
+from slava.modules.screening import StratifiedEstimator, get_sampling_order, score_results
+from slava.modules.utils.results_utils import PromptDeduplicator, ResultsJournal, is_error_response
 
 
 class ModelEval:
 
     def __init__(
         self,
+        results_store: ResultsStore = None,
+        deduplicate: bool = True,
     ):
-        pass
+        self.results_store = results_store
+        self.deduplicate = deduplicate
+        self._reported_templates: set[str] = set()
 
     @staticmethod
-    def _extract_values(row: pd.Series):
-        values = {
-            TASK_COLUMN: row[INPUTS_COLUMN].get(TASK_COLUMN, ""),
-            TEXT_COLUMN: row[INPUTS_COLUMN].get(TEXT_COLUMN, ""),
-        }
+    def _is_flat(row: pd.Series) -> bool:
+        # Flat rows come from DataLoader.load_flat_data and have no nested inputs and meta dicts
+        return INPUTS_COLUMN not in row.index
 
-        for i in range(1, 10):
-            option_key = OPTION_SUBCOLUMN_TEMPLATE.format(i)
-            values[f"Option_{i}"] = row[INPUTS_COLUMN][OPTIONS_COLUMN].get(option_key, "")
+    def _extract_values(self, row: pd.Series):
+        if self._is_flat(row):
+            values = {TASK_COLUMN: row.get(TASK_COLUMN, ""), TEXT_COLUMN: row.get(TEXT_COLUMN, "")}
+            for i in range(1, 10):
+                values[f"Option_{i}"] = row.get(OPTION_SUBCOLUMN_TEMPLATE.format(i), "")
+        else:
+            values = {
+                TASK_COLUMN: row[INPUTS_COLUMN].get(TASK_COLUMN, ""),
+                TEXT_COLUMN: row[INPUTS_COLUMN].get(TEXT_COLUMN, ""),
+            }
+
+            for i in range(1, 10):
+                option_key = OPTION_SUBCOLUMN_TEMPLATE.format(i)
+                values[f"Option_{i}"] = row[INPUTS_COLUMN][OPTIONS_COLUMN].get(option_key, "")
 
         values = {k: v for k, v in values.items() if pd.notna(v) and v != ""}
 
@@ -55,38 +98,585 @@ class ModelEval:
         try:
             filled_instruction = instruction_template.format(**values) + prompt_instruction
         except KeyError as e:
-            logging.info(f"Substitution error: missing key {e}")
-            filled_instruction = "Ошибка: отсутствует необходимая информация для формирования запроса."
+            logging.warning(f"Substitution error: missing key {e}")
+            filled_instruction = PROMPT_SUBSTITUTION_ERROR
 
         return filled_instruction
 
+    @staticmethod
+    def _get_prompt_values(data: pd.DataFrame) -> dict[str, list]:
+        if INPUTS_COLUMN not in data.columns:
+            empty_column = [""] * len(data)
+            values = {
+                TASK_COLUMN: data[TASK_COLUMN].tolist() if TASK_COLUMN in data.columns else empty_column,
+                TEXT_COLUMN: data[TEXT_COLUMN].tolist() if TEXT_COLUMN in data.columns else empty_column,
+            }
+            for i in range(1, 10):
+                option_key = OPTION_SUBCOLUMN_TEMPLATE.format(i)
+                values[f"Option_{i}"] = data[option_key].tolist() if option_key in data.columns else empty_column
+            return values
+
+        inputs = data[INPUTS_COLUMN].tolist()
+        options = [row_inputs[OPTIONS_COLUMN] for row_inputs in inputs]
+        values = {
+            TASK_COLUMN: [row_inputs.get(TASK_COLUMN, "") for row_inputs in inputs],
+            TEXT_COLUMN: [row_inputs.get(TEXT_COLUMN, "") for row_inputs in inputs],
+        }
+        for i in range(1, 10):
+            option_key = OPTION_SUBCOLUMN_TEMPLATE.format(i)
+            values[f"Option_{i}"] = [row_options.get(option_key, "") for row_options in options]
+        return values
+
+    def render_prompts(
+        self, data: pd.DataFrame, prompt_instruction: str = PROMPT_INSTRUCTION, strict: bool = False
+    ) -> list[str]:
+        """Renders the prompts of all rows, parsing every distinct instruction template once.
+
+        Rows whose template has missing keys get the substitution error placeholder. The templates are
+        reported with a warning before any prompt is returned, once per template, or raise a ValueError if strict.
+        """
+        values = self._get_prompt_values(data)
+        # A cell is usable for substitution only if it is neither missing nor empty
+        is_present = {}
+        for key, column in values.items():
+            column = np.array(column, dtype=object)
+            is_present[key] = (pd.notna(column) & (column != "")).tolist()
+
+        rows_by_template = defaultdict(list)
+        for i, template in enumerate(data[INSTRUCTION_COLUMN].tolist()):
+            rows_by_template[template].append(i)
+
+        # Every distinct template is parsed once and then filled for all of its rows
+        prompts = [None] * len(data)
+        missing_keys_by_template = {}
+        for template, rows in rows_by_template.items():
+            fields = {
+                re.split(r"[.\[]", field)[0]
+                for _, field, _, _ in string.Formatter().parse(template)
+                if field is not None
+            }
+            columns = {key: (values[key], is_present[key]) for key in fields if key in values}
+            unknown_fields = fields - columns.keys()
+
+            missing_keys, missing_rows = set(unknown_fields), 0
+            for i in rows:
+                row_missing_keys = [key for key, (_, present) in columns.items() if not present[i]]
+                if unknown_fields or row_missing_keys:
+                    missing_keys.update(row_missing_keys)
+                    missing_rows += 1
+                    prompts[i] = PROMPT_SUBSTITUTION_ERROR
+                else:
+                    prompts[i] = template.format(**{key: column[i] for key, (column, _) in columns.items()})
+                    prompts[i] += prompt_instruction
+
+            if missing_rows:
+                missing_keys_by_template[template] = (sorted(missing_keys), missing_rows)
+
+        report = "\n".join(
+            f"missing keys {missing_keys} in {missing_rows} rows of {template!r}"
+            for template, (missing_keys, missing_rows) in missing_keys_by_template.items()
+            # Later chunks of a dataset repeat the templates that are already reported
+            if strict or template not in self._reported_templates
+        )
+        if strict and report:
+            raise ValueError(f"Instruction templates have missing keys:\n{report}")
+        if report:
+            logging.warning(f"Prompts with missing keys are sent as {PROMPT_SUBSTITUTION_ERROR!r}:\n{report}")
+            self._reported_templates.update(missing_keys_by_template)
+
+        return prompts
+
+    def compile_prompts(
+        self, dataset: pd.DataFrame, prompt_instruction: str = PROMPT_INSTRUCTION, strict: bool = False
+    ) -> pd.DataFrame:
+        # The compiled prompts are kept with the dataset, so they are rendered once for all models
+        return dataset.assign(**{PROMPT_COLUMN: self.render_prompts(dataset, prompt_instruction, strict)})
+
+    def _iter_rows(self, dataset: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> Iterator[tuple[pd.Series, str]]:
+        # A dataset is either a DataFrame or an iterator of chunks, e.g. from DataLoader.iter_data
+        chunks = [dataset] if isinstance(dataset, pd.DataFrame) else dataset
+        for chunk in chunks:
+            prompts = chunk[PROMPT_COLUMN].tolist() if PROMPT_COLUMN in chunk.columns else self.render_prompts(chunk)
+            for (_, row), prompt in zip(chunk.iterrows(), prompts):
+                yield row, prompt
+
+    async def _aiter_rows(
+        self, dataset: Union[pd.DataFrame, Iterable[pd.DataFrame], AsyncIterable[pd.DataFrame]]
+    ) -> AsyncIterator[tuple[pd.Series, str]]:
+        if not hasattr(dataset, "__aiter__"):
+            for row, prompt in self._iter_rows(dataset):
+                yield row, prompt
+            return
+
+        async for chunk in dataset:
+            for row, prompt in self._iter_rows(chunk):
+                yield row, prompt
+
+    @staticmethod
+    def _get_dataset_size(dataset: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> int:
+        return dataset.shape[0] if isinstance(dataset, pd.DataFrame) else None
+
+    def _get_question_type(self, row: pd.Series) -> str:
+        return row[TYPE_COLUMN] if self._is_flat(row) else row[META_COLUMN][TYPE_COLUMN]
+
+    def _get_result(self, row: pd.Series, model_name: str, prompt: str, response: str) -> dict:
+        meta = row if self._is_flat(row) else row[META_COLUMN]
+        return {
+            ID_COLUMN: row[ID_COLUMN],
+            MODEL_COLUMN: model_name,
+            SUBJECT_COLUMN: meta[SUBJECT_COLUMN],
+            TYPE_COLUMN: meta[TYPE_COLUMN],
+            PROVOC_SCORE_COLUMN: meta[PROVOC_SCORE_COLUMN],
+            INPUTS_COLUMN: prompt,
+            MODEL_ANSWER_COLUMN: response.strip(),
+            REAL_ANSWER_COLUMN: row[REAL_ANSWER_COLUMN],
+        }
+
+    @staticmethod
+    def _get_results_filepath(model_name: str, folder_path: str, extension: str = "csv") -> str:
+        safe_model_name = model_name.replace("/", "-")
+        results_filepath = os.path.join(folder_path, f"{safe_model_name}.{extension}")
+        os.makedirs(os.path.dirname(results_filepath), exist_ok=True)
+        return results_filepath
+
+    def _get_results_journal(
+        self, model_name: str, folder_path: str, resume: bool, extension: str = "jsonl"
+    ) -> ResultsJournal:
+        journal = ResultsJournal(self._get_results_filepath(model_name, folder_path, extension), resume=resume)
+        if journal.recorded_ids:
+            logging.info(f"Resuming evaluation: {len(journal.recorded_ids)} results are already recorded")
+        return journal
+
+    def _get_deduplicator(self, journal: ResultsJournal) -> PromptDeduplicator:
+        deduplicator = PromptDeduplicator(self.deduplicate)
+        if self.deduplicate:
+            # Answers of a resumed run are fanned out as well, the deduplicator skips the errors
+            for record in journal.iter_records():
+                deduplicator.add(record[INPUTS_COLUMN], record[MODEL_ANSWER_COLUMN])
+        return deduplicator
+
+    def _export_results(
+        self,
+        journal: ResultsJournal,
+        model_name: str,
+        folder_path: str,
+        model_handler: ModelHandler,
+        deduplicator: PromptDeduplicator = None,
+    ) -> None:
+        results_filepath = self._get_results_filepath(model_name, folder_path)
+        journal.export_to_csv(results_filepath)
+        logging.info(f"Results saved to {results_filepath}")
+
+        if deduplicator is not None and deduplicator.enabled:
+            summary = deduplicator.summary()
+            with open(
+                self._get_results_filepath(model_name, folder_path, DEDUPLICATION_SUMMARY_EXTENSION),
+                "w",
+                encoding="utf-8",
+            ) as file:
+                json.dump(summary, file, indent=2)
+            logging.info(
+                f"Deduplication: {summary['duplicate_rows']} of {summary['rows']} rows reused the answer to an identical prompt"
+            )
+
+        if self.results_store is not None:
+            run_filepath = self.results_store.write_results(journal.iter_chunks(), model_name)
+            logging.info(f"Results stored in {run_filepath}")
+
+        if model_handler.telemetry is not None:
+            model_handler.telemetry.export(
+                self._get_results_filepath(model_name, folder_path, TELEMETRY_PROMETHEUS_EXTENSION),
+                self._get_results_filepath(model_name, folder_path, TELEMETRY_SUMMARY_EXTENSION),
+            )
+            logging.info(f"Telemetry saved next to {results_filepath}")
+
     def run_evaluation(
         self,
         model_name: str,
-        dataset: pd.DataFrame,
+        dataset: Union[pd.DataFrame, Iterable[pd.DataFrame]],
         model_handler: ModelHandler,
         folder_path: str = RESULTS_FILEPATH,
+        asynchronous: bool = False,
+        max_concurrency: int = None,
+        resume: bool = True,
     ) -> None:
-        safe_model_name = model_name.replace("/", "-")
-        results_filepath = os.path.join(folder_path, f"{safe_model_name}.csv")
-        os.makedirs(os.path.dirname(results_filepath), exist_ok=True)
+        if asynchronous:
+            asyncio.run(self.arun_evaluation(model_name, dataset, model_handler, folder_path, max_concurrency, resume))
+            return
+
+        journal = self._get_results_journal(model_name, folder_path, resume)
+        deduplicator = self._get_deduplicator(journal)
+        with journal:
+            if model_handler.supports_batching:
+                self._run_batched_evaluation(journal, model_name, dataset, model_handler, deduplicator)
+            else:
+                for row, prompt in tqdm(self._iter_rows(dataset), total=self._get_dataset_size(dataset)):
+                    if journal.is_recorded(row[ID_COLUMN]):
+                        continue
+
+                    response = deduplicator.get(prompt)
+                    if response is None:
+                        response = model_handler.generate_response(
+                            prompt, self._get_question_type(row), row[REAL_ANSWER_COLUMN]
+                        )
+                        deduplicator.add(prompt, response)
+                    journal.append(self._get_result(row, model_name, prompt, response))
+
+        self._export_results(journal, model_name, folder_path, model_handler, deduplicator)
+
+    def _evaluate_batch(
+        self,
+        journal: ResultsJournal,
+        model_name: str,
+        rows: list[tuple[pd.Series, str]],
+        model_handler: ModelHandler,
+        deduplicator: PromptDeduplicator,
+    ) -> None:
+        rows, prompts = zip(*rows)
+        responses = [deduplicator.get(prompt) for prompt in prompts]
+
+        # A prompt repeated within the batch is generated once as well
+        positions = defaultdict(list)
+        for i, (prompt, response) in enumerate(zip(prompts, responses)):
+            if response is None:
+                positions[prompt if deduplicator.enabled else i].append(i)
+        deduplicator.record_duplicates(sum(len(prompt_positions) - 1 for prompt_positions in positions.values()))
+
+        first_positions = [prompt_positions[0] for prompt_positions in positions.values()]
+        generated = model_handler.generate_responses(
+            [prompts[i] for i in first_positions], [self._get_question_type(rows[i]) for i in first_positions]
+        )
+        for prompt_positions, response in zip(positions.values(), generated):
+            deduplicator.add(prompts[prompt_positions[0]], response)
+            for i in prompt_positions:
+                responses[i] = response
+
+        for row, prompt, response in zip(rows, prompts, responses):
+            journal.append(self._get_result(row, model_name, prompt, response))
+
+    def _run_batched_evaluation(
+        self,
+        journal: ResultsJournal,
+        model_name: str,
+        dataset: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        model_handler: ModelHandler,
+        deduplicator: PromptDeduplicator,
+    ) -> None:
+        # Rows are queued in chunks larger than the batch size, so the model can group
+        # prompts of a similar length while the results are still recorded in dataset order.
+        queue_size = model_handler.batch_size * EVALUATION_BATCH_QUEUE_FACTOR
+
+        rows = []
+        for row, prompt in tqdm(self._iter_rows(dataset), total=self._get_dataset_size(dataset)):
+            if journal.is_recorded(row[ID_COLUMN]):
+                continue
+
+            rows.append((row, prompt))
+            if len(rows) >= queue_size:
+                self._evaluate_batch(journal, model_name, rows, model_handler, deduplicator)
+                rows = []
+
+        if rows:
+            self._evaluate_batch(journal, model_name, rows, model_handler, deduplicator)
+
+    async def arun_evaluation(
+        self,
+        model_name: str,
+        dataset: Union[pd.DataFrame, Iterable[pd.DataFrame], AsyncIterable[pd.DataFrame]],
+        model_handler: ModelHandler,
+        folder_path: str = RESULTS_FILEPATH,
+        max_concurrency: int = None,
+        resume: bool = True,
+    ) -> None:
+        max_concurrency = max_concurrency or model_handler.max_concurrency
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def generate_response(prompt: str, question_type: str, real_answer: str) -> str:
+            async with semaphore:
+                return await model_handler.agenerate_response(prompt, question_type, real_answer)
+
+        def discard_error(prompt: str, task: asyncio.Task) -> None:
+            # Rows that already share the task get its error, later duplicates call the model again
+            if not task.cancelled() and task.exception() is None and is_error_response(task.result()):
+                deduplicator.discard(prompt)
+
+        # Requests are scheduled in dataset order and awaited oldest first, so the
+        # results keep the dataset order while up to max_concurrency calls are in flight.
+        journal = self._get_results_journal(model_name, folder_path, resume)
+        deduplicator = self._get_deduplicator(journal)
+        pending = deque()
+        try:
+            with journal, tqdm(total=self._get_dataset_size(dataset), desc=model_name) as progress:
+                async for row, prompt in self._aiter_rows(dataset):
+                    if journal.is_recorded(row[ID_COLUMN]):
+                        progress.update()
+                        continue
 
-        results = []
-        for _, row in tqdm(dataset.iterrows(), total=dataset.shape[0]):
-            prompt = self.fill_instruction(row)
-            response = model_handler.generate_response(prompt)
-            results.append(
-                {
-                    ID_COLUMN: row[ID_COLUMN],
-                    MODEL_COLUMN: model_name,
-                    SUBJECT_COLUMN: row[META_COLUMN][SUBJECT_COLUMN],
-                    TYPE_COLUMN: row[META_COLUMN][TYPE_COLUMN],
-                    PROVOC_SCORE_COLUMN: row[META_COLUMN][PROVOC_SCORE_COLUMN],
-                    INPUTS_COLUMN: prompt,
-                    MODEL_ANSWER_COLUMN: response.strip(),
-                    REAL_ANSWER_COLUMN: row[REAL_ANSWER_COLUMN],
-                }
+                    # Rows with an identical prompt await the same task
+                    task = deduplicator.get(prompt)
+                    if task is None:
+                        task = asyncio.create_task(
+                            generate_response(prompt, self._get_question_type(row), row[REAL_ANSWER_COLUMN])
+                        )
+                        deduplicator.add(prompt, task)
+                        task.add_done_callback(lambda task, prompt=prompt: discard_error(prompt, task))
+                    elif isinstance(task, str):
+                        task = asyncio.create_task(asyncio.sleep(0, task))
+                    pending.append((row, prompt, task))
+
+                    if len(pending) >= max_concurrency * EVALUATION_WINDOW_FACTOR:
+                        row, prompt, task = pending.popleft()
+                        journal.append(self._get_result(row, model_name, prompt, await task))
+                        progress.update()
+
+                while pending:
+                    row, prompt, task = pending.popleft()
+                    journal.append(self._get_result(row, model_name, prompt, await task))
+                    progress.update()
+        finally:
+            for _, _, task in pending:
+                task.cancel()
+
+        self._export_results(journal, model_name, folder_path, model_handler, deduplicator)
+
+    def _iter_compiled_chunks(self, dataset: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> Iterator[pd.DataFrame]:
+        chunks = [dataset] if isinstance(dataset, pd.DataFrame) else dataset
+        for chunk in chunks:
+            yield chunk if PROMPT_COLUMN in chunk.columns else self.compile_prompts(chunk)
+
+    def run_evaluation_many(
+        self,
+        models: list[tuple[str, ModelHandler]],
+        dataset: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        folder_path: str = RESULTS_FILEPATH,
+        max_concurrency: int = None,
+        resume: bool = True,
+    ) -> None:
+        asyncio.run(self.arun_evaluation_many(models, dataset, folder_path, max_concurrency, resume))
+
+    @staticmethod
+    async def _aiter_queue(queue: asyncio.Queue) -> AsyncIterator[pd.DataFrame]:
+        while (chunk := await queue.get()) is not None:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    async def _read_chunks(
+        self, dataset: Iterable[pd.DataFrame], queues: list[asyncio.Queue], closed_queues: set[int]
+    ) -> None:
+        # A full queue blocks the reader, so the fastest model is at most the queue size ahead of the slowest
+        # and only those chunks are kept in memory. Queues of finished models are skipped.
+        async def put(item) -> None:
+            for i, queue in enumerate(queues):
+                if i not in closed_queues:
+                    await queue.put(item)
+
+        try:
+            for chunk in self._iter_compiled_chunks(dataset):
+                if len(closed_queues) == len(queues):
+                    return
+                await put(chunk)
+        except Exception as e:
+            await put(e)
+            raise
+        await put(None)
+
+    async def arun_evaluation_many(
+        self,
+        models: list[tuple[str, ModelHandler]],
+        dataset: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        folder_path: str = RESULTS_FILEPATH,
+        max_concurrency: int = None,
+        resume: bool = True,
+    ) -> None:
+        # Prompts are rendered once and shared, while every model runs its own evaluation concurrently,
+        # so a slow provider does not hold back the others and each model's results are saved when it finishes.
+        queues, closed_queues, reader = [], set(), None
+        if isinstance(dataset, pd.DataFrame):
+            compiled = self.compile_prompts(dataset) if PROMPT_COLUMN not in dataset.columns else dataset
+            datasets = [compiled] * len(models)
+        else:
+            # One reader feeds a bounded queue per model, so a fast model can only read a few chunks ahead
+            queues = [asyncio.Queue(maxsize=EVALUATION_MANY_QUEUE_SIZE) for _ in models]
+            datasets = [self._aiter_queue(queue) for queue in queues]
+            reader = asyncio.create_task(self._read_chunks(dataset, queues, closed_queues))
+
+        async def evaluate(i: int, model_name: str, model_handler: ModelHandler, model_dataset) -> None:
+            try:
+                await self.arun_evaluation(
+                    model_name, model_dataset, model_handler, folder_path, max_concurrency, resume
+                )
+            finally:
+                if queues:
+                    # The reader stops waiting for a model that finished or failed
+                    closed_queues.add(i)
+                    while not queues[i].empty():
+                        queues[i].get_nowait()
+
+        evaluations = [
+            evaluate(i, model_name, model_handler, model_dataset)
+            for i, ((model_name, model_handler), model_dataset) in enumerate(zip(models, datasets))
+        ]
+        outcomes = await asyncio.gather(*evaluations, return_exceptions=True)
+        if reader is not None:
+            # An error of the reader has already reached the models through their queues
+            await asyncio.gather(reader, return_exceptions=True)
+
+        errors = []
+        for (model_name, _), outcome in zip(models, outcomes):
+            if isinstance(outcome, Exception):
+                logging.error(f"Evaluation of {model_name} failed", exc_info=outcome)
+                errors.append(outcome)
+        if errors:
+            raise errors[0]
+
+    def _get_strata(self, dataset: pd.DataFrame) -> pd.DataFrame:
+        if INPUTS_COLUMN not in dataset.columns:
+            return dataset[SCREENING_STRATA_COLUMNS].reset_index(drop=True)
+
+        meta = dataset[META_COLUMN].tolist()
+        return pd.DataFrame({column: [row_meta[column] for row_meta in meta] for column in SCREENING_STRATA_COLUMNS})
+
+    def run_screening(
+        self,
+        model_name: str,
+        dataset: pd.DataFrame,
+        model_handler: ModelHandler,
+        folder_path: str = RESULTS_FILEPATH,
+        ci_width: float = SCREENING_CI_WIDTH,
+        confidence: float = SCREENING_CONFIDENCE,
+        batch_size: int = SCREENING_BATCH_SIZE,
+        max_concurrency: int = None,
+        seed: int = SCREENING_SEED,
+        resume: bool = True,
+    ) -> pd.DataFrame:
+        return asyncio.run(
+            self.arun_screening(
+                model_name,
+                dataset,
+                model_handler,
+                folder_path,
+                ci_width,
+                confidence,
+                batch_size,
+                max_concurrency,
+                seed,
+                resume,
             )
+        )
 
-        pd.DataFrame(results).to_csv(results_filepath, index=False, encoding="utf-8")
-        logging.info(f"Results saved to {results_filepath}")
+    async def arun_screening(
+        self,
+        model_name: str,
+        dataset: pd.DataFrame,
+        model_handler: ModelHandler,
+        folder_path: str = RESULTS_FILEPATH,
+        ci_width: float = SCREENING_CI_WIDTH,
+        confidence: float = SCREENING_CONFIDENCE,
+        batch_size: int = SCREENING_BATCH_SIZE,
+        max_concurrency: int = None,
+        seed: int = SCREENING_SEED,
+        resume: bool = True,
+    ) -> pd.DataFrame:
+        """Evaluates a stratified random sample of the dataset until the score interval is narrow enough.
+
+        Returns the sampled results in the results format, so they can be passed to MetricsCalculator,
+        with the per-stratum and overall score intervals as records in ``attrs[SCREENING_ESTIMATES_ATTR]``.
+        """
+        dataset = dataset.reset_index(drop=True)
+        if PROMPT_COLUMN not in dataset.columns:
+            dataset = self.compile_prompts(dataset)
+
+        strata = self._get_strata(dataset)
+        estimator = StratifiedEstimator(strata, confidence)
+        question_ids = dataset[ID_COLUMN].tolist()
+        positions_by_id = {question_id: position for position, question_id in enumerate(question_ids)}
+
+        max_concurrency = max_concurrency or model_handler.max_concurrency
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def generate_response(prompt: str, question_type: str, real_answer: str) -> str:
+            async with semaphore:
+                return await model_handler.agenerate_response(prompt, question_type, real_answer)
+
+        # Answers recorded by an interrupted screening count towards the estimate
+        journal = self._get_results_journal(model_name, folder_path, resume, SCREENING_JOURNAL_EXTENSION)
+        # Error answers are not recorded, so they are retried rather than scored
+        recorded = pd.DataFrame(
+            [
+                record
+                for record in journal.iter_latest_records()
+                if record[ID_COLUMN] in positions_by_id and journal.is_recorded(record[ID_COLUMN])
+            ]
+        )
+        if not recorded.empty:
+            estimator.update(recorded[ID_COLUMN].map(positions_by_id).to_numpy(), score_results(recorded))
+
+        order = [
+            position for position in get_sampling_order(strata, seed) if not journal.is_recorded(question_ids[position])
+        ]
+        with journal, tqdm(total=len(dataset), initial=len(recorded), desc=model_name) as progress:
+            for start in range(0, len(order), batch_size):
+                if estimator.is_converged(ci_width):
+                    break
+
+                positions = order[start : start + batch_size]
+                rows = [dataset.iloc[position] for position in positions]
+                prompts = [row[PROMPT_COLUMN] for row in rows]
+                question_types = [self._get_question_type(row) for row in rows]
+                if model_handler.supports_batching:
+                    responses = model_handler.generate_responses(prompts, question_types)
+                else:
+                    responses = await asyncio.gather(
+                        *(
+                            generate_response(prompt, question_type, row[REAL_ANSWER_COLUMN])
+                            for row, prompt, question_type in zip(rows, prompts, question_types)
+                        )
+                    )
+
+                results = [
+                    self._get_result(row, model_name, prompt, response)
+                    for row, prompt, response in zip(rows, prompts, responses)
+                ]
+                for result in results:
+                    journal.append(result)
+
+                # Error answers are retried on resume, so they are not scored either, as on the resume path
+                scored = [
+                    (position, result)
+                    for position, result in zip(positions, results)
+                    if not is_error_response(result[MODEL_ANSWER_COLUMN])
+                ]
+                if scored:
+                    scored_positions, scored_results = zip(*scored)
+                    estimator.update(np.array(scored_positions), score_results(pd.DataFrame(list(scored_results))))
+                progress.update(len(results))
+                progress.set_postfix(ci_width=f"{estimator.estimate()[SCREENING_CI_WIDTH_COLUMN]:.3f}")
+
+        # The sample stays in its journal and is neither exported to CSV nor stored,
+        # so it never reaches the leaderboard as if it were a full evaluation
+        estimates = estimator.get_estimates()
+        estimates.to_json(
+            self._get_results_filepath(model_name, folder_path, SCREENING_EXTENSION),
+            orient="records",
+            indent=2,
+            force_ascii=False,
+        )
+        if model_handler.telemetry is not None:
+            model_handler.telemetry.export(
+                self._get_results_filepath(model_name, folder_path, f"screening.{TELEMETRY_PROMETHEUS_EXTENSION}"),
+                self._get_results_filepath(model_name, folder_path, f"screening.{TELEMETRY_SUMMARY_EXTENSION}"),
+            )
+        estimate = estimator.estimate()
+        logging.info(
+            f"Screening of {model_name}: score {estimate[SCREENING_SCORE_COLUMN]:.3f} "
+            f"± {estimate[SCREENING_CI_WIDTH_COLUMN] / 2:.3f} from {estimate[SCREENING_SAMPLED_COLUMN]} questions"
+        )
+
+        results = pd.concat(journal.iter_chunks(), ignore_index=True)
+        is_error = results[MODEL_ANSWER_COLUMN].map(is_error_response).astype(bool)
+        is_sampled = results[ID_COLUMN].isin(positions_by_id) & ~is_error
+        results = results[is_sampled].reset_index(drop=True)[RESULTS_COLUMNS]
+        # Records rather than a DataFrame, since pandas compares the attrs when concatenating
+        results.attrs[SCREENING_ESTIMATES_ATTR] = estimates.to_dict("records")
+        return results
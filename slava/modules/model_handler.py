@@ -1,13 +1,166 @@
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable
+
 from langchain_core.prompts import PromptTemplate
 
+from slava.config import (
+    DEFAULT_MAX_CONCURRENCY,
+    MODEL_ERROR_PREFIXES,
+    OPEN_QUESTION_VALUE,
+    TELEMETRY_ERROR_RESPONSE_CLASS,
+)
+from slava.models.base import call_telemetry
+from slava.modules.response_cache import ResponseCache
+from slava.modules.telemetry import Telemetry
+from slava.modules.utils.metrics_utils import is_answer_complete
+
 
 class ModelHandler:
 
-    def __init__(self, model_class=None):
+    def __init__(
+        self, model_class=None, cache: ResponseCache = None, telemetry: Telemetry = None, early_stopping: bool = False
+    ):
         self.model_class = model_class
+        self.cache = cache
+        self.telemetry = telemetry
+        self.early_stopping = early_stopping
+
+    @property
+    def max_concurrency(self) -> int:
+        return getattr(self.model_class, "max_concurrency", DEFAULT_MAX_CONCURRENCY)
+
+    @property
+    def batch_size(self) -> int:
+        return getattr(self.model_class, "batch_size", 1)
+
+    @property
+    def supports_batching(self) -> bool:
+        return hasattr(self.model_class, "generate_batch")
+
+    @property
+    def supports_streaming(self) -> bool:
+        return hasattr(getattr(self.model_class, "model", None), "stream_until")
 
-    def generate_response(self, prompt: str) -> str:
+    def _get_stop_condition(self, question_type: str = None, real_answer: str = None) -> Callable[[str], bool] | None:
+        # A closed answer is stopped once none of its metrics can change, which depends on the real answer,
+        # while open answers are scored on the whole text
+        if not self.early_stopping or not self.supports_streaming or real_answer is None:
+            return None
+        if question_type in (None, OPEN_QUESTION_VALUE):
+            return None
+        return partial(is_answer_complete, real_answer=real_answer)
+
+    def _get_chain(self):
         template = PromptTemplate.from_template("{prompt}")
-        chain = template | self.model_class.model.bind(skip_prompt=True)
-        response = chain.invoke({"prompt": prompt})
+        return template | self.model_class.model.bind(skip_prompt=True)
+
+    def _get_cache_key(self, prompt: str, stopped_for: str = None) -> str:
+        generation_params = getattr(self.model_class, "generation_params", {})
+        if stopped_for is not None:
+            # Stopped responses are truncated for the real answer they are scored against,
+            # so they are cached apart from the full ones and per real answer
+            generation_params = {**generation_params, "early_stopping": stopped_for}
+
+        return ResponseCache.get_key(
+            provider=type(self.model_class).__name__,
+            model_name=getattr(self.model_class, "model_name", None),
+            generation_params=generation_params,
+            prompt=prompt,
+        )
+
+    def _get_cached_response(self, key: str) -> str | None:
+        response = self.cache.get(key)
+        if response is None and self.cache.offline:
+            raise LookupError("The response is not cached and the cache is in offline replay mode")
+        return response
+
+    @contextmanager
+    def _record_call(self, question_types: list[str]):
+        if self.telemetry is None:
+            yield {}
+            return
+
+        # The providers and the rate controller fill in the details of the call through the context
+        values = {}
+        token = call_telemetry.set(values)
+        started_at = time.perf_counter()
+        try:
+            yield values
+        except Exception as e:
+            values.setdefault("error_class", type(e).__name__)
+            raise
+        finally:
+            call_telemetry.reset(token)
+            wall_time = time.perf_counter() - started_at
+            model_name = getattr(self.model_class, "model_name", None) or type(self.model_class).__name__
+            for question_type in question_types:
+                self.telemetry.record(model_name, question_type, wall_time=wall_time, **values)
+
+    @staticmethod
+    def _check_response(values: dict, response) -> None:
+        # The wrappers return errors as strings, so they are recognized by their prefix
+        if isinstance(response, str) and response.startswith(MODEL_ERROR_PREFIXES):
+            values.setdefault("error_class", TELEMETRY_ERROR_RESPONSE_CLASS)
+
+    def generate_response(self, prompt: str, question_type: str = None, real_answer: str = None) -> str:
+        is_complete = self._get_stop_condition(question_type, real_answer)
+        if self.cache is not None:
+            key = self._get_cache_key(prompt, stopped_for=str(real_answer) if is_complete is not None else None)
+            response = self._get_cached_response(key)
+            if response is not None:
+                return response
+
+        with self._record_call([question_type]) as values:
+            if is_complete is not None:
+                response = self.model_class.model.stream_until(prompt, is_complete)
+            else:
+                response = self._get_chain().invoke({"prompt": prompt})
+            self._check_response(values, response)
+
+        if self.cache is not None:
+            self.cache.set(key, response)
+        return response
+
+    async def agenerate_response(self, prompt: str, question_type: str = None, real_answer: str = None) -> str:
+        is_complete = self._get_stop_condition(question_type, real_answer)
+        if self.cache is not None:
+            key = self._get_cache_key(prompt, stopped_for=str(real_answer) if is_complete is not None else None)
+            response = self._get_cached_response(key)
+            if response is not None:
+                return response
+
+        with self._record_call([question_type]) as values:
+            if is_complete is not None:
+                response = await self.model_class.model.astream_until(prompt, is_complete)
+            else:
+                response = await self._get_chain().ainvoke({"prompt": prompt})
+            self._check_response(values, response)
+
+        if self.cache is not None:
+            self.cache.set(key, response)
         return response
+
+    def generate_responses(self, prompts: list[str], question_types: list[str] = None) -> list[str]:
+        question_types = question_types or [None] * len(prompts)
+        if not self.supports_batching:
+            return [self.generate_response(prompt, qtype) for prompt, qtype in zip(prompts, question_types)]
+
+        keys = [None] * len(prompts)
+        responses = [None] * len(prompts)
+        if self.cache is not None:
+            for i, prompt in enumerate(prompts):
+                keys[i] = self._get_cache_key(prompt)
+                responses[i] = self._get_cached_response(keys[i])
+
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            # Every prompt of the batch is recorded with the latency of the whole batch
+            with self._record_call([question_types[i] for i in missing]):
+                generated = self.model_class.generate_batch([prompts[i] for i in missing])
+            for i, response in zip(missing, generated):
+                responses[i] = response
+                if self.cache is not None:
+                    self.cache.set(keys[i], response)
+        return responses
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from slava.config import (
+    MODEL_ERROR_PREFIXES,
+    RESPONSE_CACHE_EVICTION_INTERVAL,
+    RESPONSE_CACHE_FILEPATH,
+    RESPONSE_CACHE_MAX_AGE,
+    RESPONSE_CACHE_MAX_SIZE,
+)
+
+
+class ResponseCache:
+    """Persistent SQLite cache of model responses keyed by the provider, model, generation params and prompt.
+
+    In offline mode the cache is read-only and a missing response is an error instead of an API call,
+    so an old run can be replayed without touching the provider.
+    """
+
+    def __init__(
+        self,
+        cache_filepath: str = RESPONSE_CACHE_FILEPATH,
+        max_size: int = RESPONSE_CACHE_MAX_SIZE,
+        max_age: float = RESPONSE_CACHE_MAX_AGE,
+        offline: bool = False,
+    ):
+        self.cache_filepath = cache_filepath
+        self.max_size = max_size
+        self.max_age = max_age
+        self.offline = offline
+
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        if self.offline:
+            self._connection = sqlite3.connect(f"file:{cache_filepath}?mode=ro", uri=True, check_same_thread=False)
+            return
+
+        directory = os.path.dirname(cache_filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection = sqlite3.connect(cache_filepath, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._connection.commit()
+        self.evict()
+
+    @staticmethod
+    def get_key(provider: str, model_name: str, generation_params: dict, prompt: str) -> str:
+        payload = json.dumps(
+            {"provider": provider, "model": model_name, "params": generation_params, "prompt": prompt},
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @property
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or (not self.offline and time.time() - row[1] > self.max_age):
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if not self.offline:
+                self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                self._connection.commit()
+            return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        if self.offline or not isinstance(response, str) or response.startswith(MODEL_ERROR_PREFIXES):
+            return
+
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now),
+            )
+            self._connection.commit()
+            self._writes += 1
+
+        if self._writes % RESPONSE_CACHE_EVICTION_INTERVAL == 0:
+            self.evict()
+
+    def evict(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,))
+
+            total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size > self.max_size:
+                expired_keys = []
+                for key, size in self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                    if total_size <= self.max_size:
+                        break
+                    expired_keys.append((key,))
+                    total_size -= size
+                self._connection.executemany("DELETE FROM responses WHERE key = ?", expired_keys)
+
+            self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
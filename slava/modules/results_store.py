@@ -0,0 +1,131 @@
+import os
+import time
+
+import pandas as pd
+
+from slava.config import (
+    INPUTS_COLUMN,
+    RESULTS_COLUMNS,
+    RESULTS_EXPORT_CHUNK_SIZE,
+    RESULTS_STORE_COLUMN_TYPES,
+    RESULTS_STORE_FILE_EXTENSION,
+    RESULTS_STORE_PATH,
+    RUN_COLUMN,
+)
+from slava.modules.utils.dependencies import import_optional_dependency
+
+
+class ResultsStore:
+    """Parquet store of evaluation results partitioned by model and run.
+
+    Every run of a model is one file ``<store_path>/<model>/<run>.parquet``. Provocativeness scores
+    are stored as integers and the other columns, ids included, as strings. Prompts are dictionary-encoded,
+    columns can be projected and filters are pushed down to the row-group statistics.
+    pyarrow is imported on first use, so the ``parquet`` extra is only required when the store is used.
+    """
+
+    def __init__(self, store_path: str = RESULTS_STORE_PATH):
+        self.store_path = store_path
+
+    @staticmethod
+    def get_run_id() -> str:
+        return time.strftime("%Y%m%dT%H%M%S")
+
+    def get_run_filepath(self, model_name: str, run_id: str) -> str:
+        safe_model_name = model_name.replace("/", "-")
+        return os.path.join(self.store_path, safe_model_name, f"{run_id}{RESULTS_STORE_FILE_EXTENSION}")
+
+    def get_run_filepaths(self, models: list[str] = None, latest_run: bool = True) -> list[str]:
+        if not os.path.isdir(self.store_path):
+            return []
+
+        safe_models = None if models is None else {model.replace("/", "-") for model in models}
+        paths = []
+        for model_directory in sorted(os.listdir(self.store_path)):
+            if safe_models is not None and model_directory not in safe_models:
+                continue
+
+            directory = os.path.join(self.store_path, model_directory)
+            runs = sorted(f for f in os.listdir(directory) if f.endswith(RESULTS_STORE_FILE_EXTENSION))
+            if runs:
+                paths.extend(os.path.join(directory, run) for run in (runs[-1:] if latest_run else runs))
+        return paths
+
+    @staticmethod
+    def get_schema():
+        pa = import_optional_dependency("pyarrow")
+
+        # The long prompts repeat across models and runs, so they are stored dictionary-encoded
+        return pa.schema(
+            [
+                (
+                    column,
+                    pa.dictionary(pa.int32(), pa.string()) if column == INPUTS_COLUMN else pa.type_for_alias(type_name),
+                )
+                for column, type_name in RESULTS_STORE_COLUMN_TYPES.items()
+            ]
+        )
+
+    @staticmethod
+    def _get_table(results: pd.DataFrame, run_id: str):
+        pa = import_optional_dependency("pyarrow")
+
+        results = results.reindex(columns=RESULTS_COLUMNS)
+        # Missing values stay missing, e.g. a missing answer is stored as null rather than "nan"
+        results = results.astype(
+            {
+                column: "Int64" if type_name == "int64" else "string"
+                for column, type_name in RESULTS_STORE_COLUMN_TYPES.items()
+                if column in results.columns
+            }
+        )
+        results[RUN_COLUMN] = run_id
+        table = pa.Table.from_pandas(results, schema=ResultsStore.get_schema(), preserve_index=False)
+        # Without the pandas metadata the columns are read back as plain numpy and object columns
+        return table.replace_schema_metadata(None)
+
+    def write_results(self, results_chunks, model_name: str, run_id: str = None) -> str:
+        pq = import_optional_dependency("pyarrow.parquet")
+
+        run_id = run_id or self.get_run_id()
+        run_filepath = self.get_run_filepath(model_name, run_id)
+        os.makedirs(os.path.dirname(run_filepath), exist_ok=True)
+
+        # The run is written to a temporary file first, so readers never see a partial run
+        temporary_filepath = f"{run_filepath}.tmp"
+        writer = None
+        try:
+            for results in results_chunks:
+                table = self._get_table(results, run_id)
+                if writer is None:
+                    writer = pq.ParquetWriter(temporary_filepath, table.schema, compression="zstd")
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            return None
+
+        os.replace(temporary_filepath, run_filepath)
+        return run_filepath
+
+    def read_results(
+        self, paths: list[str] = None, columns: list[str] = None, filters: list[tuple] = None
+    ) -> pd.DataFrame:
+        pq = import_optional_dependency("pyarrow.parquet")
+
+        paths = self.get_run_filepaths() if paths is None else paths
+        if not paths:
+            return pd.DataFrame(columns=columns or RESULTS_COLUMNS + [RUN_COLUMN])
+
+        return pq.read_table(paths, columns=columns, filters=filters).to_pandas()
+
+    def export_to_csv(self, run_filepath: str, results_filepath: str, chunk_size: int = RESULTS_EXPORT_CHUNK_SIZE):
+        pq = import_optional_dependency("pyarrow.parquet")
+
+        with open(results_filepath, "w", encoding="utf-8", newline="") as file:
+            header = True
+            for batch in pq.ParquetFile(run_filepath).iter_batches(batch_size=chunk_size, columns=RESULTS_COLUMNS):
+                batch.to_pandas().to_csv(file, index=False, header=header)
+                header = False
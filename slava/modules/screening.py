@@ -0,0 +1,138 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from slava.config import (
+    NOT_OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES,
+    OPEN_QUESTION_VALUE,
+    OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES,
+    SCREENING_ALL_STRATA,
+    SCREENING_CI_HIGH_COLUMN,
+    SCREENING_CI_LOW_COLUMN,
+    SCREENING_CI_WIDTH_COLUMN,
+    SCREENING_CONFIDENCE,
+    SCREENING_MIN_STRATUM_SIZE,
+    SCREENING_POPULATION_COLUMN,
+    SCREENING_PRIOR_MEAN,
+    SCREENING_PRIOR_VARIANCE,
+    SCREENING_SAMPLED_COLUMN,
+    SCREENING_SCORE_COLUMN,
+    SCREENING_SEED,
+    TYPE_COLUMN,
+)
+from slava.modules.metrics import METRICS_INPUT_COLUMNS, NOT_OPEN_QUESTIONS_METRICS, OPEN_QUESTIONS_METRICS
+from slava.modules.utils.metrics_helpers import calculate_metrics
+from slava.modules.utils.metrics_utils import preprocess_answers
+
+
+def score_results(results: pd.DataFrame) -> np.ndarray:
+    """Scores every answer with the mean of the leaderboard metrics of its question type."""
+    data = results[METRICS_INPUT_COLUMNS].reset_index(drop=True)
+    open_questions, not_open_questions = preprocess_answers(data.copy())
+    is_open = (data[TYPE_COLUMN] == OPEN_QUESTION_VALUE).to_numpy()
+
+    scores = np.empty(len(data), dtype=float)
+    for mask, questions, metric_functions, metric_columns in (
+        (is_open, open_questions, OPEN_QUESTIONS_METRICS, OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES),
+        (~is_open, not_open_questions, NOT_OPEN_QUESTIONS_METRICS, NOT_OPEN_QUESTION_VALUES_FOR_PIVOT_TABLES),
+    ):
+        if questions.empty:
+            continue
+
+        metrics = calculate_metrics(
+            metric_functions, {column: questions[column].to_numpy() for column in METRICS_INPUT_COLUMNS}
+        )
+        scores[mask] = np.mean([metrics[column] for column in metric_columns], axis=0)
+    return scores
+
+
+def get_sampling_order(strata: pd.DataFrame, seed: int = SCREENING_SEED) -> np.ndarray:
+    """Random order of the rows in which every prefix is close to a proportional stratified sample."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(strata))
+    codes = strata.iloc[order].groupby(list(strata.columns), sort=False, dropna=False).ngroup().to_numpy()
+
+    # The k-th row of a stratum of size N gets a priority in [k / N, (k + 1) / N), so the
+    # strata are interleaved evenly instead of being exhausted one after another
+    ranks = pd.Series(codes).groupby(codes).cumcount().to_numpy()
+    sizes = np.bincount(codes)[codes]
+    priorities = (ranks + rng.random(len(order))) / sizes
+    return order[np.argsort(priorities, kind="stable")]
+
+
+class StratifiedEstimator:
+    """Online stratified estimate of the mean score with a normal confidence interval.
+
+    Per-stratum means and variances are updated with Welford's algorithm, and the strata are weighted
+    by their share of the dataset. Strata with fewer than two answers get the largest possible variance.
+    """
+
+    def __init__(
+        self,
+        strata: pd.DataFrame,
+        confidence: float = SCREENING_CONFIDENCE,
+        min_stratum_size: int = SCREENING_MIN_STRATUM_SIZE,
+    ):
+        grouping = strata.groupby(list(strata.columns), sort=True, dropna=False)
+        self.strata_columns = list(strata.columns)
+        self.codes = grouping.ngroup().to_numpy()
+        self.strata = grouping.size().rename(SCREENING_POPULATION_COLUMN).reset_index()
+
+        self.population = self.strata[SCREENING_POPULATION_COLUMN].to_numpy(dtype=float)
+        self.weights = self.population / self.population.sum()
+        self.min_stratum_size = min_stratum_size
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+        self.counts = np.zeros(len(self.strata), dtype=float)
+        self.means = np.zeros(len(self.strata), dtype=float)
+        self.m2 = np.zeros(len(self.strata), dtype=float)
+
+    def update(self, positions: np.ndarray, scores: np.ndarray) -> None:
+        for code, score in zip(self.codes[positions], scores):
+            self.counts[code] += 1
+            delta = score - self.means[code]
+            self.means[code] += delta / self.counts[code]
+            self.m2[code] += delta * (score - self.means[code])
+
+    def _get_means_and_variances(self) -> tuple[np.ndarray, np.ndarray]:
+        sampled = self.counts > 0
+        means = np.where(sampled, self.means, SCREENING_PRIOR_MEAN)
+        sample_variances = np.where(self.counts > 1, self.m2 / np.maximum(self.counts - 1, 1), SCREENING_PRIOR_VARIANCE)
+        # Variance of the stratum mean with the finite population correction, it is zero for exhausted strata
+        variances = sample_variances / np.maximum(self.counts, 1) * (1 - self.counts / self.population)
+        return means, np.where(sampled, variances, SCREENING_PRIOR_VARIANCE)
+
+    def _get_interval(self, score: float, variance: float) -> dict:
+        half_width = self.z * np.sqrt(variance)
+        return {
+            SCREENING_SCORE_COLUMN: score,
+            SCREENING_CI_LOW_COLUMN: max(0.0, score - half_width),
+            SCREENING_CI_HIGH_COLUMN: min(1.0, score + half_width),
+            SCREENING_CI_WIDTH_COLUMN: 2 * half_width,
+        }
+
+    def estimate(self) -> dict:
+        means, variances = self._get_means_and_variances()
+        return {
+            SCREENING_POPULATION_COLUMN: int(self.population.sum()),
+            SCREENING_SAMPLED_COLUMN: int(self.counts.sum()),
+            **self._get_interval(float(self.weights @ means), float(self.weights**2 @ variances)),
+        }
+
+    def is_converged(self, ci_width: float) -> bool:
+        if self.counts.sum() >= self.population.sum():
+            return True
+        if (self.counts < np.minimum(self.min_stratum_size, self.population)).any():
+            return False
+        return self.estimate()[SCREENING_CI_WIDTH_COLUMN] <= ci_width
+
+    def get_estimates(self) -> pd.DataFrame:
+        means, variances = self._get_means_and_variances()
+        estimates = self.strata.assign(**{SCREENING_SAMPLED_COLUMN: self.counts.astype(int)})
+        intervals = pd.DataFrame([self._get_interval(mean, variance) for mean, variance in zip(means, variances)])
+        estimates = pd.concat([estimates, intervals], axis=1)
+
+        # The last row is the overall score, with the strata columns set to ALL
+        overall = {column: SCREENING_ALL_STRATA for column in self.strata_columns}
+        return pd.concat([estimates, pd.DataFrame([{**overall, **self.estimate()}])], ignore_index=True)
@@ -0,0 +1,177 @@
+import bisect
+import json
+import math
+import threading
+from collections import Counter
+
+from slava.config import (
+    TELEMETRY_LATENCY_BUCKETS,
+    TELEMETRY_METRIC_PREFIX,
+    TELEMETRY_TOKEN_BUCKETS,
+)
+
+HISTOGRAM_METRICS = {
+    "wall_time_seconds": "Wall time of a provider call, including queueing and retries",
+    "queue_time_seconds": "Time a provider call waited for the rate controller",
+    "prompt_tokens": "Prompt tokens reported by the provider",
+    "response_tokens": "Response tokens reported by the provider",
+}
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Upper bound of the bucket holding the quantile, as Prometheus' histogram_quantile approximates it
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                return bound
+        return math.nan
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5) if self.count else None,
+            "p99": self.quantile(0.99) if self.count else None,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets + (math.inf,), self.counts)},
+        }
+
+
+class Telemetry:
+    """Per-call provider telemetry aggregated into histograms by model and question type.
+
+    Only the aggregates are kept, so the memory use does not grow with the number of calls.
+    """
+
+    def __init__(
+        self,
+        latency_buckets: tuple[float, ...] = TELEMETRY_LATENCY_BUCKETS,
+        token_buckets: tuple[float, ...] = TELEMETRY_TOKEN_BUCKETS,
+    ):
+        self.latency_buckets = latency_buckets
+        self.token_buckets = token_buckets
+        self.calls = Counter()
+        self.retries = Counter()
+        self.errors = Counter()
+        self.histograms: dict[tuple[str, str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def _observe(self, metric: str, labels: tuple[str, str], value: float) -> None:
+        if value is None:
+            return
+
+        key = (metric, *labels)
+        if key not in self.histograms:
+            buckets = self.token_buckets if metric.endswith("tokens") else self.latency_buckets
+            self.histograms[key] = Histogram(buckets)
+        self.histograms[key].observe(value)
+
+    def record(
+        self,
+        model_name: str,
+        question_type: str = None,
+        wall_time: float = None,
+        queue_time: float = None,
+        prompt_tokens: int = None,
+        response_tokens: int = None,
+        attempts: int = None,
+        error_class: str = None,
+    ) -> None:
+        labels = (str(model_name), str(question_type or ""))
+        with self._lock:
+            self.calls[labels] += 1
+            self.retries[labels] += max(0, (attempts or 1) - 1)
+            if error_class is not None:
+                self.errors[(*labels, error_class)] += 1
+
+            self._observe("wall_time_seconds", labels, wall_time)
+            self._observe("queue_time_seconds", labels, queue_time)
+            self._observe("prompt_tokens", labels, prompt_tokens)
+            self._observe("response_tokens", labels, response_tokens)
+
+    @staticmethod
+    def _get_labels(model_name: str, question_type: str, **labels) -> str:
+        labels = {"model": model_name, "question_type": question_type, **labels}
+        escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"') for key, value in labels.items()}
+        return ",".join(f'{key}="{value}"' for key, value in escaped.items())
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, help_text, counter in (
+                ("calls_total", "Provider calls", self.calls),
+                ("retries_total", "Retried attempts of provider calls", self.retries),
+            ):
+                lines += [f"# HELP {TELEMETRY_METRIC_PREFIX}_{name} {help_text}"]
+                lines += [f"# TYPE {TELEMETRY_METRIC_PREFIX}_{name} counter"]
+                lines += [
+                    f"{TELEMETRY_METRIC_PREFIX}_{name}{{{self._get_labels(*labels)}}} {value}"
+                    for labels, value in sorted(counter.items())
+                ]
+
+            lines += [f"# HELP {TELEMETRY_METRIC_PREFIX}_errors_total Failed provider calls by error class"]
+            lines += [f"# TYPE {TELEMETRY_METRIC_PREFIX}_errors_total counter"]
+            lines += [
+                f"{TELEMETRY_METRIC_PREFIX}_errors_total{{{self._get_labels(model, qtype, error_class=error)}}} {value}"
+                for (model, qtype, error), value in sorted(self.errors.items())
+            ]
+
+            for metric, help_text in HISTOGRAM_METRICS.items():
+                name = f"{TELEMETRY_METRIC_PREFIX}_{metric}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (histogram_metric, *labels), histogram in sorted(self.histograms.items()):
+                    if histogram_metric != metric:
+                        continue
+
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else repr(float(bound))
+                        lines.append(f"{name}_bucket{{{self._get_labels(*labels, le=le)}}} {cumulative}")
+                    lines.append(f"{name}_sum{{{self._get_labels(*labels)}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{self._get_labels(*labels)}}} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        summary = {}
+        with self._lock:
+            for (model_name, question_type), calls in sorted(self.calls.items()):
+                errors = {
+                    error: count
+                    for (model, qtype, error), count in self.errors.items()
+                    if (model, qtype) == (model_name, question_type)
+                }
+                summary.setdefault(model_name, {})[question_type] = {
+                    "calls": calls,
+                    "retries": self.retries[(model_name, question_type)],
+                    "error_rate": sum(errors.values()) / calls,
+                    "errors": errors,
+                    **{
+                        metric: self.histograms[(metric, model_name, question_type)].to_dict()
+                        for metric in HISTOGRAM_METRICS
+                        if (metric, model_name, question_type) in self.histograms
+                    },
+                }
+        return summary
+
+    def export(self, prometheus_filepath: str, summary_filepath: str) -> None:
+        with open(prometheus_filepath, "w", encoding="utf-8") as file:
+            file.write(self.to_prometheus())
+
+        with open(summary_filepath, "w", encoding="utf-8") as file:
+            json.dump(self.summary(), file, ensure_ascii=False, indent=2)
@@ -0,0 +1,16 @@
+import importlib
+
+from slava.config import OPTIONAL_DEPENDENCY_EXTRAS
+
+
+def import_optional_dependency(module_name: str):
+    """Imports a module of an optional dependency, or explains which extra installs it."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        package = module_name.split(".")[0]
+        extra = OPTIONAL_DEPENDENCY_EXTRAS[package]
+        raise ImportError(
+            f"{package} is required for this feature. "
+            f"Install it with `poetry install --extras {extra}` or `pip install {package}`."
+        ) from e
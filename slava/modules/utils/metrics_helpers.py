@@ -1,26 +1,57 @@
 import os
 from typing import List, Union
 
+import numpy as np
 import pandas as pd
-from fuzzywuzzy import fuzz
 
 from slava.config import (
     AGGFUNC,
+    AGGREGATE_CATEGORY_COLUMN,
+    AGGREGATE_LEVEL_COLUMN,
+    AGGREGATE_METRIC_COLUMN,
+    AGGREGATE_QUESTIONS_TYPE_COLUMN,
+    AGGREGATE_VALUE_COLUMN,
+    COMBINED_VALUES_NAMING,
     EXACT_MATCH_COLUMN,
     F1_SCORE_COLUMN,
     IS_SUBSTRING_COLUMN,
+    KEYS_NAMING,
     LEVENSHTEIN_RATIO_COLUMN,
+    METRICS_NAMING,
     MODEL_ANSWER_COLUMN,
     MODEL_COLUMN,
+    NOT_OPEN_QUESTION_TYPE_NAME,
     ONLY_NUMBERS_MODEL_ANSWER_COLUMN,
+    OPEN_QUESTION_TYPE_NAME,
     PARTIALLY_MATCH_COLUMN,
     PROVOC_SCORE_COLUMN,
+    QUESTION_TYPES_NAMING,
     REAL_ANSWER_COLUMN,
+    RESULTS_COLUMNS,
     RESULTS_FILEPATH,
+    SCORED_FILES_ATTR,
     SUBJECT_COLUMN,
     TYPE_COLUMN,
 )
-from slava.modules.utils.metrics_utils import calculate_f1_score, calculate_pm, only_numbers
+from slava.modules.metrics_store import AGGREGATE_COLUMNS, MetricsStore
+from slava.modules.results_store import ResultsStore
+from slava.modules.utils.metrics_utils import (
+    calculate_f1_scores,
+    calculate_levenshtein_ratios,
+    get_match_function,
+    only_numbers,
+)
+
+PIVOT_COLUMNS = [TYPE_COLUMN, SUBJECT_COLUMN, PROVOC_SCORE_COLUMN]
+QUESTIONS_TYPE_DTYPE = pd.CategoricalDtype([OPEN_QUESTION_TYPE_NAME, NOT_OPEN_QUESTION_TYPE_NAME], ordered=True)
+CATEGORY_DTYPE = pd.CategoricalDtype(PIVOT_COLUMNS, ordered=True)
+METRICS_CUBE_INDEX = [
+    MODEL_COLUMN,
+    AGGREGATE_QUESTIONS_TYPE_COLUMN,
+    AGGREGATE_CATEGORY_COLUMN,
+    AGGREGATE_LEVEL_COLUMN,
+    AGGREGATE_METRIC_COLUMN,
+]
 
 
 def exact_match(questions: pd.DataFrame) -> pd.DataFrame:
@@ -29,71 +60,155 @@ def exact_match(questions: pd.DataFrame) -> pd.DataFrame:
 
 
 def levenshtein_ratio(open_questions: pd.DataFrame) -> pd.DataFrame:
-    open_questions[LEVENSHTEIN_RATIO_COLUMN] = open_questions.apply(
-        lambda row: fuzz.ratio(row[REAL_ANSWER_COLUMN], row[MODEL_ANSWER_COLUMN]) / 100, axis=1
+    open_questions[LEVENSHTEIN_RATIO_COLUMN] = calculate_levenshtein_ratios(
+        open_questions[REAL_ANSWER_COLUMN], open_questions[MODEL_ANSWER_COLUMN]
     )
     return open_questions
 
 
 def f1_score(open_questions: pd.DataFrame) -> pd.DataFrame:
-    open_questions[F1_SCORE_COLUMN] = open_questions.apply(
-        lambda row: calculate_f1_score(row[REAL_ANSWER_COLUMN], row[MODEL_ANSWER_COLUMN]), axis=1
+    open_questions[F1_SCORE_COLUMN] = calculate_f1_scores(
+        open_questions[REAL_ANSWER_COLUMN], open_questions[MODEL_ANSWER_COLUMN]
     )
     return open_questions
 
 
 def is_substring(not_open_questions: pd.DataFrame) -> pd.DataFrame:
-    not_open_questions[IS_SUBSTRING_COLUMN] = not_open_questions.apply(
-        lambda row: row[REAL_ANSWER_COLUMN] in row[MODEL_ANSWER_COLUMN], axis=1
+    not_open_questions[IS_SUBSTRING_COLUMN] = np.array(
+        [
+            real_answer in model_answer
+            for real_answer, model_answer in zip(
+                not_open_questions[REAL_ANSWER_COLUMN], not_open_questions[MODEL_ANSWER_COLUMN]
+            )
+        ],
+        dtype=bool,
     ).astype(int)
     return not_open_questions
 
 
 def partially_match(not_open_questions: pd.DataFrame) -> pd.DataFrame:
     not_open_questions[ONLY_NUMBERS_MODEL_ANSWER_COLUMN] = not_open_questions[MODEL_ANSWER_COLUMN].apply(only_numbers)
-    not_open_questions[PARTIALLY_MATCH_COLUMN] = not_open_questions.apply(calculate_pm, axis=1)
+    not_open_questions[PARTIALLY_MATCH_COLUMN] = np.array(
+        [
+            get_match_function(question_type)(real_answer, only_numbers_model_answer)
+            for question_type, real_answer, only_numbers_model_answer in zip(
+                not_open_questions[TYPE_COLUMN],
+                not_open_questions[REAL_ANSWER_COLUMN],
+                not_open_questions[ONLY_NUMBERS_MODEL_ANSWER_COLUMN],
+            )
+        ],
+        dtype=float,
+    )
     return not_open_questions
 
 
-def create_pivot_table(
+def calculate_metrics(metric_functions: tuple, columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    questions = pd.DataFrame(columns)
+    for metric_function in metric_functions:
+        questions = metric_function(questions)
+    return {column: questions[column].to_numpy() for column in questions.columns if column not in columns}
+
+
+def get_aggregates(
     questions_type: str,
     data: pd.DataFrame,
     value_columns: List[str],
     aggfunc: Union[str, List[str]] = AGGFUNC,
-    fillna_value: float = 0,
 ) -> pd.DataFrame:
-    pivot_by_question_type = data.pivot_table(
-        values=value_columns, index=MODEL_COLUMN, columns=TYPE_COLUMN, aggfunc=aggfunc
-    ).fillna(fillna_value)
-
-    pivot_by_subject = data.pivot_table(
-        values=value_columns, index=MODEL_COLUMN, columns=SUBJECT_COLUMN, aggfunc=aggfunc
-    ).fillna(fillna_value)
-
-    pivot_by_provocative_score = data.pivot_table(
-        values=value_columns, index=MODEL_COLUMN, columns=PROVOC_SCORE_COLUMN, aggfunc=aggfunc
-    ).fillna(fillna_value)
-
-    combined_pivot = pd.concat(
-        [pivot_by_question_type, pivot_by_subject, pivot_by_provocative_score],
-        axis=1,
-        keys=[TYPE_COLUMN, SUBJECT_COLUMN, PROVOC_SCORE_COLUMN],
+    """Aggregates the metrics of every model by every level of the pivot columns in one groupby."""
+    models, model_names = pd.factorize(data[MODEL_COLUMN])
+
+    # Every row is repeated once per pivot column, with a key that numbers the levels of all pivot columns
+    keys, categories, levels = [], [], []
+    for column in PIVOT_COLUMNS:
+        codes, uniques = pd.factorize(data[column])
+        keys.append(np.where(codes < 0, -1, codes + len(levels)))
+        categories += [column] * len(uniques)
+        levels += uniques.astype(str).tolist()
+
+    models, keys = np.tile(models, len(PIVOT_COLUMNS)), np.concatenate(keys)
+    # Missing models and levels are left out, as in a groupby by the columns themselves
+    rows = np.flatnonzero((models >= 0) & (keys >= 0))
+    values = data[value_columns].iloc[rows % len(data)].reset_index(drop=True)
+
+    aggregates = (
+        values.groupby([models[rows], keys[rows]], sort=False)
+        .agg(aggfunc)
+        .rename_axis(index=[MODEL_COLUMN, AGGREGATE_LEVEL_COLUMN], columns=AGGREGATE_METRIC_COLUMN)
+        .stack()
+        .rename(AGGREGATE_VALUE_COLUMN)
+        .reset_index()
     )
-
-    combined_pivot.columns = [
-        f"{questions_type}-{category}-{metric}-{level}" for category, level, metric in combined_pivot.columns
-    ]
-
-    return combined_pivot.reset_index()
+    model_keys, level_keys = aggregates[MODEL_COLUMN].to_numpy(), aggregates[AGGREGATE_LEVEL_COLUMN].to_numpy()
+    aggregates[MODEL_COLUMN] = np.asarray(model_names.astype(str))[model_keys]
+    aggregates[AGGREGATE_CATEGORY_COLUMN] = np.asarray(categories, dtype=object)[level_keys]
+    aggregates[AGGREGATE_LEVEL_COLUMN] = np.asarray(levels, dtype=object)[level_keys]
+    aggregates[AGGREGATE_QUESTIONS_TYPE_COLUMN] = questions_type
+    return aggregates[AGGREGATE_COLUMNS]
+
+
+def get_metrics_cube(aggregates: pd.DataFrame) -> pd.Series:
+    """Indexes the aggregates by model, questions type, category, level and metric.
+
+    The questions types and categories are ordered categoricals, so the sorted cube keeps the column order
+    of the metrics tables.
+    """
+    cube = aggregates.astype(
+        {
+            MODEL_COLUMN: str,
+            AGGREGATE_QUESTIONS_TYPE_COLUMN: QUESTIONS_TYPE_DTYPE,
+            AGGREGATE_CATEGORY_COLUMN: CATEGORY_DTYPE,
+            AGGREGATE_LEVEL_COLUMN: str,
+            AGGREGATE_METRIC_COLUMN: str,
+            AGGREGATE_VALUE_COLUMN: float,
+        }
+    )
+    return cube.set_index(METRICS_CUBE_INDEX)[AGGREGATE_VALUE_COLUMN].sort_index()
 
 
-def get_results(results_filepath: str = RESULTS_FILEPATH) -> pd.DataFrame:
-    paths = [os.path.join(results_filepath, f) for f in os.listdir(results_filepath) if f.endswith(".csv")]
+def get_metrics_column_name(questions_type: str, category: str, metric: str, level: str) -> str:
+    questions_type_name = QUESTION_TYPES_NAMING.get(questions_type)
+    category_name = KEYS_NAMING.get(category)
+    level_name = COMBINED_VALUES_NAMING.get(level)
+    metric_name = METRICS_NAMING.get(metric)
+    return f"{questions_type_name} {category_name} {level_name} {metric_name}".strip()
 
-    evaluations = []
-    for path in paths:
-        evaluation = pd.read_csv(path)
-        evaluations.append(evaluation)
 
-    results = pd.concat(evaluations, ignore_index=True)
+def get_results(
+    results_filepath: str = RESULTS_FILEPATH,
+    metrics_store: MetricsStore = None,
+    results_store: ResultsStore = None,
+    columns: list[str] = None,
+    filters: list[tuple] = None,
+) -> pd.DataFrame:
+    # The metrics store keeps the aggregates of whole files, so a filtered subset would replace them
+    if metrics_store is not None and filters:
+        raise ValueError("Filters cannot be used with a metrics store, since it stores the metrics of all results")
+
+    if results_store is not None:
+        paths = results_store.get_run_filepaths()
+    else:
+        paths = [os.path.join(results_filepath, f) for f in os.listdir(results_filepath) if f.endswith(".csv")]
+
+    # With a metrics store only new or changed result files are loaded
+    if metrics_store is not None:
+        paths = [path for path in paths if not metrics_store.is_file_scored(path)]
+
+    if results_store is not None:
+        # Only the requested columns are read and the filters skip non-matching row groups
+        results = results_store.read_results(paths, columns=columns, filters=filters)
+    else:
+        evaluations = []
+        for path in paths:
+            evaluation = pd.read_csv(path, usecols=columns)
+            evaluations.append(evaluation)
+
+        results = (
+            pd.concat(evaluations, ignore_index=True)
+            if evaluations
+            else pd.DataFrame(columns=columns or RESULTS_COLUMNS)
+        )
+
+    if metrics_store is not None:
+        results.attrs[SCORED_FILES_ATTR] = [metrics_store.get_file_signature(path) for path in paths]
     return results
@@ -2,7 +2,9 @@ import collections
 import re
 import string
 
+import numpy as np
 import pandas as pd
+from fuzzywuzzy import fuzz
 
 from slava.config import (
     MATCHING,
@@ -49,6 +51,35 @@ def only_numbers(raw_text: str) -> str:
         return "-"
 
 
+def is_number_complete(text: str) -> bool:
+    """Whether only_numbers gives the same result for the lowercased and stripped text and any of its continuations.
+
+    The result is fixed once the first line is finished or once the first run of digits is followed
+    by a character it does not skip.
+    """
+    if "\n" in text:
+        return True
+
+    text = "".join(REGEX.sub("", text).split())
+    match = re.search(r"\d+", text)
+    return match is not None and match.end() < len(text)
+
+
+def is_answer_complete(raw_text: str, real_answer: str) -> bool:
+    """Whether every closed question metric scores the text the same as any of its continuations.
+
+    The answers are lowercased and stripped before scoring, so the text and the real answer are too.
+    is_substring can only turn from 0 to 1, so it is fixed once the real answer is in the text,
+    and exact_match is fixed at 0 once the text is more than the real answer followed by whitespace.
+    Wrong answers are therefore never complete before the end of the response.
+    """
+    text = raw_text.lower().lstrip()
+    real_answer = str(real_answer).lower().strip()
+    if real_answer not in text or text.rstrip() == real_answer:
+        return False
+    return is_number_complete(text)
+
+
 def compute_one_choice(answer: str, only_numbers_model_answer: str) -> float:
     return 1.0 if answer == only_numbers_model_answer else 0.0
 
@@ -161,3 +192,78 @@ def get_tokens(text):
     if not text:
         return []
     return normalize_answer(text).split()
+
+
+def calculate_levenshtein_ratios(real_answers: pd.Series, model_answers: pd.Series) -> np.ndarray:
+    # Identical answer pairs are frequent across models, so every distinct pair is scored once
+    real_codes, real_uniques = pd.factorize(real_answers)
+    model_codes, model_uniques = pd.factorize(model_answers)
+    model_uniques_count = max(len(model_uniques), 1)
+
+    pair_keys, codes = np.unique(real_codes.astype(np.int64) * model_uniques_count + model_codes, return_inverse=True)
+    ratios = np.array(
+        [
+            fuzz.ratio(real_uniques[key // model_uniques_count], model_uniques[key % model_uniques_count]) / 100
+            for key in pair_keys
+        ],
+        dtype=float,
+    )
+    return ratios[codes]
+
+
+def get_token_ids(answers: pd.Series, vocabulary: dict[str, int]) -> tuple[np.ndarray, np.ndarray]:
+    codes, unique_answers = pd.factorize(answers)
+
+    unique_token_ids = [
+        [vocabulary.setdefault(token, len(vocabulary)) for token in get_tokens(answer)] for answer in unique_answers
+    ]
+    unique_lengths = np.array([len(token_ids) for token_ids in unique_token_ids], dtype=np.int64)
+    unique_offsets = np.concatenate([[0], np.cumsum(unique_lengths)[:-1]]).astype(np.int64)
+    flat_token_ids = np.fromiter((token_id for token_ids in unique_token_ids for token_id in token_ids), dtype=np.int64)
+
+    lengths = unique_lengths[codes]
+    row_offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    positions = np.repeat(unique_offsets[codes] - row_offsets, lengths) + np.arange(lengths.sum())
+    return flat_token_ids[positions], lengths
+
+
+def count_common_tokens(
+    real_token_ids: np.ndarray,
+    real_lengths: np.ndarray,
+    model_token_ids: np.ndarray,
+    model_lengths: np.ndarray,
+    vocabulary_size: int,
+) -> np.ndarray:
+    rows_count = len(real_lengths)
+    real_keys, real_counts = np.unique(
+        np.repeat(np.arange(rows_count), real_lengths) * vocabulary_size + real_token_ids, return_counts=True
+    )
+    model_keys, model_counts = np.unique(
+        np.repeat(np.arange(rows_count), model_lengths) * vocabulary_size + model_token_ids, return_counts=True
+    )
+
+    common_keys, real_indices, model_indices = np.intersect1d(
+        real_keys, model_keys, assume_unique=True, return_indices=True
+    )
+    common_counts = np.minimum(real_counts[real_indices], model_counts[model_indices])
+    return np.bincount(common_keys // vocabulary_size, weights=common_counts, minlength=rows_count)
+
+
+def calculate_f1_scores(real_answers: pd.Series, model_answers: pd.Series) -> np.ndarray:
+    """Column-wise equivalent of calculate_f1_score over interned token id arrays."""
+    vocabulary: dict[str, int] = {}
+    real_token_ids, real_lengths = get_token_ids(real_answers, vocabulary)
+    model_token_ids, model_lengths = get_token_ids(model_answers, vocabulary)
+    num_same = count_common_tokens(
+        real_token_ids, real_lengths, model_token_ids, model_lengths, max(len(vocabulary), 1)
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = 1.0 * num_same / model_lengths
+        recall = 1.0 * num_same / real_lengths
+        f1 = (2 * precision * recall) / (precision + recall)
+
+    f1 = np.where(num_same == 0, 0.0, f1)
+    return np.where(
+        (real_lengths == 0) | (model_lengths == 0), ((real_lengths == 0) & (model_lengths == 0)).astype(float), f1
+    )
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from slava.config import (
+    ID_COLUMN,
+    MODEL_ANSWER_COLUMN,
+    MODEL_ERROR_PREFIXES,
+    RESULTS_EXPORT_CHUNK_SIZE,
+    RESULTS_FLUSH_SIZE,
+)
+
+
+def to_json_value(value):
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+def is_error_response(response) -> bool:
+    return isinstance(response, str) and response.startswith(MODEL_ERROR_PREFIXES)
+
+
+class ResultsJournal:
+    """Append-only JSONL journal of evaluation results.
+
+    Every result is a single line, so a crash can only leave an incomplete last line,
+    which is dropped on the next open. Ids that are already recorded are skipped on restart,
+    except for error answers, which are retried. Only the last record of an id is exported.
+    """
+
+    def __init__(self, journal_filepath: str, resume: bool = True, flush_size: int = RESULTS_FLUSH_SIZE):
+        self.journal_filepath = journal_filepath
+        self.flush_size = flush_size
+
+        if not resume and os.path.exists(self.journal_filepath):
+            os.remove(self.journal_filepath)
+
+        self._repair()
+        self.recorded_ids = {record[ID_COLUMN] for record in self.iter_records() if not self.is_error(record)}
+        self._buffer: list[str] = []
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.journal_filepath, "a", encoding="utf-8")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def _repair(self) -> None:
+        if not os.path.exists(self.journal_filepath):
+            return
+
+        with open(self.journal_filepath, "rb+") as file:
+            size = file.seek(0, os.SEEK_END)
+            position = size
+            while position > 0:
+                block_start = max(0, position - 65536)
+                file.seek(block_start)
+                block = file.read(position - block_start)
+                newline = block.rfind(b"\n")
+                if newline != -1:
+                    position = block_start + newline + 1
+                    break
+                position = block_start
+
+            if position < size:
+                file.truncate(position)
+
+    def iter_records(self):
+        if not os.path.exists(self.journal_filepath):
+            return
+
+        with open(self.journal_filepath, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+    @staticmethod
+    def is_error(record: dict) -> bool:
+        return is_error_response(record.get(MODEL_ANSWER_COLUMN))
+
+    def iter_latest_records(self):
+        # A retried id has several records, the error ones first
+        last_lines = {record[ID_COLUMN]: line for line, record in enumerate(self.iter_records())}
+        last_lines = set(last_lines.values())
+        for line, record in enumerate(self.iter_records()):
+            if line in last_lines:
+                yield record
+
+    def is_recorded(self, question_id) -> bool:
+        return question_id in self.recorded_ids
+
+    def append(self, result: dict) -> None:
+        self._buffer.append(json.dumps(result, ensure_ascii=False, default=to_json_value) + "\n")
+        if not self.is_error(result):
+            self.recorded_ids.add(result[ID_COLUMN])
+
+        if len(self._buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._file.writelines(self._buffer)
+            self._buffer = []
+        self._file.flush()
+
+    def iter_chunks(self, chunk_size: int = RESULTS_EXPORT_CHUNK_SIZE):
+        chunk = []
+        for record in self.iter_latest_records():
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk)
+                chunk = []
+
+        if chunk:
+            yield pd.DataFrame(chunk)
+
+    def export_to_csv(self, results_filepath: str, chunk_size: int = RESULTS_EXPORT_CHUNK_SIZE) -> None:
+        with open(results_filepath, "w", encoding="utf-8", newline="") as file:
+            header = True
+            for chunk in self.iter_chunks(chunk_size):
+                chunk.to_csv(file, index=False, header=header)
+                header = False
+
+
+class PromptDeduplicator:
+    """Responses by prompt hash, so every unique prompt of a run is sent to the model only once.
+
+    The values are whatever the evaluation loop shares between the rows, e.g. responses or asyncio tasks.
+    Error answers are never shared, so a later duplicate of the prompt calls the model again.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.responses: dict[bytes, object] = {}
+        self.rows = 0
+        self.duplicates = 0
+
+    @staticmethod
+    def get_key(prompt: str) -> bytes:
+        return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, prompt: str):
+        self.rows += 1
+        response = self.responses.get(self.get_key(prompt)) if self.enabled else None
+        if response is not None:
+            self.duplicates += 1
+        return response
+
+    def add(self, prompt: str, response) -> None:
+        if self.enabled and not is_error_response(response):
+            self.responses[self.get_key(prompt)] = response
+
+    def discard(self, prompt: str) -> None:
+        self.responses.pop(self.get_key(prompt), None)
+
+    def record_duplicates(self, count: int) -> None:
+        self.duplicates += count
+
+    def summary(self) -> dict:
+        return {
+            "rows": self.rows,
+            "unique_prompts": self.rows - self.duplicates,
+            "duplicate_rows": self.duplicates,
+            "saved_calls_share": self.duplicates / self.rows if self.rows else 0.0,
+        }
@@ -0,0 +1,52 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST like the Ollama generate API and records the request bodies."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        state = self.server.state
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with state.lock:
+            state.requests.append(body)
+            state.active += 1
+            state.max_active = max(state.max_active, state.active)
+
+        time.sleep(state.latency)
+        response = {"model": body.get("model"), "response": f"answer to {body.get('prompt')}", "done": True}
+        if "prompt" in body:
+            response.update(prompt_eval_count=10, eval_count=2)
+
+        with state.lock:
+            state.active -= 1
+
+        data = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.state = SimpleNamespace(lock=threading.Lock(), requests=[], active=0, max_active=0, latency=0.05)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield SimpleNamespace(url=f"http://127.0.0.1:{server.server_port}", state=server.state)
+
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,37 @@
+import sys
+
+import pytest
+
+from slava.modules.data_converter import DataConverter
+from slava.modules.data_loader import DataLoader
+from slava.modules.results_store import ResultsStore
+
+
+def test_missing_pyarrow_names_the_parquet_extra(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.setitem(sys.modules, "pyarrow.parquet", None)
+
+    with pytest.raises(ImportError, match="poetry install --extras parquet"):
+        ResultsStore(str(tmp_path)).read_results([str(tmp_path / "run.parquet")])
+
+
+def test_missing_pyarrow_in_the_dataset_cache_names_the_parquet_extra(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.setitem(sys.modules, "pyarrow.parquet", None)
+
+    with pytest.raises(ImportError, match="poetry install --extras parquet"):
+        DataLoader(cache_folder=str(tmp_path)).load_flat_data(str(tmp_path / "dataset.jsonl"))
+
+
+def test_missing_zstandard_names_the_zstd_extra(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+
+    with pytest.raises(ImportError, match="poetry install --extras zstd"):
+        DataConverter._open_output(str(tmp_path / "dataset.jsonl.zst"))
+
+
+def test_missing_orjson_names_the_fast_json_extra(monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)
+
+    with pytest.raises(ImportError, match="poetry install --extras fast-json"):
+        DataConverter._get_json_encoder(fast_json=True)
@@ -0,0 +1,121 @@
+import random
+from functools import partial
+
+import pandas as pd
+import pytest
+from langchain_core.runnables import Runnable
+
+from slava.config import (
+    MATCHING,
+    MODEL_ANSWER_COLUMN,
+    MULTI_CHOICE,
+    OPEN_QUESTION_VALUE,
+    REAL_ANSWER_COLUMN,
+    SEQUENCE,
+    SINGLE_CHOICE,
+    TYPE_COLUMN,
+)
+from slava.models.base import collect_stream
+from slava.modules.metrics import NOT_OPEN_QUESTIONS_METRIC_COLUMNS, NOT_OPEN_QUESTIONS_METRICS
+from slava.modules.model_handler import ModelHandler
+from slava.modules.utils.metrics_helpers import calculate_metrics
+from slava.modules.utils.metrics_utils import is_answer_complete, preprocess_answers
+
+CLOSED_QUESTION_TYPES = [SINGLE_CHOICE, MULTI_CHOICE, MATCHING, SEQUENCE]
+RESPONSES = [
+    ("2", "2"),
+    ("2", "2\nПотому что второй вариант верный."),
+    ("2", "Ответ: 2. Второй вариант верный."),
+    ("2", "12\nОтвет 2"),
+    ("13", "1, 3 — оба верны"),
+    ("13", "1 3\n"),
+    ("2", "  2  \n\n"),
+    ("4132", "4132 — правильная последовательность"),
+    ("3", "Не знаю, возможно 3"),
+    ("1", "ответ: 2\nили 1"),
+]
+
+
+def get_random_responses(n_responses: int) -> list[tuple[str, str]]:
+    rng = random.Random(0)
+    alphabet = "0123456789 ,.:-\nабв"
+    responses = []
+    for _ in range(n_responses):
+        real_answer = "".join(rng.choice("123456789") for _ in range(rng.randint(1, 4)))
+        response = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+        # Half of the responses contain the real answer
+        if rng.random() < 0.5:
+            position = rng.randint(0, len(response))
+            response = response[:position] + real_answer + response[position:]
+        responses.append((real_answer, response))
+    return responses
+
+
+def score(real_answers: list[str], responses: list[str], question_types: list[str]) -> pd.DataFrame:
+    data = pd.DataFrame({REAL_ANSWER_COLUMN: real_answers, MODEL_ANSWER_COLUMN: responses, TYPE_COLUMN: question_types})
+    _, not_open_questions = preprocess_answers(data)
+    metrics = calculate_metrics(
+        NOT_OPEN_QUESTIONS_METRICS, {column: not_open_questions[column].to_numpy() for column in data.columns}
+    )
+    return pd.DataFrame(metrics)[NOT_OPEN_QUESTIONS_METRIC_COLUMNS]
+
+
+def stream(response: str, real_answer: str, chunk_size: int) -> str:
+    chunks = (response[i : i + chunk_size] for i in range(0, len(response), chunk_size))
+    return collect_stream(chunks, partial(is_answer_complete, real_answer=real_answer))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3])
+def test_stopped_and_full_responses_score_the_same(chunk_size):
+    pairs = RESPONSES + get_random_responses(2000)
+    real_answers = [real_answer for real_answer, _ in pairs]
+    responses = [response for _, response in pairs]
+    stopped = [stream(response, real_answer, chunk_size) for real_answer, response in pairs]
+    question_types = [CLOSED_QUESTION_TYPES[i % len(CLOSED_QUESTION_TYPES)] for i in range(len(pairs))]
+
+    # Some responses are stopped, otherwise the check would be trivial
+    assert sum(len(s) < len(r) for s, r in zip(stopped, responses)) > 100
+    pd.testing.assert_frame_equal(
+        score(real_answers, stopped, question_types), score(real_answers, responses, question_types)
+    )
+
+
+def test_only_answers_with_fixed_metrics_are_stopped():
+    # The real answer followed by whitespace only may still be an exact match
+    assert stream("2\nПотому что второй вариант верный.", "2", 1) == "2\nП"
+    assert stream("2 \n ", "2", 1) == "2 \n "
+    # A wrong answer may still contain the real answer later on
+    assert stream("3\nили 2", "2", 1) == "3\nили 2"
+
+
+class StreamingModel:
+    max_concurrency = 1
+    generation_params = {}
+
+    def __init__(self, response: str):
+        self.model = self.Model(response)
+
+    class Model(Runnable):
+        def __init__(self, response: str):
+            self.response = response
+            self.streamed = None
+
+        def invoke(self, input, config=None, **kwargs) -> str:
+            return self.response
+
+        def stream_until(self, input, is_complete, config=None) -> str:
+            self.streamed = collect_stream(iter(self.response), is_complete)
+            return self.streamed
+
+
+def test_model_handler_stops_closed_questions_with_a_real_answer():
+    model = StreamingModel("2\nПотому что второй вариант верный.")
+    model_handler = ModelHandler(model, early_stopping=True)
+
+    assert model_handler.generate_response("prompt", SINGLE_CHOICE, "2") == "2\nП"
+    assert model.model.streamed == "2\nП"
+
+    # Open questions and calls without the real answer get the whole response
+    assert model_handler.generate_response("prompt", OPEN_QUESTION_VALUE, "2") == model.model.response
+    assert model_handler.generate_response("prompt", SINGLE_CHOICE) == model.model.response
+    assert ModelHandler(model).generate_response("prompt", SINGLE_CHOICE, "2") == model.model.response
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fuzzywuzzy import fuzz
+
+from slava.benchmarks.synthetic_data import generate_questions, generate_results
+from slava.modules.metrics import MetricsCalculator
+from slava.modules.utils.metrics_utils import (
+    calculate_f1_score,
+    calculate_f1_scores,
+    calculate_levenshtein_ratios,
+)
+
+ANSWER_PAIRS = {
+    "empty strings": ("", ""),
+    "empty real answer": ("", "ответ"),
+    "empty model answer": ("ответ", ""),
+    "punctuation only": ("?!...", "—,;:"),
+    "punctuation against a word": ("...", "слово"),
+    "repeated tokens": ("да да да нет", "да нет нет"),
+    "repeated tokens against one": ("the the the", "the"),
+    "cyrillic": ("Конституция Российской Федерации", "конституция РФ"),
+    "cyrillic with punctuation": ("Москва, Кремль.", "москва кремль"),
+    "articles": ("The State Duma", "a state duma"),
+    "latin and cyrillic": ("ВВП (GDP)", "GDP ВВП"),
+    "identical": ("1945 год", "1945 год"),
+    "disjoint": ("Пётр I", "Екатерина II"),
+}
+
+
+def get_answers(pairs: list[tuple[str, str]]) -> tuple[pd.Series, pd.Series]:
+    real_answers, model_answers = zip(*pairs)
+    return pd.Series(real_answers, dtype=object), pd.Series(model_answers, dtype=object)
+
+
+@pytest.mark.parametrize("pair", ANSWER_PAIRS.values(), ids=ANSWER_PAIRS.keys())
+def test_levenshtein_ratios_match_row_wise_ratio(pair):
+    real_answers, model_answers = get_answers([pair])
+    np.testing.assert_allclose(calculate_levenshtein_ratios(real_answers, model_answers), [fuzz.ratio(*pair) / 100])
+
+
+@pytest.mark.parametrize("pair", ANSWER_PAIRS.values(), ids=ANSWER_PAIRS.keys())
+def test_f1_scores_match_row_wise_f1_score(pair):
+    real_answers, model_answers = get_answers([pair])
+    np.testing.assert_allclose(calculate_f1_scores(real_answers, model_answers), [calculate_f1_score(*pair)])
+
+
+def test_duplicate_pairs_reuse_the_factorized_scores():
+    # Every pair occurs several times and in a shuffled order, so the cached scores are mapped back to many rows
+    pairs = list(ANSWER_PAIRS.values()) * 5
+    pairs = [pairs[i] for i in np.random.default_rng(0).permutation(len(pairs))]
+    # The same answers in other combinations share the factorized codes of real and model answers
+    pairs += [(real_answer, model_answer) for real_answer, _ in pairs[:10] for _, model_answer in pairs[:10]]
+    real_answers, model_answers = get_answers(pairs)
+
+    np.testing.assert_allclose(
+        calculate_levenshtein_ratios(real_answers, model_answers),
+        [fuzz.ratio(real_answer, model_answer) / 100 for real_answer, model_answer in pairs],
+    )
+    np.testing.assert_allclose(
+        calculate_f1_scores(real_answers, model_answers),
+        [calculate_f1_score(real_answer, model_answer) for real_answer, model_answer in pairs],
+    )
+
+
+def test_empty_series():
+    real_answers, model_answers = pd.Series([], dtype=object), pd.Series([], dtype=object)
+    assert calculate_levenshtein_ratios(real_answers, model_answers).shape == (0,)
+    assert calculate_f1_scores(real_answers, model_answers).shape == (0,)
+
+
+def test_parallel_metrics_match_the_serial_ones():
+    results = generate_results(generate_questions(300, seed=0), n_models=3, seed=0)
+
+    serial = MetricsCalculator(results.copy(), n_jobs=1)
+    parallel = MetricsCalculator(results.copy(), n_jobs=2)
+    assert not serial.open_questions.empty and not serial.not_open_questions.empty
+
+    pd.testing.assert_frame_equal(parallel.open_questions, serial.open_questions)
+    pd.testing.assert_frame_equal(parallel.not_open_questions, serial.not_open_questions)
+    pd.testing.assert_frame_equal(parallel._get_metrics_table(), serial._get_metrics_table())
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from slava.config import OPEN_QUESTION_VALUE, PROVOC_SCORE_COLUMN, SINGLE_CHOICE
+from slava.modules.metrics import MetricsCalculator
+from slava.modules.metrics_store import MetricsStore
+from slava.modules.results_store import ResultsStore
+from slava.modules.utils.metrics_helpers import get_results
+
+pytest.importorskip("pyarrow")
+
+
+def get_results_chunk(model_name: str, responses: list[str]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": [1, 2],
+            "model": model_name,
+            "subject": "История",
+            "type": [OPEN_QUESTION_VALUE, SINGLE_CHOICE],
+            "provoc_score": [1, 2],
+            "inputs": "prompt",
+            "response": responses,
+            "outputs": ["Москва", "2"],
+        }
+    )
+
+
+@pytest.fixture
+def scored_rows(monkeypatch) -> list[int]:
+    """Records the number of rows of every scoring call."""
+    scored_rows = []
+    score = MetricsCalculator._score
+
+    def record_score(self, questions, *args):
+        scored_rows.append(len(questions))
+        return score(self, questions, *args)
+
+    monkeypatch.setattr(MetricsCalculator, "_score", record_score)
+    return scored_rows
+
+
+def get_metrics_table(results_store: ResultsStore, metrics_store: MetricsStore = None) -> pd.DataFrame:
+    return MetricsCalculator.from_results_store(
+        results_store, n_jobs=1, metrics_store=metrics_store
+    )._get_metrics_table()
+
+
+def test_only_new_runs_and_changed_answers_are_scored(tmp_path, scored_rows):
+    results_store = ResultsStore(str(tmp_path / "results"))
+    results_store.write_results([get_results_chunk("first", ["Москва", "2"])], "first", run_id="1")
+    results_store.write_results([get_results_chunk("second", ["Париж", "3"])], "second", run_id="1")
+    metrics_store = MetricsStore(str(tmp_path / "metrics.sqlite"))
+    get_metrics_table(results_store, metrics_store)
+    assert sum(scored_rows) == 4
+
+    # A new run of the second model changes only the answer to the open question
+    results_store.write_results([get_results_chunk("second", ["Москва", "3"])], "second", run_id="2")
+    scored_rows.clear()
+    metrics_table = get_metrics_table(results_store, metrics_store)
+
+    assert scored_rows == [1]
+    assert metrics_store.load_row_metrics(["second"]).shape[0] == 2
+    # The stored aggregates of the first model are kept and match a full calculation
+    pd.testing.assert_frame_equal(metrics_table, get_metrics_table(results_store))
+
+
+def test_scored_files_are_skipped(tmp_path, scored_rows):
+    results_store = ResultsStore(str(tmp_path / "results"))
+    run_filepath = results_store.write_results([get_results_chunk("model", ["Москва", "2"])], "model")
+    metrics_store = MetricsStore(str(tmp_path / "metrics.sqlite"))
+    metrics_table = get_metrics_table(results_store, metrics_store)
+
+    assert metrics_store.is_file_scored(run_filepath)
+    assert get_results(metrics_store=metrics_store, results_store=results_store).empty
+    scored_rows.clear()
+    pd.testing.assert_frame_equal(get_metrics_table(results_store, metrics_store), metrics_table)
+    assert sum(scored_rows) == 0
+
+
+def test_filters_are_rejected_with_a_metrics_store(tmp_path):
+    results_store = ResultsStore(str(tmp_path / "results"))
+    results_store.write_results([get_results_chunk("model", ["Москва", "2"])], "model")
+    metrics_store = MetricsStore(str(tmp_path / "metrics.sqlite"))
+
+    with pytest.raises(ValueError, match="metrics store"):
+        MetricsCalculator.from_results_store(
+            results_store, filters=[(PROVOC_SCORE_COLUMN, "==", 1)], n_jobs=1, metrics_store=metrics_store
+        )
+    assert metrics_store.load_aggregates().empty
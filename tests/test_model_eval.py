@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import os
+
+import pandas as pd
+import pytest
+from langchain_core.runnables import Runnable
+
+from slava.config import EVALUATION_MANY_QUEUE_SIZE, PROMPT_SUBSTITUTION_ERROR
+from slava.models.base import get_prompt_text
+from slava.modules.model_eval import ModelEval
+from slava.modules.model_handler import ModelHandler
+
+CHUNK_SIZE = 5
+N_CHUNKS = 20
+
+
+class StubModel:
+    max_concurrency = 1
+
+    def __init__(self, latency: float = 0.0, error: Exception = None, response: str = None, on_call=None):
+        self.model = self.Model(latency, error, response, on_call)
+
+    class Model(Runnable):
+        """Answers with the first word of the prompt, i.e. the task, unless a response is given."""
+
+        def __init__(self, latency: float, error: Exception, response: str, on_call):
+            self.latency = latency
+            self.error = error
+            self.response = response
+            self.on_call = on_call
+
+        def invoke(self, input, config=None, **kwargs) -> str:
+            prompt = get_prompt_text(input)
+            if self.on_call is not None:
+                self.on_call(prompt)
+            if self.error is not None:
+                raise self.error
+            return self.response or prompt.split()[0]
+
+        async def ainvoke(self, input, config=None, **kwargs) -> str:
+            await asyncio.sleep(self.latency)
+            return self.invoke(input, config, **kwargs)
+
+
+def get_dataset(n_rows: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": range(n_rows),
+            "instruction": "{task} {text}",
+            "inputs": [{"task": str(i), "text": "?", "options": {}} for i in range(n_rows)],
+            "outputs": [str(i) for i in range(n_rows)],
+            "meta": [
+                {"subject": "История", "type": "открытый ответ", "source": "", "comment": "", "provoc_score": 1}
+                for _ in range(n_rows)
+            ],
+        }
+    )
+
+
+def test_fast_models_read_only_a_few_chunks_ahead_of_the_slowest(tmp_path):
+    dataset = get_dataset(CHUNK_SIZE * N_CHUNKS)
+    read_chunks = 0
+    lags = []
+
+    def iter_chunks():
+        nonlocal read_chunks
+        for start in range(0, len(dataset), CHUNK_SIZE):
+            read_chunks += 1
+            yield dataset.iloc[start : start + CHUNK_SIZE]
+
+    def record_lag(prompt: str) -> None:
+        lags.append(read_chunks - int(prompt.split()[0]) // CHUNK_SIZE)
+
+    models = [
+        ("fast", ModelHandler(StubModel())),
+        ("slow", ModelHandler(StubModel(latency=0.005, on_call=record_lag))),
+    ]
+    ModelEval().run_evaluation_many(models, iter_chunks(), str(tmp_path))
+
+    # The queue, the chunk the reader waits to put and the chunk the slowest model is evaluating
+    assert max(lags) <= EVALUATION_MANY_QUEUE_SIZE + 3
+    for model_name, _ in models:
+        results = pd.read_csv(os.path.join(tmp_path, f"{model_name}.csv"))
+        assert results["response"].tolist() == list(range(len(dataset)))
+
+
+def test_a_failed_model_does_not_stop_the_others(tmp_path, caplog):
+    dataset = get_dataset(CHUNK_SIZE * N_CHUNKS)
+    chunks = (dataset.iloc[start : start + CHUNK_SIZE] for start in range(0, len(dataset), CHUNK_SIZE))
+    models = [
+        ("failed", ModelHandler(StubModel(error=RuntimeError("provider is down")))),
+        ("healthy", ModelHandler(StubModel())),
+    ]
+
+    with pytest.raises(RuntimeError, match="provider is down"):
+        ModelEval().run_evaluation_many(models, chunks, str(tmp_path))
+
+    assert "Evaluation of failed failed" in caplog.text
+    results = pd.read_csv(os.path.join(tmp_path, "healthy.csv"))
+    assert results["response"].tolist() == list(range(len(dataset)))
+
+
+@pytest.mark.parametrize("asynchronous, expected_calls", [(False, 4), (True, 2)])
+def test_duplicates_of_a_failed_prompt_call_the_model_again(tmp_path, asynchronous, expected_calls):
+    prompts = []
+    model = StubModel(response="Error: 500 Internal Server Error", on_call=prompts.append)
+    # Every row has the same prompt. Asynchronously, the row scheduled while the request is in flight
+    # shares its answer, and the next rows call the model again.
+    dataset = get_dataset(4).assign(inputs=[{"task": "0", "text": "?", "options": {}}] * 4)
+
+    ModelEval().run_evaluation("model", dataset, ModelHandler(model), str(tmp_path), asynchronous=asynchronous)
+    assert len(prompts) == expected_calls
+
+
+def get_dataset_with_missing_keys() -> pd.DataFrame:
+    # The second row has no text for its template
+    return get_dataset(3).assign(
+        inputs=[
+            {"task": "0", "text": "?", "options": {}},
+            {"task": "1", "text": "", "options": {}},
+            {"task": "2", "text": "?", "options": {}},
+        ]
+    )
+
+
+def test_missing_keys_raise_in_strict_mode():
+    with pytest.raises(ValueError, match=r"missing keys \['text'\] in 1 rows of '\{task\} \{text\}'"):
+        ModelEval().render_prompts(get_dataset_with_missing_keys(), strict=True)
+
+
+def test_missing_keys_are_reported_once_with_a_warning(tmp_path, caplog):
+    prompts = []
+    # Without deduplication every placeholder prompt reaches the model
+    model_eval = ModelEval(deduplicate=False)
+    dataset = get_dataset_with_missing_keys()
+    chunks = [dataset, dataset.assign(id=range(3, 6))]
+
+    with caplog.at_level(logging.WARNING):
+        model_eval.run_evaluation("model", iter(chunks), ModelHandler(StubModel(on_call=prompts.append)), str(tmp_path))
+
+    warnings = [record for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert "missing keys ['text'] in 1 rows of '{task} {text}'" in warnings[0].getMessage()
+    # The placeholder is still sent, so the row is scored as a wrong answer
+    assert prompts.count(PROMPT_SUBSTITUTION_ERROR) == 2
+    assert len(prompts) == 6
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from slava.models.ollama import OllamaModel
+from slava.models.rate_controller import get_rate_controller
+from slava.modules.model_handler import ModelHandler
+
+
+def test_http_client_generates_through_the_server(stub_server):
+    model = OllamaModel("llama3", base_url=stub_server.url, http_client=True, warmup=True, keep_alive="1h")
+
+    assert ModelHandler(model).generate_response("question", "открытый ответ") == "answer to question"
+
+    warmup_request, request = stub_server.state.requests
+    assert warmup_request == {"model": "llama3", "keep_alive": "1h"}
+    assert request["prompt"] == "question"
+    assert request["keep_alive"] == "1h"
+    assert request["stream"] is False
+    assert set(request["options"]) == {"temperature", "top_k", "num_predict"}
+
+
+def test_requests_are_sent_in_parallel_up_to_max_concurrency(stub_server):
+    model = OllamaModel("llama3", base_url=stub_server.url, http_client=True, max_concurrency=4)
+    model_handler = ModelHandler(model)
+
+    async def generate_responses():
+        return await asyncio.gather(
+            *(model_handler.agenerate_response(f"question {i}", "открытый ответ") for i in range(40))
+        )
+
+    responses = asyncio.run(generate_responses())
+    assert responses == [f"answer to question {i}" for i in range(40)]
+    assert 1 < stub_server.state.max_active <= 4
+
+
+def test_every_server_has_its_own_rate_controller(stub_server):
+    model = OllamaModel("llama3", base_url=stub_server.url, http_client=True)
+    other_model = OllamaModel("llama3", base_url=f"{stub_server.url}/other", http_client=True)
+    assert model.rate_controller is not other_model.rate_controller
+
+
+def test_later_limits_apply_to_the_shared_rate_controller(stub_server):
+    OllamaModel("llama3", base_url=stub_server.url, http_client=True, max_concurrency=1)
+    model = OllamaModel("llama3", base_url=stub_server.url, http_client=True, max_concurrency=4)
+
+    assert model.rate_controller.max_concurrency == 4
+    assert get_rate_controller(f"ollama:{stub_server.url}", model.rate_controller.requests_per_second, 4) is (
+        model.rate_controller
+    )
+
+
+def test_transport_is_created_on_first_request(stub_server):
+    model = OllamaModel("llama3", base_url=stub_server.url, http_client=True)
+    assert model._transport is None
+
+    assert ModelHandler(model).generate_response("question") == "answer to question"
+    assert model._transport is not None
+
+
+def test_langchain_client_does_not_create_a_transport(stub_server):
+    pytest.importorskip("langchain_ollama")
+
+    model = OllamaModel("llama3", base_url=stub_server.url, http_client=False)
+    assert model._transport is None
@@ -0,0 +1,122 @@
+from slava.config import HUGGINGFACE_PREFIX_MIN_TOKENS
+from slava.models.huggingface import HuggingFaceModel
+from slava.models.prefix_cache import PrefixCache, get_common_prefix_length, get_nbytes
+
+
+class StubTensor:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+    def element_size(self):
+        return 1
+
+    def nelement(self):
+        return self.nbytes
+
+
+def get_model(max_bytes=1024):
+    model = HuggingFaceModel.__new__(HuggingFaceModel)
+    model.prefix_cache = PrefixCache(max_bytes)
+    return model
+
+
+def test_nbytes_of_nested_caches():
+    assert get_nbytes(((StubTensor(10), StubTensor(20)), [StubTensor(5)], {"key": StubTensor(1)})) == 36
+
+
+def test_common_prefix_length():
+    assert get_common_prefix_length([1, 2, 3], [1, 2, 4]) == 2
+    assert get_common_prefix_length([1, 2], [1, 2, 3]) == 2
+    assert get_common_prefix_length([], [1]) == 0
+
+
+def test_least_recently_used_prefixes_are_evicted_by_size():
+    cache = PrefixCache(max_bytes=300)
+    cache.put((1,), StubTensor(100))
+    cache.put((2,), StubTensor(100))
+    cache.put((3,), StubTensor(100))
+    cache.get((1,))
+    cache.put((4,), StubTensor(150))
+
+    assert cache.find([2, 0], max_length=1) is None
+    assert cache.find([3, 0], max_length=1) is None
+    assert cache.find([1, 0], max_length=1) == (1,)
+    assert cache.find([4, 0], max_length=1) == (4,)
+    assert cache.nbytes == 250
+
+
+def test_prefixes_larger_than_the_cache_are_not_stored():
+    cache = PrefixCache(max_bytes=100)
+    cache.put((1,), StubTensor(50))
+    cache.put((2,), StubTensor(150))
+
+    assert len(cache) == 1
+    assert cache.nbytes == 50
+
+
+def test_the_longest_cached_prefix_is_found():
+    cache = PrefixCache()
+    cache.put((1, 2), StubTensor(1))
+    cache.put((1, 2, 3, 4), StubTensor(1))
+    cache.put((5,), StubTensor(1))
+
+    assert cache.find([1, 2, 3, 4, 5], max_length=4) == (1, 2, 3, 4)
+    assert cache.find([1, 2, 3, 4], max_length=3) == (1, 2)
+    assert cache.find([1, 3], max_length=1) is None
+
+
+def test_prefix_caches_are_computed_once():
+    cache = PrefixCache()
+    computed = []
+
+    def compute(prefix):
+        computed.append(prefix)
+        return StubTensor(len(prefix))
+
+    first = cache.get_or_compute((1, 2), compute)
+    second = cache.get_or_compute((1, 2), compute)
+
+    assert computed == [(1, 2)]
+    assert second is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_prompts_of_one_template_share_its_prefix():
+    first_template = list(range(100, 100 + HUGGINGFACE_PREFIX_MIN_TOKENS + 4))
+    second_template = list(range(200, 200 + HUGGINGFACE_PREFIX_MIN_TOKENS))
+    input_ids = [
+        first_template + [1, 2],
+        second_template + [3],
+        first_template + [4],
+        list(range(300, 300 + HUGGINGFACE_PREFIX_MIN_TOKENS * 2)),
+        second_template + [5, 6, 7],
+        first_template + [1, 3],
+    ]
+
+    prefixes = get_model()._get_prefixes(input_ids)
+
+    assert prefixes[0] == prefixes[2] == prefixes[5] == tuple(first_template)
+    assert prefixes[1] == prefixes[4] == tuple(second_template)
+    # A prompt without another prompt of its template is generated without a prefix
+    assert prefixes[3] is None
+
+
+def test_short_common_prefixes_are_not_cached():
+    input_ids = [[1] * (HUGGINGFACE_PREFIX_MIN_TOKENS - 1) + [2, 3], [1] * (HUGGINGFACE_PREFIX_MIN_TOKENS - 1) + [4, 5]]
+
+    assert get_model()._get_prefixes(input_ids) == [None, None]
+
+
+def test_the_prefix_leaves_the_last_prompt_token_uncached():
+    template = list(range(HUGGINGFACE_PREFIX_MIN_TOKENS + 2))
+    input_ids = [template, template + [1, 2]]
+
+    assert get_model()._get_prefixes(input_ids) == [tuple(template[:-1])] * 2
+
+
+def test_cached_prefixes_of_earlier_batches_are_reused():
+    template = list(range(HUGGINGFACE_PREFIX_MIN_TOKENS + 2))
+    model = get_model()
+    model.prefix_cache.put(tuple(template), StubTensor(1))
+
+    assert model._get_prefixes([template + [1]]) == [tuple(template)]
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from email.utils import formatdate
+
+import pytest
+
+from slava.config import RATE_CONTROLLER_ADDITIVE_INCREASE, RATE_CONTROLLER_MULTIPLICATIVE_DECREASE
+from slava.models import rate_controller as rate_controller_module
+from slava.models.rate_controller import AdaptiveRateController, get_rate_controller, get_retry_after, is_retryable
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FailingFunction:
+    def __init__(self, errors: list[Exception]):
+        self.errors = errors
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= len(self.errors):
+            raise self.errors[self.calls - 1]
+        return "ok"
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(rate_controller_module.random, "uniform", lambda low, high: 0.0)
+
+
+def test_models_with_different_credentials_get_different_controllers(caplog):
+    first = get_rate_controller("provider-test", 1.0, 2, credential="first-key")
+    second = get_rate_controller("provider-test", 1.0, 2, credential="second-key")
+    assert first is not second
+    assert get_rate_controller("provider-test", 1.0, 2, credential="first-key") is first
+
+    with caplog.at_level(logging.WARNING):
+        assert get_rate_controller("provider-test", 2.0, 4, credential="first-key") is first
+    assert (first.requests_per_second, first.max_concurrency) == (2.0, 4)
+    assert (second.requests_per_second, second.max_concurrency) == (1.0, 2)
+    # The warning names the controller by a hash of the credential
+    assert "provider-test:" in caplog.text
+    assert "first-key" not in caplog.text
+
+
+def test_concurrency_grows_additively_and_halves_on_errors():
+    rate_controller = AdaptiveRateController(requests_per_second=10.0, max_concurrency=4, latency_target=1.0)
+
+    rate_controller._on_success(latency=0.1)
+    assert rate_controller.concurrency_limit == 1.0 + RATE_CONTROLLER_ADDITIVE_INCREASE
+    rate_controller._on_success(latency=0.1)
+    assert rate_controller.concurrency_limit == pytest.approx(2.0 + RATE_CONTROLLER_ADDITIVE_INCREASE / 2.0)
+
+    for _ in range(20):
+        rate_controller._on_success(latency=0.1)
+    assert rate_controller.concurrency_limit == 4.0
+
+    rate_controller._on_failure(StatusError(429, {"Retry-After": "0"}), attempt=0)
+    assert rate_controller.concurrency_limit == 4.0 * RATE_CONTROLLER_MULTIPLICATIVE_DECREASE
+
+    # Slow responses shrink the limit as well, but never below one call at a time
+    for _ in range(5):
+        rate_controller._on_success(latency=2.0)
+    assert rate_controller.concurrency_limit == 1.0
+
+
+def test_retry_after_in_seconds():
+    assert get_retry_after(StatusError(429, {"Retry-After": "3"})) == 3.0
+    assert get_retry_after(StatusError(429, {"retry-after": "1.5"})) == 1.5
+    assert get_retry_after(StatusError(429, {"Retry-After": "-1"})) == 0.0
+
+
+def test_retry_after_as_http_date():
+    retry_after = get_retry_after(StatusError(429, {"Retry-After": formatdate(time.time() + 30, usegmt=True)}))
+    assert 28.0 <= retry_after <= 30.0
+
+
+def test_missing_or_invalid_retry_after():
+    assert get_retry_after(StatusError(429)) is None
+    assert get_retry_after(StatusError(429, {"Retry-After": "soon"})) is None
+    assert get_retry_after(ValueError("no headers")) is None
+
+
+def test_retry_after_of_gigachat_errors():
+    error = Exception("https://gigachat", 429, b"", {"Retry-After": "2"})
+    assert get_retry_after(error) == 2.0
+    assert is_retryable(error)
+
+
+def test_only_rate_limits_and_server_errors_are_retried():
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(ValueError("bad input"))
+
+
+def test_retryable_errors_are_retried_until_success(no_backoff):
+    rate_controller = AdaptiveRateController(requests_per_second=1000.0, max_concurrency=1, max_retries=3)
+    function = FailingFunction([StatusError(503), StatusError(429)])
+
+    assert rate_controller.call(function) == "ok"
+    assert function.calls == 3
+
+
+def test_retries_are_exhausted(no_backoff):
+    rate_controller = AdaptiveRateController(requests_per_second=1000.0, max_concurrency=1, max_retries=2)
+    function = FailingFunction([StatusError(503)] * 10)
+
+    with pytest.raises(StatusError):
+        rate_controller.call(function)
+    assert function.calls == 3
+    assert rate_controller.in_flight == 0
+
+
+def test_async_retries_are_exhausted(no_backoff):
+    rate_controller = AdaptiveRateController(requests_per_second=1000.0, max_concurrency=1, max_retries=2)
+    function = FailingFunction([StatusError(429)] * 10)
+
+    async def call():
+        return function()
+
+    with pytest.raises(StatusError):
+        asyncio.run(rate_controller.acall(call))
+    assert function.calls == 3
+
+
+def test_other_errors_are_not_retried(no_backoff):
+    rate_controller = AdaptiveRateController(requests_per_second=1000.0, max_concurrency=1)
+    function = FailingFunction([StatusError(400)])
+
+    with pytest.raises(StatusError):
+        rate_controller.call(function)
+    assert function.calls == 1
@@ -0,0 +1,132 @@
+import pytest
+from langchain_core.runnables import Runnable
+
+from slava.models.base import get_prompt_text
+from slava.modules import response_cache as response_cache_module
+from slava.modules.model_handler import ModelHandler
+from slava.modules.response_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class StubModel:
+    max_concurrency = 1
+    generation_params = {}
+
+    def __init__(self, response: str = None):
+        self.model = self.Model(response)
+
+    class Model(Runnable):
+        def __init__(self, response: str):
+            self.response = response
+            self.calls = 0
+
+        def invoke(self, input, config=None, **kwargs) -> str:
+            self.calls += 1
+            return self.response or f"answer to {get_prompt_text(input)}"
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(response_cache_module, "time", clock)
+    return clock
+
+
+def test_responses_are_cached(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    key = ResponseCache.get_key("provider", "model", {"temperature": 0}, "prompt")
+
+    assert cache.get(key) is None
+    cache.set(key, "answer")
+    assert cache.get(key) == "answer"
+    assert cache.stats == {"hits": 1, "misses": 1}
+    assert key != ResponseCache.get_key("provider", "model", {"temperature": 1}, "prompt")
+
+
+def test_errors_are_never_cached(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    cache.set("rate limited", "Error: 429 Too Many Requests")
+    cache.set("unexpected", "The model returned an unexpected response format.")
+    cache.set("missing", None)
+
+    assert cache.get("rate limited") is None
+    assert cache.get("unexpected") is None
+    assert cache.get("missing") is None
+
+
+def test_responses_expire_after_max_age(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_age=60)
+    cache.set("key", "answer")
+
+    clock.now += 30
+    assert cache.get("key") == "answer"
+    clock.now += 31
+    assert cache.get("key") is None
+
+    # Expired responses are deleted by the next eviction
+    cache.evict()
+    assert cache._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+
+
+def test_least_recently_used_responses_are_evicted_by_size(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_size=10)
+    for key in ["first", "second"]:
+        clock.now += 1
+        cache.set(key, "abcd")
+
+    clock.now += 1
+    cache.get("first")
+    clock.now += 1
+    cache.set("third", "abcd")
+    cache.evict()
+
+    assert cache.get("first") == "abcd"
+    assert cache.get("second") is None
+    assert cache.get("third") == "abcd"
+
+
+def test_offline_cache_is_read_only(tmp_path, clock):
+    cache_filepath = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(cache_filepath, max_age=60)
+    cache.set("key", "answer")
+    cache.close()
+
+    clock.now += 3600
+    offline_cache = ResponseCache(cache_filepath, max_age=60, offline=True)
+    # A replay returns the recorded responses however old they are, and never writes
+    assert offline_cache.get("key") == "answer"
+    offline_cache.set("other key", "answer")
+    assert offline_cache.get("other key") is None
+
+
+def test_offline_cache_raises_instead_of_calling_the_model(tmp_path, clock):
+    cache_filepath = str(tmp_path / "cache.sqlite")
+    model = StubModel()
+    ModelHandler(model, cache=ResponseCache(cache_filepath)).generate_response("recorded")
+
+    model_handler = ModelHandler(model, cache=ResponseCache(cache_filepath, offline=True))
+    assert model_handler.generate_response("recorded") == "answer to recorded"
+    with pytest.raises(LookupError):
+        model_handler.generate_response("new")
+    assert model.model.calls == 1
+
+
+def test_model_handler_calls_the_model_again_after_an_error(tmp_path, clock):
+    model = StubModel(response="Error: 503 Service Unavailable")
+    model_handler = ModelHandler(model, cache=ResponseCache(str(tmp_path / "cache.sqlite")))
+
+    model_handler.generate_response("prompt")
+    model_handler.generate_response("prompt")
+    assert model.model.calls == 2
+
+    model.model.response = "answer"
+    model_handler.generate_response("prompt")
+    model_handler.generate_response("prompt")
+    assert model.model.calls == 3
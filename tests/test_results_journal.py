@@ -0,0 +1,47 @@
+import pandas as pd
+
+from slava.config import ID_COLUMN, MODEL_ANSWER_COLUMN
+from slava.modules.utils.results_utils import PromptDeduplicator, ResultsJournal
+
+
+def record(question_id, answer):
+    return {ID_COLUMN: question_id, MODEL_ANSWER_COLUMN: answer}
+
+
+def test_error_answers_are_retried_on_resume(tmp_path):
+    journal_filepath = str(tmp_path / "model.jsonl")
+    with ResultsJournal(journal_filepath) as journal:
+        journal.append(record(1, "1"))
+        journal.append(record(2, "Error: 429 Too Many Requests"))
+        journal.append(record(3, "The model returned an unexpected response format."))
+
+    journal = ResultsJournal(journal_filepath)
+    assert journal.recorded_ids == {1}
+    assert not journal.is_recorded(2)
+    assert not journal.is_recorded(3)
+
+
+def test_only_the_last_record_of_an_id_is_exported(tmp_path):
+    journal_filepath = str(tmp_path / "model.jsonl")
+    with ResultsJournal(journal_filepath) as journal:
+        journal.append(record(1, "1"))
+        journal.append(record(2, "Error: Event loop is closed"))
+
+    with ResultsJournal(journal_filepath) as journal:
+        journal.append(record(2, "2"))
+
+    results_filepath = str(tmp_path / "model.csv")
+    journal.export_to_csv(results_filepath)
+    results = pd.read_csv(results_filepath, dtype=str)
+    assert results[ID_COLUMN].tolist() == ["1", "2"]
+    assert results[MODEL_ANSWER_COLUMN].tolist() == ["1", "2"]
+    assert ResultsJournal(journal_filepath).recorded_ids == {1, 2}
+
+
+def test_error_answers_are_not_shared_between_duplicate_prompts():
+    deduplicator = PromptDeduplicator()
+    deduplicator.add("first prompt", "Error: 503 Service Unavailable")
+    deduplicator.add("second prompt", "answer")
+
+    assert deduplicator.get("first prompt") is None
+    assert deduplicator.get("second prompt") == "answer"
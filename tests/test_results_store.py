@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from slava.config import ID_COLUMN, MODEL_ANSWER_COLUMN, PROVOC_SCORE_COLUMN
+from slava.modules.results_store import ResultsStore
+from slava.modules.utils.metrics_helpers import get_results
+
+pytest.importorskip("pyarrow")
+
+
+def get_results_chunk(model_name: str, ids: list = (1, 2, 3)) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": list(ids),
+            "model": model_name,
+            "subject": "История",
+            "type": "открытый ответ",
+            "provoc_score": [1, 2, 3],
+            "inputs": "prompt",
+            "response": ["a", np.nan, "c"],
+            "outputs": ["a", "b", 3],
+        }
+    )
+
+
+def test_results_keep_their_types(tmp_path):
+    results_store = ResultsStore(str(tmp_path))
+    results_store.write_results([get_results_chunk("model")], "model")
+
+    results = get_results(results_store=results_store)
+    assert results[ID_COLUMN].tolist() == ["1", "2", "3"]
+    assert results[PROVOC_SCORE_COLUMN].tolist() == [1, 2, 3]
+    assert results[MODEL_ANSWER_COLUMN].tolist() == ["a", None, "c"]
+
+
+def test_filters_compare_numbers(tmp_path):
+    results_store = ResultsStore(str(tmp_path))
+    for model_name in ["first", "second"]:
+        results_store.write_results([get_results_chunk(model_name)], model_name)
+
+    results = get_results(results_store=results_store, filters=[(PROVOC_SCORE_COLUMN, "==", 2)])
+    assert results[ID_COLUMN].tolist() == ["2", "2"]
+
+    results = get_results(results_store=results_store, filters=[(PROVOC_SCORE_COLUMN, ">=", 2)])
+    assert sorted(results[ID_COLUMN].tolist()) == ["2", "2", "3", "3"]
+
+
+def test_string_ids_are_stored(tmp_path):
+    results_store = ResultsStore(str(tmp_path))
+    results_store.write_results([get_results_chunk("model", ids=["q5082", "q5083", 7])], "model")
+
+    results = get_results(results_store=results_store, filters=[(ID_COLUMN, "==", "q5082")])
+    assert results[ID_COLUMN].tolist() == ["q5082"]
+    assert sorted(get_results(results_store=results_store)[ID_COLUMN].tolist()) == ["7", "q5082", "q5083"]
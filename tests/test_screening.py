@@ -0,0 +1,127 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import pytest
+from langchain_core.runnables import Runnable
+
+from slava.config import (
+    MODEL_ANSWER_COLUMN,
+    SCREENING_ALL_STRATA,
+    SCREENING_CI_HIGH_COLUMN,
+    SCREENING_CI_LOW_COLUMN,
+    SCREENING_CI_WIDTH_COLUMN,
+    SCREENING_ESTIMATES_ATTR,
+    SCREENING_PRIOR_MEAN,
+    SCREENING_SAMPLED_COLUMN,
+    SCREENING_SCORE_COLUMN,
+)
+from slava.models.base import get_prompt_text
+from slava.modules.model_eval import ModelEval
+from slava.modules.model_handler import ModelHandler
+from slava.modules.screening import StratifiedEstimator, get_sampling_order
+from slava.modules.utils.results_utils import is_error_response
+
+# Six questions of the first stratum and four of the second
+STRATA = pd.DataFrame({"subject": ["a"] * 6 + ["b"] * 4})
+
+
+class StubModel:
+    max_concurrency = 1
+
+    def __init__(self, failing_tasks: set[str]):
+        self.model = self.Model(failing_tasks)
+
+    class Model(Runnable):
+        """Answers with the task of the prompt, or with an error for the failing tasks."""
+
+        def __init__(self, failing_tasks: set[str]):
+            self.failing_tasks = failing_tasks
+
+        def invoke(self, input, config=None, **kwargs) -> str:
+            task = get_prompt_text(input).split()[0]
+            return "Error: 500 Internal Server Error" if task in self.failing_tasks else task
+
+
+def get_dataset(n_rows: int) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "id": range(n_rows),
+            "instruction": "{task} {text}",
+            "inputs": [{"task": str(i), "text": "?", "options": {}} for i in range(n_rows)],
+            # Every third answer is wrong, so the scores vary
+            "outputs": [str(i) if i % 3 else "-" for i in range(n_rows)],
+            "meta": [
+                {"subject": "История", "type": "открытый ответ", "source": "", "comment": "", "provoc_score": i % 2}
+                for i in range(n_rows)
+            ],
+        }
+    )
+
+
+def test_stratified_estimate_and_interval():
+    estimator = StratifiedEstimator(STRATA, confidence=0.95)
+    estimator.update(np.array([0, 1, 2, 6, 7]), np.array([1.0, 0.0, 1.0, 0.5, 0.5]))
+
+    estimate = estimator.estimate()
+    # The strata means 2/3 and 1/2 are weighted by their shares 0.6 and 0.4
+    assert estimate[SCREENING_SCORE_COLUMN] == pytest.approx(0.6)
+    # The variance of the first stratum mean is 1/3 / 3 * (1 - 3/6) with the finite population correction,
+    # and the second stratum has no variance
+    half_width = NormalDist().inv_cdf(0.975) * np.sqrt(0.6**2 / 18)
+    assert estimate[SCREENING_CI_WIDTH_COLUMN] == pytest.approx(2 * half_width)
+    assert estimate[SCREENING_CI_LOW_COLUMN] == pytest.approx(0.6 - half_width)
+    assert estimate[SCREENING_CI_HIGH_COLUMN] == pytest.approx(0.6 + half_width)
+
+
+def test_unsampled_strata_use_the_prior():
+    estimator = StratifiedEstimator(STRATA)
+    estimator.update(np.array([0, 1]), np.array([1.0, 1.0]))
+
+    estimates = estimator.get_estimates()
+    assert estimates[SCREENING_SAMPLED_COLUMN].tolist() == [2, 0, 2]
+    assert estimates[SCREENING_SCORE_COLUMN].iloc[1] == SCREENING_PRIOR_MEAN
+    assert estimates["subject"].iloc[-1] == SCREENING_ALL_STRATA
+    assert not estimator.is_converged(ci_width=1.0)
+
+
+def test_exhausted_strata_have_no_uncertainty():
+    estimator = StratifiedEstimator(STRATA)
+    scores = np.array([1.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 0.0, 1.0, 0.0])
+    estimator.update(np.arange(len(STRATA)), scores)
+
+    estimate = estimator.estimate()
+    assert estimate[SCREENING_SCORE_COLUMN] == pytest.approx(0.6 * 4 / 6 + 0.4 * 1 / 4)
+    assert estimate[SCREENING_CI_WIDTH_COLUMN] == pytest.approx(0.0)
+    assert estimator.is_converged(ci_width=0.0)
+
+
+def test_sampling_order_interleaves_the_strata():
+    order = get_sampling_order(STRATA, seed=0)
+
+    assert sorted(order.tolist()) == list(range(len(STRATA)))
+    # A proportional prefix of half the rows has three rows of the first stratum and two of the second
+    assert (order[:5] < 6).sum() == 3
+
+
+def test_error_answers_are_neither_scored_nor_returned(tmp_path):
+    dataset = get_dataset(20)
+    failing_tasks = {"2", "5", "11", "17"}
+    results = ModelEval().run_screening(
+        "model", dataset, ModelHandler(StubModel(failing_tasks)), str(tmp_path), ci_width=0.0, batch_size=6
+    )
+    assert not results[MODEL_ANSWER_COLUMN].map(is_error_response).any()
+    assert len(results) == len(dataset) - len(failing_tasks)
+
+    # A resumed run where every retried question fails again gives the same estimates
+    resumed = ModelEval().run_screening(
+        "model",
+        dataset,
+        ModelHandler(StubModel({str(i) for i in range(20)})),
+        str(tmp_path),
+        ci_width=0.0,
+        batch_size=6,
+    )
+    assert resumed.attrs[SCREENING_ESTIMATES_ATTR] == results.attrs[SCREENING_ESTIMATES_ATTR]
+    estimate = results.attrs[SCREENING_ESTIMATES_ATTR][-1]
+    assert estimate[SCREENING_SAMPLED_COLUMN] == len(dataset) - len(failing_tasks)
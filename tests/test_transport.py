@@ -0,0 +1,24 @@
+import asyncio
+
+from slava.models.transport import HTTPTransport
+
+
+def test_async_client_is_reused_within_an_event_loop(stub_server):
+    transport = HTTPTransport(base_url=stub_server.url)
+
+    async def get_clients():
+        return transport.async_client, transport.async_client
+
+    first, second = asyncio.run(get_clients())
+    assert first is second
+
+
+def test_async_requests_work_across_event_loops(stub_server):
+    transport = HTTPTransport(base_url=stub_server.url)
+
+    # Every asyncio.run starts a new event loop, like consecutive asynchronous evaluations
+    for i in range(3):
+        response = asyncio.run(transport.apost("/api/generate", {"model": "stub", "prompt": f"q{i}"}))
+        assert response["response"] == f"answer to q{i}"
+
+    assert transport.post("/api/generate", {"model": "stub", "prompt": "sync"})["response"] == "answer to sync"